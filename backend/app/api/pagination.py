@@ -0,0 +1,27 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination: a page is fetched by seeking an index to the position encoded in its cursor instead of
+    counting an offset, so every page takes the same time however large the table grows.
+    Clients follow the 'next' and 'previous' links of a response, and may set the page size with ?page_size=,
+    up to API_MAX_PAGE_SIZE.
+    """
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = settings.API_PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class MusicPagination(KeysetPagination):
+    ordering = 'id'
+
+
+class RatingPagination(KeysetPagination):
+    """
+    Newest ratings first. Ratings created at the same time are ordered by id, which the cursor skips as an offset.
+    """
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,18 @@
+from rest_framework.renderers import BaseRenderer
+
+from ..snapshots import NPZ_CONTENT_TYPE, encode_npz
+
+
+class NPZRenderer(BaseRenderer):
+    """
+    Renders a dict of arrays as a NumPy NPZ archive, for columnar transport of analysis data.
+    """
+    media_type = NPZ_CONTENT_TYPE
+    format = 'npz'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return encode_npz(data)
@@ -1,8 +1,30 @@
 from rest_framework import serializers
-from ..models import Music, Rating
+from ..media import media_url_cache
+from ..models import Music, Rating, RatingStats
+
+
+class CachedUrlFileField(serializers.FileField):
+    """
+    Read-only file field represented by its URL from media_url_cache, so the URLs of stored files are not generated
+    and signed again for every serialized row.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = media_url_cache.get_url(value)
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
 
 
 class MusicSerializer(serializers.ModelSerializer):
+    file = CachedUrlFileField()
+
     class Meta:
         model = Music
         fields = [
@@ -10,6 +32,18 @@ class MusicSerializer(serializers.ModelSerializer):
         ]
 
 
+class MusicClipSerializer(MusicSerializer):
+    """
+    Serializes a track for playback in the Turing test: 'file' is the track's clip when one has been rendered with
+    the generate_renditions command, and the full-length WAV file otherwise.
+    """
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.clip:
+            data['file'] = self.fields['file'].to_representation(instance.clip)
+        return data
+
+
 class RatingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Rating
@@ -20,3 +54,27 @@ class RatingSerializer(serializers.ModelSerializer):
         if value < 1 or value > 5:
             raise serializers.ValidationError('Rating must be between 1 and 5')
         return value
+
+
+class RatingBatchItemSerializer(serializers.Serializer):
+    """
+    Validates one entry of a batch rating submission without looking up the song, so a whole batch can be checked
+    against the database with a single query.
+    """
+    song = serializers.IntegerField()
+    rating = serializers.IntegerField()
+
+    def validate_rating(self, value):
+        if value < 1 or value > 5:
+            raise serializers.ValidationError('Rating must be between 1 and 5')
+        return value
+
+
+class RatingStatsSerializer(serializers.ModelSerializer):
+    mean = serializers.FloatField(read_only=True)
+    std = serializers.FloatField(read_only=True)
+    histogram = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = RatingStats
+        fields = ['song', 'count', 'mean', 'std', 'histogram']
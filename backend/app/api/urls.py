@@ -8,5 +8,8 @@ router.register(r'ratings', views.RatingViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('feature-analysis/', views.music_analysis_data, name='feature-analysis')
+    path('feature-analysis/', views.music_analysis_data, name='feature-analysis'),
+    path('feature-analysis/histograms/', views.feature_histograms, name='feature-histograms'),
+    path('feature-analysis/scatter/', views.filtered_music_data, name='feature-scatter'),
+    path('feature-analysis/sections/<str:section>/', views.music_analysis_section, name='feature-section'),
 ]
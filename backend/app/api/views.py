@@ -1,15 +1,48 @@
-from ..data_processing import get_processed_music_data
+from ..data_processing import (analysis_fields, analysis_sections, frame_columns, frame_records, get_analysis_fields,
+                               get_filtered_frame, parse_range_filters, per_track_matrix_fields)
+from ..histograms import parse_bin_widths
+from ..snapshots import get_analysis_snapshot, get_histogram_snapshot, get_section_snapshot
 from django.conf import settings
-from django.http import JsonResponse
-from ..models import Music, Rating
-from random import choice
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from ..models import Music, Rating, RatingStats
+from ..rating_stats import apply_rating_changes, get_label_stats
+from ..sampling import BALANCE_MODES, track_sampler
 from rest_framework import viewsets
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, renderer_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
-from .serializers import MusicSerializer, RatingSerializer
+from .pagination import MusicPagination, RatingPagination
+from .renderers import NPZRenderer
+from .serializers import (MusicClipSerializer, MusicSerializer, RatingBatchItemSerializer, RatingSerializer,
+                          RatingStatsSerializer)
+
+
+def snapshot_response(request, snapshot):
+    """
+    Serves a stored analysis snapshot, answering with 304 Not Modified when the client already holds it.
+    ETags are compared weakly, since GZipMiddleware marks the ETags of compressed responses as weak.
+    Args:
+        request: Incoming request, checked for an If-None-Match header
+        snapshot: AnalysisSnapshot to serve
+    Returns:
+        HttpResponse with the snapshot payload, its ETag and a Cache-Control max-age of API_CACHE_MAX_AGE
+    """
+    etag = quote_etag(snapshot.etag)
+    if etag in [tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(bytes(snapshot.payload), content_type=snapshot.content_type)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.API_CACHE_MAX_AGE)
+    return response
 
 
 @api_view(['GET'])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, NPZRenderer])
 def music_analysis_data(request):
     """
     Get analyzed music feature data for visualization.
@@ -23,14 +56,132 @@ def music_analysis_data(request):
             - interval_size_dist: Interval size distribution
             - interval_dir_dist: Interval direction distribution
             - interval_transition_dist: Interval transition distribution
+            - trendlines: Per-genre OLS regression lines (coefficients, R², p-values, 95% confidence band) of the
+              feature pairs in the ANALYSIS_TRENDLINES setting, nested as trendlines[x][y][genre]
+        304: Not modified, if the If-None-Match header matches the current ETag
+        400: Unknown field requested
+        500: Error message if data processing fails
+    Query parameters:
+        fields (optional): Comma-separated columns of origin_df, e.g. ?fields=genre,npvi,note_density.
+            Defaults to every column except the per-track matrices pc_dist2 and iv_dist2, which are served per track
+            by GET /music/<id>/features/.
+
+    The response is served from a stored snapshot that is rebuilt when the music data changes.
+    Clients sending 'Accept: application/x-npz' (or ?format=npz) get the same data as a columnar NPZ archive,
+    see get_processed_music_columns.
+    """
+    try:
+        fields = get_analysis_fields([field for field in request.query_params.get('fields', '').split(',') if field])
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    try:
+        snapshot = get_analysis_snapshot(fields, request.accepted_renderer.format)
+    except Exception:
+        return Response({'error': 'An unexpected error occurred during data processing'}, status=500)
+    response = snapshot_response(request, snapshot)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, NPZRenderer])
+def music_analysis_section(request, section):
+    """
+    Get the part of the analysis data drawn by one tab of the Data Analysis page, so each tab can be loaded on its own.
+    Example request:
+        GET /api/feature-analysis/sections/rhythm/
+    Sections:
+        - keys: origin_df with genre and key
+        - rhythm: origin_df with genre, duration, npvi and note_density, and the trendlines
+        - pitch: pitch_class_dist and pitch_transition_dist
+        - intervals: interval_dist, interval_size_dist, interval_dir_dist and interval_transition_dist
+        - complexity: origin_df with genre, complexity, originality and gradus
+    Returns:
+        200: JSON containing the entries of the section, structured as in the feature analysis data
+        304: Not modified, if the If-None-Match header matches the current ETag
+        404: Unknown section
+        500: Error message if data processing fails
+
+    Like the feature analysis data, every section is served from its own stored snapshot, as JSON or (with
+    'Accept: application/x-npz') as a columnar NPZ archive.
+    """
+    if section not in analysis_sections:
+        return Response({'error': f"Unknown section: {section}. Must be one of: {', '.join(analysis_sections)}"},
+                        status=404)
+    try:
+        snapshot = get_section_snapshot(section, request.accepted_renderer.format)
+    except Exception:
+        return Response({'error': 'An unexpected error occurred during data processing'}, status=500)
+    response = snapshot_response(request, snapshot)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+@api_view(['GET'])
+def feature_histograms(request):
+    """
+    Get per-genre histograms and box plot statistics of the scalar music features.
+    Example request:
+        GET /api/feature-analysis/histograms/?bin_width=duration:30,npvi:2.5
+    Query parameters:
+        bin_width (optional): Comma-separated <feature>:<width> pairs. Features without a width use numpy's 'auto'
+            bins (1 semitone for pitch_range).
+    Returns:
+        200: JSON mapping each feature to its bin edges and, per genre, bin counts, quartiles, whiskers (lowerfence,
+            upperfence) and outliers. Keys are returned as per-genre category counts.
+        304: Not modified, if the If-None-Match header matches the current ETag
+        400: Invalid bin width
         500: Error message if data processing fails
 
+    Like the feature analysis data, the response is served from a stored snapshot that is rebuilt when the music
+    data changes.
     """
     try:
-        data = get_processed_music_data()
-        return JsonResponse(data, safe=False)
+        bin_widths = parse_bin_widths(request.query_params.get('bin_width', ''))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    try:
+        snapshot = get_histogram_snapshot(bin_widths)
     except Exception:
         return Response({'error': 'An unexpected error occurred during data processing'}, status=500)
+    return snapshot_response(request, snapshot)
+
+
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, NPZRenderer])
+def filtered_music_data(request):
+    """
+    Get the columns of the pop and classical tracks whose features are within given ranges, e.g. for scatter plots
+    of a filtered view.
+    Example request:
+        GET /api/feature-analysis/scatter/?fields=genre,pitch_range,duration,note_density&note_density=2:8
+    Query parameters:
+        fields (optional): Comma-separated columns, as for the feature analysis data
+        <feature> (optional): Range filter <min>:<max> of a numeric feature, e.g. note_density=2:8 or duration=:600.
+            Either bound can be left out. Filters on note_density, duration and pitch_range are served by indexes.
+    Returns:
+        200: JSON containing origin_df, the matching tracks ordered by id
+        400: Unknown field or invalid range
+        500: Error message if data processing fails
+
+    Clients sending 'Accept: application/x-npz' (or ?format=npz) get the columns as an NPZ archive, encoded like
+    origin_df of the feature analysis data. Responses may be cached for API_CACHE_MAX_AGE seconds.
+    """
+    try:
+        fields = [field for field in request.query_params.get('fields', '').split(',') if field]
+        ranges = parse_range_filters(request.query_params)
+        df = get_filtered_frame(fields, ranges)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    except Exception:
+        return Response({'error': 'An unexpected error occurred during data processing'}, status=500)
+    if request.accepted_renderer.format == 'npz':
+        response = Response(frame_columns(df))
+    else:
+        response = Response({'origin_df': frame_records(df)})
+    patch_cache_control(response, public=True, max_age=settings.API_CACHE_MAX_AGE)
+    patch_vary_headers(response, ['Accept'])
+    return response
 
 
 class MusicViewSet(viewsets.ReadOnlyModelViewSet):
@@ -38,29 +189,66 @@ class MusicViewSet(viewsets.ReadOnlyModelViewSet):
     ViewSet for retrieving music tracks.
 
     Endpoints:
-        GET /music/ - List all music tracks
+        GET /music/ - List music tracks by id, a page at a time
         GET /music/<id>/ - Retrieve specific music track
         GET /music/random/ - Get a random music track
+        GET /music/random_batch/ - Get several distinct random music tracks
+        GET /music/<id>/features/ - Get feature arrays of a music track
+
+    Track data may be cached by clients for API_CACHE_MAX_AGE seconds and revalidated with its ETag, which
+    ConditionalGetMiddleware derives from the response content. Random picks are never cached.
+    Random picks link the tracks' clips instead of their full-length files, see MusicClipSerializer.
+    The track list is paginated by id with cursors, see MusicPagination.
     """
-    queryset = Music.objects.all()
+    # the feature columns, above all the distribution arrays, are never serialized
+    queryset = Music.objects.only('id', 'title', 'label', 'file', 'clip')
     serializer_class = MusicSerializer
+    pagination_class = MusicPagination
+
+    def get_serializer_class(self):
+        if self.action in ('random', 'random_batch'):
+            return MusicClipSerializer
+        return super().get_serializer_class()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.action in ('random', 'random_batch'):
+            patch_cache_control(response, no_store=True)
+        elif request.method == 'GET' and response.status_code == 200:
+            patch_cache_control(response, public=True, max_age=settings.API_CACHE_MAX_AGE)
+        return response
 
     @action(detail=False, methods=['get'])
     def random(self, request):
         """
+        Picks a label, then a track within that label, from an in-memory index of track ids.
+        Example request:
+            GET /api/music/random/?balance=origin
+        Query parameters:
+            balance (optional): 'label' for equal odds per label, 'origin' for equal odds of human and AI tracks.
+                Defaults to the RANDOM_TRACK_BALANCE setting.
         Returns:
             Response with random track data or error message if no tracks available
             Returns:
                 200: Successful response with track data
+                400: Invalid balance mode
                 404: No tracks available
                 500: Server error
         """
         try:
-            labels = Music.objects.values_list('label', flat=True).distinct()
-            if not list(labels):
-                return Response({'error': 'No music tracks available in the database'}, status=404)
-            random_label = choice(labels)
-            random_track = Music.objects.filter(label=random_label).order_by('?').first()
+            balance = request.query_params.get('balance', settings.RANDOM_TRACK_BALANCE)
+            if balance not in BALANCE_MODES:
+                return Response({'error': f"Balance must be one of: {', '.join(BALANCE_MODES)}"}, status=400)
+            random_track = None
+            for _ in range(2):
+                track_id = track_sampler.sample_id(balance)
+                if track_id is None:
+                    return Response({'error': 'No music tracks available in the database'}, status=404)
+                random_track = self.get_queryset().filter(id=track_id).first()
+                if random_track:
+                    break
+                # the index is stale, e.g. the track was deleted by another process
+                track_sampler.invalidate()
             if not random_track:
                 return Response({'error': 'No tracks available'}, status=404)
             serializer = self.get_serializer(random_track)
@@ -69,19 +257,104 @@ class MusicViewSet(viewsets.ReadOnlyModelViewSet):
             error_details = str(e) if settings.DEBUG else 'An unexpected error occurred'
             return Response({'error': error_details}, status=500)
 
+    @action(detail=False, methods=['get'])
+    def random_batch(self, request):
+        """
+        Returns n distinct random tracks, so clients can queue up the next tracks of the Turing test.
+        Example request:
+            GET /api/music/random_batch/?n=5&balance=origin
+        Query parameters:
+            n (optional): Number of tracks, between 1 and RANDOM_BATCH_MAX_SIZE. Defaults to 5.
+            balance (optional): Label balancing mode, see random
+        Returns:
+            200: List of track data, shorter than n if there are not enough tracks
+            400: Invalid n or balance mode
+            404: No tracks available
+            500: Server error
+        """
+        try:
+            try:
+                n = int(request.query_params.get('n', 5))
+            except ValueError:
+                n = 0
+            if not 1 <= n <= settings.RANDOM_BATCH_MAX_SIZE:
+                return Response({'error': f'n must be between 1 and {settings.RANDOM_BATCH_MAX_SIZE}'}, status=400)
+            balance = request.query_params.get('balance', settings.RANDOM_TRACK_BALANCE)
+            if balance not in BALANCE_MODES:
+                return Response({'error': f"Balance must be one of: {', '.join(BALANCE_MODES)}"}, status=400)
+            for _ in range(2):
+                track_ids = track_sampler.sample_ids(n, balance)
+                tracks = self.get_queryset().in_bulk(track_ids)
+                if len(tracks) == len(track_ids):
+                    break
+                # the index is stale, e.g. tracks were deleted by another process
+                track_sampler.invalidate()
+            if not tracks:
+                return Response({'error': 'No music tracks available in the database'}, status=404)
+            serializer = self.get_serializer([tracks[i] for i in track_ids if i in tracks], many=True)
+            return Response(serializer.data, status=200)
+        except Exception as e:
+            error_details = str(e) if settings.DEBUG else 'An unexpected error occurred'
+            return Response({'error': error_details}, status=500)
+
+    @action(detail=True, methods=['get'])
+    def features(self, request, pk=None):
+        """
+        Returns feature columns of a single track, e.g. the per-track matrices left out of the feature analysis data.
+        Example request:
+            GET /api/music/12/features/?fields=pc_dist1,pc_dist2
+        Query parameters:
+            fields (optional): Comma-separated feature columns. Defaults to the per-track matrices pc_dist2 and
+                iv_dist2.
+        Returns:
+            200: Track id and the requested features
+            400: Unknown field requested
+            404: Track not found
+            500: Server error
+        """
+        fields = [field for field in request.query_params.get('fields', '').split(',') if field]
+        feature_fields = [field for field in analysis_fields if field not in ('id', 'genre')]
+        unknown = sorted(set(fields) - set(feature_fields) - {'id'})
+        if unknown:
+            return Response({'error': f"Unknown fields: {', '.join(unknown)}"}, status=400)
+        fields = [field for field in feature_fields if field in (fields or per_track_matrix_fields)]
+        try:
+            features = Music.objects.filter(pk=pk).values('id', *fields).first()
+            if features is None:
+                return Response({'error': 'Song not found'}, status=404)
+            return Response(features, status=200)
+        except ValueError:
+            return Response({'error': 'Song not found'}, status=404)
+        except Exception as e:
+            error_details = str(e) if settings.DEBUG else 'An unexpected error occurred'
+            return Response({'error': error_details}, status=500)
+
 
 class RatingViewSet(viewsets.ModelViewSet):
     """
     ViewSet for managing music ratings.
 
     Endpoints:
-        GET /ratings/ - List all ratings
+        GET /ratings/ - List ratings newest first, a page at a time
         GET /ratings/<id>/ - Get ratings information with a specific rating ID
         GET /ratings/song_ratings/ - Get ratings for a specific song
         POST /ratings/rate_song/ - Submit a rating for a song
+        POST /ratings/rate_batch/ - Submit several ratings at once
+        GET /ratings/stats/ - Get rating statistics per song and per label
+
+    Ratings change with every submission, so clients have to revalidate them on each use; the ETag is derived from
+    the response content by ConditionalGetMiddleware.
+    Rating lists are paginated newest first with cursors, see RatingPagination.
     """
     queryset = Rating.objects.all()
     serializer_class = RatingSerializer
+    pagination_class = RatingPagination
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method == 'GET' and response.status_code == 200:
+            patch_cache_control(response, no_cache=True)
+        return response
 
     @action(detail=False, methods=['post'])
     def rate_song(self, request):
@@ -112,7 +385,8 @@ class RatingViewSet(viewsets.ModelViewSet):
 
             serializer = self.get_serializer(data={'song': song_id, 'rating': rating})
             if serializer.is_valid():
-                serializer.save()
+                with transaction.atomic():
+                    serializer.save()
                 return Response(serializer.data, status=201)
             return Response(serializer.errors, status=400)
 
@@ -120,16 +394,60 @@ class RatingViewSet(viewsets.ModelViewSet):
             error_details = str(e) if settings.DEBUG else 'An unexpected error occurred'
             return Response({'error': error_details}, status=500)
 
+    @action(detail=False, methods=['post'])
+    def rate_batch(self, request):
+        """
+        Submit several ratings at once. The batch is validated as a whole and stored in a single transaction.
+        Example request:
+            POST /ratings/rate_batch/
+            [
+                {"song": 123, "rating": 4},
+                {"song": 456, "rating": 1}
+            ]
+        Returns:
+            201: List of created ratings
+            400: Invalid input
+            404: One or more songs not found
+            500: Server error
+        """
+        try:
+            if not isinstance(request.data, list) or not request.data:
+                return Response({'error': 'A non-empty list of ratings is required'}, status=400)
+            if len(request.data) > settings.RATING_BATCH_MAX_SIZE:
+                return Response({'error': f'At most {settings.RATING_BATCH_MAX_SIZE} ratings can be submitted at once'},
+                                status=400)
+            serializer = RatingBatchItemSerializer(data=request.data, many=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+
+            song_ids = {item['song'] for item in serializer.validated_data}
+            existing_ids = set(Music.objects.filter(id__in=song_ids).values_list('id', flat=True))
+            missing_ids = song_ids - existing_ids
+            if missing_ids:
+                return Response({'error': 'Song not found', 'songs': sorted(missing_ids)}, status=404)
+
+            with transaction.atomic():
+                ratings = Rating.objects.bulk_create(
+                    [Rating(song_id=item['song'], rating=item['rating']) for item in serializer.validated_data]
+                )
+                # bulk_create does not send post_save, so the statistics are updated here
+                apply_rating_changes(added=[(rating.song_id, rating.rating) for rating in ratings])
+            return Response(RatingSerializer(ratings, many=True).data, status=201)
+
+        except Exception as e:
+            error_details = str(e) if settings.DEBUG else 'An unexpected error occurred'
+            return Response({'error': error_details}, status=500)
+
     @action(detail=False, methods=['get'])
     def song_ratings(self, request):
         """
-        Retrieve all ratings for a specific track.
+        Retrieve the ratings of a specific track, newest first.
         Example request:
             GET /api/ratings/song_ratings/?song=15002
         Returns:
-            200: List of ratings
+            200: Page of ratings with the cursor links of the next and previous pages
             400: Missing song ID
-            404: Song not found
+            404: Song not found or invalid cursor
             500: Server error
         """
         try:
@@ -139,9 +457,39 @@ class RatingViewSet(viewsets.ModelViewSet):
             if not Music.objects.filter(id=song_id).exists():
                 return Response({'error': 'Song not found'}, status=404)
 
-            ratings = Rating.objects.filter(song_id=song_id)
+            ratings = self.paginate_queryset(Rating.objects.filter(song_id=song_id))
             serializer = self.get_serializer(ratings, many=True)
-            return Response(serializer.data, status=200)
+            return self.get_paginated_response(serializer.data)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=404)
         except Exception as e:
             error_details = str(e) if not settings.DEBUG else 'An unexpected error occurred'
             return Response({'error': error_details}, status=500)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Retrieve precomputed rating statistics of one or more tracks, and the fooled rate of every label.
+        The fooled rate is the share of ratings that judged human-made tracks as AI (1-2), or AI-generated tracks
+        as human (4-5).
+        Example request:
+            GET /api/ratings/stats/?song=15002&song=15003
+        Returns:
+            200: JSON containing:
+                - songs: Count, mean, standard deviation and 1-5 histogram of each requested track
+                - labels: Count, histogram and fooled rate of each label
+            400: Invalid song ID
+            500: Server error
+        """
+        try:
+            song_ids = request.query_params.getlist('song')
+            if not all(song_id.isdigit() for song_id in song_ids):
+                return Response({'error': 'Song IDs must be integers'}, status=400)
+            stats = RatingStats.objects.filter(song_id__in=song_ids) if song_ids else RatingStats.objects.none()
+            return Response({
+                'songs': RatingStatsSerializer(stats, many=True).data,
+                'labels': get_label_stats(),
+            }, status=200)
+        except Exception as e:
+            error_details = str(e) if settings.DEBUG else 'An unexpected error occurred'
+            return Response({'error': error_details}, status=500)
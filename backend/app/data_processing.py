@@ -1,7 +1,11 @@
 import numpy as np
 import pandas as pd
 
+from django.conf import settings
+from django.db import connection
+
 from .models import Music
+from .regression import fit_ols
 
 pitch_classes = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 intervals = [
@@ -10,12 +14,156 @@ intervals = [
     '+M3', '+P4', '+d5', '+P5', '+m6', '+M6', '+m7', '+M7', '+P8'
 ]
 intervals_without_directions = ['P1', 'MI2', 'MA2', 'MI3', 'MA3', 'P4', 'D5', 'P5', 'MI6', 'MA6', 'MI7', 'MA7', 'P8']
+genres = ['pop', 'classical']
+distribution_shapes = {
+    'pc_dist1': (12,),
+    'iv_dist1': (25,),
+    'ivsize_dist1': (13,),
+    'ivdir_dist1': (12,),
+    'pc_dist2': (12, 12),
+    'iv_dist2': (25, 25),
+}
+# Columns that can be projected into origin_df. Per-track matrices are only sent when requested explicitly, since
+# the page works with their genre means; single tracks' matrices are served by the music features endpoint.
+analysis_fields = [field.name for field in Music._meta.concrete_fields] + ['genre']
+per_track_matrix_fields = ['pc_dist2', 'iv_dist2']
+default_analysis_fields = [field for field in analysis_fields if field not in per_track_matrix_fields]
+# Numeric columns whose value ranges can filter the scatter data. Range queries on note_density, duration and
+# pitch_range are served by indexes, see Music.Meta.indexes.
+range_filter_fields = [field.name for field in Music._meta.concrete_fields
+                       if field.get_internal_type() in ('FloatField', 'IntegerField')]
+# Parts of the analysis data drawn by each tab of the Data Analysis page, served separately so every tab only waits
+# for its own data: the origin_df columns, the distributions and whether the trendlines are included
+analysis_sections = {
+    'keys': {'fields': ['genre', 'key']},
+    'rhythm': {'fields': ['genre', 'duration', 'npvi', 'note_density'], 'trendlines': True},
+    'pitch': {'distributions': ['pitch_class_dist', 'pitch_transition_dist']},
+    'intervals': {'distributions': ['interval_dist', 'interval_size_dist', 'interval_dir_dist',
+                                    'interval_transition_dist']},
+    'complexity': {'fields': ['genre', 'complexity', 'originality', 'gradus']},
+}
+
+
+def get_analysis_fields(fields=None):
+    """
+    Validates a field projection of origin_df and puts it in canonical order, so equal projections share a snapshot.
+    Args:
+        fields (list, optional): Requested column names. Defaults to every column except the per-track matrices.
+    Returns:
+        list: Requested columns, in the order of analysis_fields
+    Raises:
+        ValueError: If a requested column does not exist
+    """
+    if not fields:
+        return list(default_analysis_fields)
+    unknown = sorted(set(fields) - set(analysis_fields))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [field for field in analysis_fields if field in fields]
+
+
+def parse_range_filters(params):
+    """
+    Parses the range filters of numeric features from query parameters.
+    Args:
+        params (dict): Query parameters. <feature>=<min>:<max> keeps the tracks whose feature is within [min, max],
+            for features of range_filter_fields. Either bound can be left out, e.g. note_density=2:8 or duration=:600.
+            Other parameters are ignored.
+    Returns:
+        dict: Maps features to (min, max) tuples, with None for open bounds
+    Raises:
+        ValueError: If a filter is malformed or its bounds are not numbers
+    """
+    ranges = {}
+    for feature in range_filter_fields:
+        value = params.get(feature)
+        if value is None:
+            continue
+        low, separator, high = value.partition(':')
+        if not separator:
+            raise ValueError(f'Range of {feature} must be given as <min>:<max>')
+        try:
+            bounds = tuple(float(bound) if bound else None for bound in (low, high))
+        except ValueError:
+            raise ValueError(f'Range bounds of {feature} must be numbers')
+        if not all(bound is None or np.isfinite(bound) for bound in bounds):
+            raise ValueError(f'Range bounds of {feature} must be finite')
+        ranges[feature] = bounds
+    return ranges
+
+
+def get_filtered_frame(fields=None, ranges=None):
+    """
+    Loads the pop and classical tracks whose features are within the given ranges, e.g. to draw a filtered scatter
+    plot without the whole corpus.
+    Args:
+        fields (list, optional): Columns to load, see get_analysis_fields
+        ranges (dict, optional): Maps features to (min, max) bounds, see parse_range_filters
+    Returns:
+        DataFrame: One row per matching track, ordered by id. Empty, but with the requested columns, if no track
+            matches.
+    """
+    fields = get_analysis_fields(fields)
+    df = load_analysis_frame(fields, ranges)
+    if df is None:
+        numeric = set(range_filter_fields) | {'id'}
+        df = pd.DataFrame({field: pd.Series(dtype=float if field in numeric else object) for field in fields})
+    return df
+
+
+def frame_records(df):
+    """
+    Converts an analysis DataFrame to JSON-serializable records, with NumPy numbers and arrays as Python values.
+    Args:
+        df (DataFrame): Analysis data, e.g. from load_analysis_frame
+    Returns:
+        list: One dict per row
+    """
+    data = df.to_dict(orient='records')
+    for item in data:
+        for key, value in item.items():
+            if isinstance(value, (np.int64, np.float64)):
+                item[key] = float(value)
+            elif isinstance(value, np.ndarray):
+                item[key] = value.tolist()
+    return data
+
+
+def frame_columns(df, section='origin_df'):
+    """
+    Converts an analysis DataFrame to the column arrays of the columnar NPZ transport, see
+    get_processed_music_columns.
+    Args:
+        df (DataFrame): Analysis data, e.g. from load_analysis_frame
+        section (str): Prefix of the entry names
+    Returns:
+        dict: Maps '<section>/<column>' entry names to arrays
+    """
+    columns = {}
+    for column in df.columns:
+        if column in distribution_shapes:
+            stack = np.full((len(df), *distribution_shapes[column]), np.nan, dtype=np.float32)
+            valid = df[column].notna().to_numpy()
+            if valid.any():
+                stack[valid] = np.array(df.loc[valid, column].tolist(), dtype=np.float32)
+            columns[f'{section}/{column}'] = stack
+        elif column == 'id':
+            columns[f'{section}/id'] = df['id'].to_numpy(dtype=np.int64)
+        elif pd.api.types.is_numeric_dtype(df[column]):
+            columns[f'{section}/{column}'] = df[column].to_numpy(dtype=np.float32, na_value=np.nan)
+        else:
+            categorical = pd.Categorical(df[column].where(df[column].notna() & (df[column] != ''), None))
+            columns[f'{section}/{column}.codes'] = categorical.codes
+            columns[f'{section}/{column}.categories'] = np.array(categorical.categories, dtype=str)
+    return columns
 
 
-def get_processed_music_data():
+def get_processed_music_data(fields=None):
     """
     Aggregates and processes music data from the database into statistical distributions and transition matrices.
     Separates analysis by genre and handles various musical features.
+    Args:
+        fields (list, optional): Columns of origin_df, see get_analysis_fields
 
     Returns:
         dict: Processed statistical data for music analysis visualization
@@ -24,37 +172,314 @@ def get_processed_music_data():
         This function supports the music_analysis_data endpoint.
         See the endpoint documentation for detailed response structure.
     """
-    music_data = Music.objects.filter(label__in=['pop', 'classical']).values()
-    if not music_data:
+    df = load_analysis_frame(get_analysis_fields(fields))
+    if df is None:
+        return {'error': 'No music data available for analysis'}
+    means = compute_genre_means()
+    processed_data = {'origin_df': frame_records(df), **get_distributions(means), 'trendlines': get_trendlines()}
+
+    return processed_data
+
+
+def get_processed_music_columns(fields=None):
+    """
+    Columnar variant of get_processed_music_data, for binary transport.
+    Every entry is a NumPy array named '<section>/<key>':
+        - origin_df/<column>: float32 values of numeric columns (int64 for ids)
+        - origin_df/<column>.codes and origin_df/<column>.categories: text columns as categorical codes (-1 for
+          missing values) and their categories
+        - origin_df/<column>: (n_tracks, *shape) float32 stacks of array columns, NaN for missing arrays
+        - <distribution>/<genre>: float32 mean vector or transition matrix of a genre
+        - <distribution>/<labels key>: labels of a distribution
+        - trendlines/<x feature>/<y feature>/<genre>/<statistic>: regression line statistics, see get_trendlines.
+          Genres whose line can not be fitted are left out.
+    Args:
+        fields (list, optional): Columns of origin_df, see get_analysis_fields
+    Returns:
+        dict: Maps entry names to arrays, or {'error': message} if there is no data
+    """
+    df = load_analysis_frame(get_analysis_fields(fields))
+    if df is None:
+        return {'error': 'No music data available for analysis'}
+    means = compute_genre_means()
+    return {
+        **frame_columns(df),
+        **distribution_columns(get_distributions(means)),
+        **trendline_columns(get_trendlines()),
+    }
+
+
+def load_section(section):
+    """
+    Loads the parts of the analysis data drawn by one tab of the Data Analysis page, see analysis_sections.
+    Args:
+        section (str): Section name
+    Returns:
+        tuple: (origin_df DataFrame or None, dict of distributions, trendlines dict or None), or None if there is no
+            data
+    """
+    spec = analysis_sections[section]
+    if not Music.objects.filter(label__in=genres).exists():
+        return None
+    df = None
+    if 'fields' in spec:
+        df = load_analysis_frame(spec['fields'])
+        if df is None:
+            return None
+    distributions = {}
+    if 'distributions' in spec:
+        all_distributions = get_distributions(compute_genre_means())
+        distributions = {name: all_distributions[name] for name in spec['distributions']}
+    trendlines = get_trendlines() if spec.get('trendlines') else None
+    return df, distributions, trendlines
+
+
+def get_section_data(section):
+    """
+    Returns one section of the analysis data, with the same structure as the matching entries of
+    get_processed_music_data.
+    Args:
+        section (str): Section name, see analysis_sections
+    Returns:
+        dict: origin_df records, distributions and trendlines of the section, or {'error': message} if there is no
+            data
+    """
+    loaded = load_section(section)
+    if loaded is None:
         return {'error': 'No music data available for analysis'}
+    df, distributions, trendlines = loaded
+    data = dict(distributions)
+    if df is not None:
+        data['origin_df'] = frame_records(df)
+    if trendlines is not None:
+        data['trendlines'] = trendlines
+    return data
+
+
+def get_section_columns(section):
+    """
+    Columnar variant of get_section_data, encoded like get_processed_music_columns.
+    Args:
+        section (str): Section name, see analysis_sections
+    Returns:
+        dict: Maps entry names to arrays, or {'error': message} if there is no data
+    """
+    loaded = load_section(section)
+    if loaded is None:
+        return {'error': 'No music data available for analysis'}
+    df, distributions, trendlines = loaded
+    columns = distribution_columns(distributions)
+    if df is not None:
+        columns.update(frame_columns(df))
+    if trendlines is not None:
+        columns.update(trendline_columns(trendlines))
+    return columns
+
+
+def distribution_columns(distributions):
+    """
+    Converts distribution sections to the arrays of the columnar NPZ transport, see get_processed_music_columns.
+    Args:
+        distributions (dict): Maps section names to their data, as returned by get_distributions
+    Returns:
+        dict: Maps '<section>/<key>' entry names to arrays
+    """
+    columns = {}
+    for section, distribution in distributions.items():
+        for key, value in distribution.items():
+            if isinstance(value, dict):
+                value = value['data']
+            elif all(isinstance(item, str) for item in value):
+                columns[f'{section}/{key}'] = np.array(value, dtype=str)
+                continue
+            columns[f'{section}/{key}'] = np.array(value, dtype=np.float32)
+    return columns
+
+
+def trendline_columns(trendlines):
+    """
+    Converts trendlines to the arrays of the columnar NPZ transport, leaving out lines that can not be fitted.
+    Args:
+        trendlines (dict): Trendlines as returned by get_trendlines
+    Returns:
+        dict: Maps 'trendlines/<x feature>/<y feature>/<genre>/<statistic>' entry names to arrays
+    """
+    columns = {}
+    for x_feature, fits_by_y in trendlines.items():
+        for y_feature, fits in fits_by_y.items():
+            for genre, fit in fits.items():
+                for key, value in (fit or {}).items():
+                    columns[f'trendlines/{x_feature}/{y_feature}/{genre}/{key}'] = np.array(value, dtype=np.float32)
+    return columns
+
+
+def load_analysis_frame(fields=None, ranges=None):
+    """
+    Loads the pop and classical tracks into a DataFrame with an added 'genre' column.
+    Only the requested columns are read from the database.
+    Args:
+        fields (list, optional): Columns to load, from analysis_fields. Defaults to every column.
+        ranges (dict, optional): Maps features to (min, max) bounds, see parse_range_filters. Only tracks within
+            every range are loaded.
+    Returns:
+        DataFrame: One row per track, ordered by id, or None if there are no tracks
+    """
+    fields = fields or analysis_fields
+    db_fields = [field for field in fields if field != 'genre']
+    if 'genre' in fields and 'label' not in db_fields:
+        db_fields.append('label')
+    music_data = Music.objects.filter(label__in=genres)
+    if ranges:
+        for feature, (low, high) in ranges.items():
+            if low is not None:
+                music_data = music_data.filter(**{f'{feature}__gte': low})
+            if high is not None:
+                music_data = music_data.filter(**{f'{feature}__lte': high})
+    music_data = music_data.order_by('id').values(*db_fields)
+    if not music_data:
+        return None
     df = pd.DataFrame(music_data)
-    df['genre'] = df['label']
-    data = df.to_dict(orient='records')
-    for item in data:
-        for key, value in item.items():
-            if isinstance(value, (np.int64, np.float64)):
-                item[key] = float(value)
-            elif isinstance(value, np.ndarray):
-                item[key] = value.tolist()
-    processed_data = {
-        'origin_df': data,
-        'pitch_class_dist': get_pitch_class_distribution(df),
-        'pitch_transition_dist': get_pitch_transition_distribution(df),
-        'interval_dist': get_interval_distribution(df),
-        'interval_size_dist': get_interval_size_distribution(df),
-        'interval_dir_dist': get_interval_dir_distribution(df),
-        'interval_transition_dist': get_interval_transition_distribution(df),
+    if 'genre' in fields:
+        df['genre'] = df['label']
+    return df[fields]
+
+
+def get_trendlines(pairs=None, confidence=0.95):
+    """
+    Fits an OLS regression line per genre for every configured pair of features, so scatter plots can show
+    trendlines without fitting them on every page rerun.
+    Args:
+        pairs (list, optional): (x feature, y feature) tuples. Defaults to the ANALYSIS_TRENDLINES setting.
+        confidence (float): Confidence level of the bands around the lines
+    Returns:
+        dict: Maps x feature -> y feature -> genre -> fit_ols result, which is None if the line can not be fitted
+    """
+    pairs = settings.ANALYSIS_TRENDLINES if pairs is None else pairs
+    features = list(dict.fromkeys(feature for pair in pairs for feature in pair))
+    df = load_analysis_frame(['genre', *features])
+    trendlines = {}
+    for x_feature, y_feature in pairs:
+        fits = trendlines.setdefault(x_feature, {})[y_feature] = {}
+        for genre in genres:
+            values = df.loc[df['genre'] == genre, [x_feature, y_feature]].astype(np.float64).dropna()
+            fits[genre] = fit_ols(values[x_feature].to_numpy(), values[y_feature].to_numpy(), confidence)
+    return trendlines
+
+
+def get_distributions(means):
+    """
+    Builds every distribution section of the analysis response from the per-genre means.
+    Args:
+        means (dict): Per-genre distribution means from compute_genre_means
+    Returns:
+        dict: Maps section names (e.g. 'pitch_class_dist') to their data
+    """
+    return {
+        'pitch_class_dist': get_pitch_class_distribution(means),
+        'pitch_transition_dist': get_pitch_transition_distribution(means),
+        'interval_dist': get_interval_distribution(means),
+        'interval_size_dist': get_interval_size_distribution(means),
+        'interval_dir_dist': get_interval_dir_distribution(means),
+        'interval_transition_dist': get_interval_transition_distribution(means),
     }
 
-    return processed_data
 
+def stack_distributions(df):
+    """
+    Packs every distribution column into one contiguous float array, so all genre means are taken from the same
+    buffers. Tracks with a NULL array are left out of that column's stack.
+    Args:
+        df (DataFrame): Dataset containing a 'genre' column and the distribution columns
+    Returns:
+        dict: Maps each distribution column to a tuple of:
+            - Array of shape (n_tracks, *distribution shape)
+            - Array of the genre of each stacked track
+    """
+    stacks = {}
+    for column, shape in distribution_shapes.items():
+        valid = df[column].notna()
+        values = np.array(df.loc[valid, column].tolist(), dtype=np.float64).reshape(-1, *shape)
+        stacks[column] = values, df.loc[valid, 'genre'].to_numpy()
+    return stacks
 
-def get_pitch_class_distribution(df):
+
+def get_genre_means(df):
+    """
+    Computes the mean of every distribution column for each genre in a single pass over the stacked arrays.
+    Args:
+        df (DataFrame): Dataset containing a 'genre' column and the distribution columns
+    Returns:
+        dict: Maps each distribution column to a dict of genre -> mean array
+    Raises:
+        ValueError: If a genre has no data for one of the distribution columns
+    """
+    means = {}
+    for column, (values, labels) in stack_distributions(df).items():
+        means[column] = {}
+        for genre in genres:
+            genre_values = values[labels == genre]
+            if not len(genre_values):
+                raise ValueError(f'No {column} data available for {genre} music')
+            means[column][genre] = genre_values.mean(axis=0)
+    return means
+
+
+def compute_genre_means():
+    """
+    Computes the per-genre distribution means with the configured aggregation backend.
+    The 'database' backend is only available on PostgreSQL; other databases fall back to the Python path, which
+    loads the distribution columns itself.
+    Returns:
+        dict: Maps each distribution column to a dict of genre -> mean array
+    """
+    if settings.ANALYSIS_AGGREGATION == 'database' and connection.vendor == 'postgresql':
+        return get_genre_means_from_database()
+    return get_genre_means(load_analysis_frame(['genre', *distribution_shapes]))
+
+
+def get_genre_means_from_database():
+    """
+    Computes the per-genre distribution means inside PostgreSQL, so only the final vectors and matrices are
+    transferred. Multidimensional arrays are unnested in row-major order, so the element ordinality gives the
+    position in the flattened matrix. Tracks with a NULL array are left out of that column's mean.
+    Returns:
+        dict: Maps each distribution column to a dict of genre -> mean array
+    Raises:
+        ValueError: If a genre has no data for one of the distribution columns
+    """
+    table = connection.ops.quote_name(Music._meta.db_table)
+    queries = []
+    for column in distribution_shapes:
+        db_column = connection.ops.quote_name(Music._meta.get_field(column).column)
+        queries.append(
+            f"SELECT '{column}' AS distribution, label, element.ordinality, AVG(element.value) "
+            f"FROM {table} CROSS JOIN LATERAL unnest({db_column}) WITH ORDINALITY AS element(value, ordinality) "
+            f"WHERE label = ANY(%s) AND {db_column} IS NOT NULL "
+            f"GROUP BY label, element.ordinality"
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join(queries) + ' ORDER BY 1, 2, 3', [genres] * len(queries))
+        rows = cursor.fetchall()
+
+    flat = {column: {} for column in distribution_shapes}
+    for column, genre, _, value in rows:
+        flat[column].setdefault(genre, []).append(value)
+    means = {}
+    for column, shape in distribution_shapes.items():
+        means[column] = {}
+        for genre in genres:
+            if genre not in flat[column]:
+                raise ValueError(f'No {column} data available for {genre} music')
+            means[column][genre] = np.array(flat[column][genre], dtype=np.float64).reshape(shape)
+    return means
+
+
+def get_pitch_class_distribution(means):
     """
     Analyzes the frequency distribution of the 12 pitch classes (C, C#, D, etc.) in musical pieces.
     This shows which notes are most commonly used in each genre.
     Args:
-        df (DataFrame): Dataset containing musical features for each piece
+        means (dict): Per-genre distribution means from get_genre_means
     Returns:
         dict: Contains:
             - 'pop': List of mean probabilities for each pitch class in pop music
@@ -62,39 +487,38 @@ def get_pitch_class_distribution(df):
             - 'pitch_classes': List of pitch class labels (C through B)
     """
     return {
-        'pop': df[df['genre'] == 'pop']['pc_dist1'].apply(pd.Series).mean().tolist(),
-        'classical': df[df['genre'] == 'classical']['pc_dist1'].apply(pd.Series).mean().tolist(),
+        'pop': means['pc_dist1']['pop'].tolist(),
+        'classical': means['pc_dist1']['classical'].tolist(),
         'pitch_classes': pitch_classes
     }
 
 
-def get_pitch_transition_distribution(df):
+def get_pitch_transition_distribution(means):
     """
     Analyzes how often one pitch moves to another in musical sequences.
     For example, how often C is followed by G, or E by F#.
     Args:
-        df (DataFrame): Dataset containing musical features for each piece
+        means (dict): Per-genre distribution means from get_genre_means
     Returns:
         dict: Contains:
             - 'pop': Transition probability matrix for pop music
             - 'classical': Transition probability matrix for classical music
             - 'labels': List of pitch class labels (C through B)
     """
-    result = {}
-    for genre in ['pop', 'classical']:
-        sampled_data = df[df['genre'] == genre]['pc_dist2'].dropna()
-        mean_df = pd.DataFrame(np.mean(np.stack(sampled_data), axis=0), index=pitch_classes, columns=pitch_classes)
-        result[genre] = mean_df.to_dict(orient='split')
+    result = {
+        genre: {'index': pitch_classes, 'columns': pitch_classes, 'data': means['pc_dist2'][genre].tolist()}
+        for genre in genres
+    }
     result['labels'] = pitch_classes
     return result
 
 
-def get_interval_distribution(df):
+def get_interval_distribution(means):
     """
     Analyzes the frequency of pitch intervals (pitch differences between consecutive notes).
     Includes both size and direction (e.g., ascending perfect fifth, descending major third).
     Args:
-        df (DataFrame): Dataset containing musical features for each piece
+        means (dict): Per-genre distribution means from get_genre_means
     Returns:
         dict: Contains:
             - 'pop': List of interval probabilities in pop music
@@ -102,18 +526,18 @@ def get_interval_distribution(df):
             - 'intervals': List of interval labels
     """
     return {
-        'pop': df[df['genre'] == 'pop']['iv_dist1'].apply(pd.Series).mean().tolist(),
-        'classical': df[df['genre'] == 'classical']['iv_dist1'].apply(pd.Series).mean().tolist(),
+        'pop': means['iv_dist1']['pop'].tolist(),
+        'classical': means['iv_dist1']['classical'].tolist(),
         'intervals': intervals
     }
 
 
-def get_interval_size_distribution(df):
+def get_interval_size_distribution(means):
     """
     Analyzes the frequency of interval sizes regardless of direction.
     For example, treats ascending and descending perfect fifths as the same category.
     Args:
-        df (DataFrame): Dataset containing musical features for each piece
+        means (dict): Per-genre distribution means from get_genre_means
     Returns:
         dict: Contains:
             - 'pop': List of interval size probabilities in pop music
@@ -121,18 +545,18 @@ def get_interval_size_distribution(df):
             - 'intervals': List of interval size labels
     """
     return {
-        'pop': df[df['genre'] == 'pop']['ivsize_dist1'].apply(pd.Series).mean().tolist(),
-        'classical': df[df['genre'] == 'classical']['ivsize_dist1'].apply(pd.Series).mean().tolist(),
+        'pop': means['ivsize_dist1']['pop'].tolist(),
+        'classical': means['ivsize_dist1']['classical'].tolist(),
         'intervals': intervals_without_directions
     }
 
 
-def get_interval_dir_distribution(df):
+def get_interval_dir_distribution(means):
     """
     Analyzes whether intervals tend to move upward or downward in pitch.
     Excludes unison (P1) since it has no direction.
     Args:
-        df (DataFrame): Dataset containing musical features for each piece
+        means (dict): Per-genre distribution means from get_genre_means
     Returns:
         dict: Contains:
             - 'pop': List of directional tendencies in pop music
@@ -140,28 +564,27 @@ def get_interval_dir_distribution(df):
             - 'intervals': List of interval labels (excluding unison)
     """
     return {
-        'pop': df[df['genre'] == 'pop']['ivdir_dist1'].apply(pd.Series).mean().tolist(),
-        'classical': df[df['genre'] == 'classical']['ivdir_dist1'].apply(pd.Series).mean().tolist(),
+        'pop': means['ivdir_dist1']['pop'].tolist(),
+        'classical': means['ivdir_dist1']['classical'].tolist(),
         'intervals': intervals_without_directions[1:]
     }
 
 
-def get_interval_transition_distribution(df):
+def get_interval_transition_distribution(means):
     """
     Analyzes patterns in how one interval is followed by another.
     For example, how often a rising third is followed by a falling fifth.
     Args:
-        df (DataFrame): Dataset containing musical features for each piece
+        means (dict): Per-genre distribution means from get_genre_means
     Returns:
         dict: Contains:
             - 'pop': Interval transition matrix for pop music
             - 'classical': Interval transition matrix for classical music
             - 'labels': List of interval labels
     """
-    result = {}
-    for genre in ['pop', 'classical']:
-        sampled_data = df[df['genre'] == genre]['iv_dist2'].dropna()
-        mean_df = pd.DataFrame(np.mean(np.stack(sampled_data), axis=0), index=intervals, columns=intervals)
-        result[genre] = mean_df.to_dict(orient='split')
+    result = {
+        genre: {'index': intervals, 'columns': intervals, 'data': means['iv_dist2'][genre].tolist()}
+        for genre in genres
+    }
     result['labels'] = intervals
     return result
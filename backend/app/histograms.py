@@ -0,0 +1,122 @@
+import numpy as np
+
+from .data_processing import genres, load_analysis_frame
+
+histogram_features = ['duration', 'npvi', 'note_density', 'pitch_range', 'complexity', 'originality', 'gradus']
+categorical_histogram_features = ['key']
+# bin widths used when a request does not set one; other features get numpy's 'auto' bins
+default_bin_widths = {'pitch_range': 1}
+max_histogram_bins = 500
+
+
+def parse_bin_widths(value):
+    """
+    Parses the bin widths of a histogram request.
+    Args:
+        value (str): Comma-separated <feature>:<width> pairs, e.g. 'duration:30,npvi:2.5'
+    Returns:
+        dict: Maps features to positive bin widths
+    Raises:
+        ValueError: If a pair is malformed, names an unknown feature or has a width that is not positive
+    """
+    bin_widths = {}
+    for pair in filter(None, value.split(',')):
+        feature, _, width = pair.partition(':')
+        if feature not in histogram_features:
+            raise ValueError(f"Unknown histogram feature: {feature}. Must be one of: {', '.join(histogram_features)}")
+        try:
+            bin_widths[feature] = float(width)
+        except ValueError:
+            raise ValueError(f'Bin width of {feature} must be a number')
+        if not np.isfinite(bin_widths[feature]) or bin_widths[feature] <= 0:
+            raise ValueError(f'Bin width of {feature} must be positive')
+    return bin_widths
+
+
+def get_bin_edges(values, width=None):
+    """
+    Computes histogram bin edges shared by all genres, so their histograms can be overlaid.
+    Args:
+        values (ndarray): Values of every genre, without missing values
+        width (float, optional): Bin width. Bins are aligned to multiples of the width. Widths giving more than
+            max_histogram_bins bins are widened. Defaults to numpy's 'auto' bins.
+    Returns:
+        ndarray: Bin edges
+    """
+    if width is None:
+        edges = np.histogram_bin_edges(values, bins='auto')
+        if len(edges) - 1 > max_histogram_bins:
+            edges = np.histogram_bin_edges(values, bins=max_histogram_bins)
+        return edges
+    start = np.floor(values.min() / width) * width
+    width = max(width, (values.max() - start) / max_histogram_bins)
+    bins = max(int(np.floor((values.max() - start) / width)) + 1, 1)
+    return start + width * np.arange(bins + 1)
+
+
+def get_box_statistics(values):
+    """
+    Computes the statistics of a box plot, matching Plotly's defaults: linear quartiles and whiskers reaching the
+    most extreme values within 1.5 IQR of the quartiles.
+    Args:
+        values (ndarray): Values without missing values
+    Returns:
+        dict: count, mean, q1, median, q3, lowerfence, upperfence and the sorted outliers beyond the fences
+    """
+    if not len(values):
+        return {'count': 0}
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    return {
+        'count': len(values),
+        'mean': float(values.mean()),
+        'q1': float(q1),
+        'median': float(median),
+        'q3': float(q3),
+        'lowerfence': float(values[inside].min()),
+        'upperfence': float(values[inside].max()),
+        'outliers': np.sort(values[~inside]).tolist(),
+    }
+
+
+def get_feature_histograms(bin_widths=None):
+    """
+    Bins every scalar feature per genre and computes its box plot statistics, so the Data Analysis page can draw
+    histograms and box plots without the per-track data.
+    Args:
+        bin_widths (dict, optional): Maps features to bin widths, see get_bin_edges. Features without a width use
+            default_bin_widths.
+    Returns:
+        dict: Maps each feature to:
+            - numeric features: 'bin_edges' and, per genre under 'genres', bin 'counts' and the box statistics
+            - categorical features: per genre under 'genres', 'categories' by descending count (ties in
+              alphabetical order) and their 'counts'
+        or {'error': message} if there is no data
+    """
+    df = load_analysis_frame(['genre', *histogram_features, *categorical_histogram_features])
+    if df is None:
+        return {'error': 'No music data available for analysis'}
+    bin_widths = {**default_bin_widths, **(bin_widths or {})}
+    labels = df['genre'].to_numpy()
+    histograms = {}
+    for feature in histogram_features:
+        values = df[feature].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(values)
+        edges = get_bin_edges(values[valid], bin_widths.get(feature)) if valid.any() else np.array([])
+        histograms[feature] = {'bin_edges': edges.tolist(), 'genres': {}}
+        for genre in genres:
+            genre_values = values[valid & (labels == genre)]
+            counts = np.histogram(genre_values, edges)[0] if len(edges) else np.array([], dtype=np.int64)
+            histograms[feature]['genres'][genre] = {'counts': counts.tolist(), **get_box_statistics(genre_values)}
+    for feature in categorical_histogram_features:
+        histograms[feature] = {'genres': {}}
+        for genre in genres:
+            values = df.loc[labels == genre, feature]
+            counts = values[values.notna() & (values != '')].value_counts().sort_index()
+            counts = counts.sort_values(ascending=False, kind='stable')
+            histograms[feature]['genres'][genre] = {
+                'categories': counts.index.tolist(),
+                'counts': counts.tolist(),
+            }
+    return histograms
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import Music
+from app.renditions import clip_name, render_clip
+from app.snapshots import rebuild_snapshots
+
+
+class Command(BaseCommand):
+    """
+    Django management command to render the excerpts played in the Turing test: a fixed-length, mono and
+    downsampled clip of every track's WAV file, stored under clips/ and served by music/random/ instead of the
+    full-length original.
+    Clips are rendered in a process pool from memory-mapped WAV files, so only the excerpt of each track is read.
+    Tracks whose clip was already rendered with the same parameters are skipped. The analysis snapshots, which
+    include the clip column, are rebuilt once any clip was stored.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=None,
+                            help='Length of the clips in seconds (default: the CLIP_DURATION setting)')
+        parser.add_argument('--offset', default=None,
+                            help="Start of the clips in seconds, or 'center' to centre them in the tracks "
+                                 "(default: the CLIP_OFFSET setting)")
+        parser.add_argument('--sample-rate', type=int, default=None,
+                            help='Sample rate of the clips (default: the CLIP_SAMPLE_RATE setting)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Number of rendering processes (default: number of CPUs)')
+        parser.add_argument('--force', action='store_true',
+                            help='Render the clips of all tracks, including tracks with an up-to-date clip')
+
+    @staticmethod
+    def parse_offset(value):
+        if value in (None, '', 'center'):
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            raise CommandError(f"Offset must be a number of seconds or 'center', got {value}")
+
+    @staticmethod
+    def local_path(music, wav_dir, temp_dir):
+        """
+        Returns a local path of a track's WAV file, which can be memory-mapped: the stored file itself with a file
+        system storage, the imported WAV file in WAV_FILE_PATH, or a temporary download otherwise.
+        Returns:
+            tuple: (path, whether the path is a temporary download)
+        """
+        try:
+            return music.file.path, False
+        except NotImplementedError:
+            pass
+        if wav_dir and os.path.exists(os.path.join(wav_dir, music.file.name)):
+            return os.path.join(wav_dir, music.file.name), False
+        target = tempfile.NamedTemporaryFile(dir=temp_dir, suffix='.wav', delete=False)
+        with music.file.open('rb') as source, target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        return target.name, True
+
+    def handle(self, *args, **kwargs):
+        duration = settings.CLIP_DURATION if kwargs.get('duration') is None else kwargs['duration']
+        offset = self.parse_offset(settings.CLIP_OFFSET if kwargs.get('offset') is None else kwargs['offset'])
+        sample_rate = settings.CLIP_SAMPLE_RATE if kwargs.get('sample_rate') is None else kwargs['sample_rate']
+        workers = kwargs.get('workers') or 1
+        if duration <= 0 or sample_rate <= 0:
+            raise CommandError('Duration and sample rate must be positive')
+
+        tracks = Music.objects.exclude(file='').exclude(file__isnull=True).only('id', 'title', 'file', 'clip')
+        pending = []
+        skipped = 0
+        for music in tracks.order_by('id'):
+            name = clip_name(music.file.name, duration, offset, sample_rate)
+            if not kwargs.get('force') and music.clip.name == name:
+                skipped += 1
+                continue
+            pending.append((music, name))
+
+        created = failed = 0
+
+        def collect(futures):
+            nonlocal created, failed
+            for future in futures:
+                if self.save_clip(future, *running.pop(future)):
+                    created += 1
+                else:
+                    failed += 1
+
+        with tempfile.TemporaryDirectory() as temp_dir, ProcessPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            for music, name in pending:
+                try:
+                    path, temporary = self.local_path(music, settings.WAV_FILE_PATH, temp_dir)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'Error reading {music.title}: {str(e)}'))
+                    failed += 1
+                    continue
+                future = executor.submit(render_clip, path, duration, offset, sample_rate)
+                running[future] = music, name, path, temporary
+                # bound the number of downloaded tracks waiting for a worker
+                if len(running) >= 2 * workers:
+                    collect(wait(running, return_when=FIRST_COMPLETED).done)
+            collect(as_completed(list(running)))
+        self.stdout.write(self.style.SUCCESS(f'Created: {created}, skipped: {skipped}, failed: {failed}'))
+        if created:
+            try:
+                rebuild_snapshots()
+                self.stdout.write(self.style.SUCCESS('Analysis snapshots rebuilt'))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Failed to rebuild analysis snapshots: {str(e)}'))
+
+    def save_clip(self, future, music, name, path, temporary):
+        """
+        Stores a rendered clip and records it on its track.
+        Returns:
+            bool: Whether the clip was stored
+        """
+        try:
+            content = future.result()
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            saved_name = default_storage.save(name, ContentFile(content))
+            # update() skips post_save, so the snapshots, which include the clip column, are rebuilt once by handle()
+            # instead of after every clip
+            Music.objects.filter(pk=music.pk).update(clip=saved_name)
+            return True
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error rendering {music.title}: {str(e)}'))
+            return False
+        finally:
+            if temporary:
+                os.remove(path)
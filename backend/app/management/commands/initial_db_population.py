@@ -5,32 +5,75 @@ from django.conf import settings
 from django.core.files import File
 from django.core.management.base import BaseCommand
 from django.core.files.storage import default_storage
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 
 from app.models import Music
+from app.snapshots import rebuild_snapshots
+from app.uploads import UploadPipeline
+
+FEATURE_FIELDS = [
+    'key', 'npvi', 'note_density', 'pitch_range', 'pitch_count', 'pitch_class_count', 'pitch_entropy',
+    'pitch_class_entropy', 'pitch_in_scale_rate', 'scale_consistency', 'polyphony', 'polyphony_rate', 'complexity',
+    'originality', 'gradus',
+]
 
 
 class Command(BaseCommand):
     """
     Django management command to populate the database with music feature data generated using MATLAB and WAV files.
     Loads feature data from CSV files and associates corresponding audio files.
+    With --bulk, existing entries are read in one query, WAV files are uploaded concurrently and new entries are
+    inserted in batches in one transaction.
     """
 
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk', action='store_true',
+                            help='Insert new entries with bulk_create instead of one query per row')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of entries per bulk_create batch (default: 500)')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Number of concurrent WAV uploads in bulk mode (default: 8)')
+        parser.add_argument('--retries', type=int, default=3,
+                            help='Number of retries of a failed WAV upload in bulk mode (default: 3)')
+        parser.add_argument('--progress-file', default=None,
+                            help='File recording completed uploads in bulk mode, so an interrupted import can resume')
+
+    @staticmethod
+    def get_file_names(genre, file_name, wav_dir):
+        """
+        Returns:
+            tuple: (local WAV file path, storage name of the file)
+        """
+        wav_file_name = genre + '_' + os.path.splitext(file_name)[0] + '.wav'
+        return os.path.join(wav_dir, genre, wav_file_name), f'{genre}/{wav_file_name}'
+
     def handle(self, *args, **kwargs):
         csv_path_ds = settings.DATASET_FEATURES_PATH
         csv_path_exp = settings.EXP_FEATURES_PATH
         wav_dir = settings.WAV_FILE_PATH
         feature_data = pd.concat([pd.read_csv(csv_path_ds), pd.read_csv(csv_path_exp)], ignore_index=True)
 
+        if kwargs.get('bulk'):
+            pipeline = UploadPipeline(max_workers=kwargs.get('workers') or 8, retries=kwargs.get('retries', 3),
+                                      progress_path=kwargs.get('progress_file'))
+            self.bulk_import(feature_data, wav_dir, kwargs.get('batch_size') or 500, pipeline)
+        else:
+            self.row_import(feature_data, wav_dir)
+
+        self.stdout.write(self.style.SUCCESS('Data import completed successfully'))
+        try:
+            rebuild_snapshots()
+            self.stdout.write(self.style.SUCCESS('Analysis snapshots rebuilt'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Failed to rebuild analysis snapshots: {str(e)}'))
+
+    def row_import(self, feature_data, wav_dir):
         for _, row in feature_data.iterrows():
-            wav_file_name = row['genre'] + '_' + os.path.splitext(row['file_name'])[0] + '.wav'
-            wav_file_path = os.path.join(wav_dir, row['genre'], wav_file_name)
+            wav_file_path, file_name = self.get_file_names(row['genre'], row['file_name'], wav_dir)
             if not os.path.exists(wav_file_path):
                 self.stdout.write(self.style.WARNING(f'WAV file not found: {wav_file_path}'))
                 continue
 
-            file_name = f"{row['genre']}/{wav_file_name}"
-
             if Music.objects.filter(title=row['file_name'], label=row['genre']).exists():
                 self.stdout.write(self.style.SUCCESS(f"Skipping existing entry: {row['file_name']}"))
                 continue
@@ -42,21 +85,7 @@ class Command(BaseCommand):
                     title=row['file_name'],
                     label=row['genre'],
                     file=saved_name,
-                    key=row.get('key'),
-                    npvi=row.get('npvi'),
-                    note_density=row.get('note_density'),
-                    pitch_range=row.get('pitch_range'),
-                    pitch_count=row.get('pitch_count'),
-                    pitch_class_count=row.get('pitch_class_count'),
-                    pitch_entropy=row.get('pitch_entropy'),
-                    pitch_class_entropy=row.get('pitch_class_entropy'),
-                    pitch_in_scale_rate=row.get('pitch_in_scale_rate'),
-                    scale_consistency=row.get('scale_consistency'),
-                    polyphony=row.get('polyphony'),
-                    polyphony_rate=row.get('polyphony_rate'),
-                    complexity=row.get('complexity'),
-                    originality=row.get('originality'),
-                    gradus=row.get('gradus'),
+                    **{field: row.get(field) for field in FEATURE_FIELDS},
                 )
                 self.stdout.write(self.style.SUCCESS(f'Created Music object: {music}'))
             except IntegrityError:
@@ -64,4 +93,50 @@ class Command(BaseCommand):
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f"Error processing {row['file_name']}: {str(e)}"))
 
-        self.stdout.write(self.style.SUCCESS('Data import completed successfully'))
+    def bulk_import(self, feature_data, wav_dir, batch_size, pipeline):
+        """
+        Imports all new entries with a single existence query, concurrent uploads and batched inserts.
+        Reports the number of created, skipped and failed entries.
+        """
+        columns = ['file_name', 'genre'] + FEATURE_FIELDS
+        feature_data = feature_data.reindex(columns=columns).astype(object)
+        feature_data = feature_data.where(feature_data.notna(), None)
+        existing = set(Music.objects.values_list('title', 'label'))
+        pending = {}
+        skipped = failed = 0
+
+        for row in feature_data.itertuples(index=False, name=None):
+            values = dict(zip(columns, row))
+            title, label = values.pop('file_name'), values.pop('genre')
+            if (title, label) in existing:
+                skipped += 1
+                continue
+            wav_file_path, file_name = self.get_file_names(label, title, wav_dir)
+            if not os.path.exists(wav_file_path):
+                self.stdout.write(self.style.WARNING(f'WAV file not found: {wav_file_path}'))
+                failed += 1
+                continue
+            existing.add((title, label))
+            pending[file_name] = wav_file_path, Music(title=title, label=label, **values)
+
+        instances = []
+        uploads = pipeline.run((file_name, wav_file_path) for file_name, (wav_file_path, _) in pending.items())
+        for file_name, (saved_name, error) in uploads.items():
+            music = pending[file_name][1]
+            if error:
+                self.stdout.write(self.style.ERROR(f'Error uploading {music.title}: {error}'))
+                failed += 1
+                continue
+            music.file = saved_name
+            instances.append(music)
+
+        created = 0
+        try:
+            with transaction.atomic():
+                for start in range(0, len(instances), batch_size):
+                    created += len(Music.objects.bulk_create(instances[start:start + batch_size]))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error inserting entries, no entries were created: {str(e)}'))
+            failed += len(instances)
+            created = 0
+        self.stdout.write(self.style.SUCCESS(f'Created: {created}, skipped: {skipped}, failed: {failed}'))
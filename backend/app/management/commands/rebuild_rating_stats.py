@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app.rating_stats import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    """
+    Django management command to recompute the per-song rating statistics from the stored ratings.
+    Useful after ratings were written through means that bypass the rating endpoints and model signals.
+    """
+
+    def handle(self, *args, **options):
+        try:
+            count = rebuild_rating_stats()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt rating statistics for {count} songs'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Failed to rebuild rating statistics: {str(e)}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app.snapshots import rebuild_snapshots
+
+
+class Command(BaseCommand):
+    """
+    Django management command to rebuild the stored analysis snapshots served by the feature analysis endpoint.
+    Useful after changing music data through means that bypass model signals, e.g. raw SQL or bulk updates.
+    """
+
+    def handle(self, *args, **options):
+        try:
+            names = rebuild_snapshots()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt snapshots: {', '.join(names)}"))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Failed to rebuild snapshots: {str(e)}'))
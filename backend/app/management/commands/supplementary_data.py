@@ -2,54 +2,106 @@ import numpy as np
 import pandas as pd
 
 from app.models import Music
+from app.snapshots import rebuild_snapshots
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
 from django.core.management.base import BaseCommand
+from django.db import transaction
+
+ARRAY_FIELDS = ['pc_dist1', 'pc_dist2', 'iv_dist1', 'ivsize_dist1', 'ivdir_dist1', 'iv_dist2']
+SUPPLEMENTARY_FIELDS = ['duration'] + ARRAY_FIELDS
+
+
+def get_field_shape(field_name):
+    """
+    Returns:
+        tuple: Shape of a (nested) ArrayField of the Music model, e.g. (12, 12) for pc_dist2
+    """
+    field = Music._meta.get_field(field_name)
+    shape = []
+    while isinstance(field, ArrayField):
+        shape.append(field.size)
+        field = field.base_field
+    return tuple(shape)
+
+
+def parse_array_column(series, shape):
+    """
+    Parses a column of array strings, e.g. '[0.1 0.2]' or '[0.1 0.2];[0.3 0.4]' for 2-D arrays, in one pass.
+    All valid values of the column are joined and converted to floats at once, then reshaped per row.
+    Args:
+        series (Series): Column of array strings, NaN for missing arrays
+        shape (tuple): Expected shape of each array
+    Returns:
+        tuple: (values, invalid)
+            - values: Series of nested lists, None for missing arrays
+            - invalid: Index of the rows whose array does not match the shape
+    """
+    present = series.dropna().astype(str).str.replace(r'[\[\];,]', ' ', regex=True)
+    counts = present.str.split().str.len()
+    size = int(np.prod(shape))
+    valid = present[counts == size]
+    parsed = dict.fromkeys(series.index)
+    if len(valid):
+        arrays = np.array(' '.join(valid).split(), dtype=np.float64).reshape(len(valid), *shape)
+        parsed.update(zip(valid.index, arrays.tolist()))
+    return pd.Series(list(parsed.values()), index=series.index, dtype=object), present.index[counts != size]
 
 
 class Command(BaseCommand):
     """
     Django management command to populate the database with music feature data generated using Muspy and MGEval
     libraries.
-    Processes string representations of arrays into proper database format.
+    Processes string representations of arrays into proper database format. The array columns of the whole CSV are
+    parsed at once, existing entries are fetched in one query and only the supplementary fields are written, in
+    batches.
     """
 
-    def process_array_field(self, value):
-        if pd.isna(value):
-            return None
-        if isinstance(value, str):
-            return np.fromstring(value.strip('[]'), sep=' ').tolist()
-        return value
-
-    def process_2d_array_field(self, value):
-        if pd.isna(value):
-            return None
-        if isinstance(value, str):
-            print([np.fromstring(r.strip('[]'), sep=' ').tolist() for r in value.split(';')])
-            return [np.fromstring(r.strip('[]'), sep=' ').tolist() for r in value.split(';')]
-        return value
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of entries per bulk_update batch (default: 500)')
 
     def handle(self, *args, **options):
         csv_path_ds = settings.DATASET_FEATURES_PATH
         csv_path_exp = settings.EXP_FEATURES_PATH
+        batch_size = options.get('batch_size') or 500
         df = pd.concat([pd.read_csv(csv_path_ds), pd.read_csv(csv_path_exp)], ignore_index=True)
-        for _, row in df.iterrows():
-            music, created = Music.objects.get_or_create(
-                title=row['file_name'],
-                label=row['genre']
-            )
-            music.duration = row['duration']
-            music.pc_dist1 = self.process_array_field(row['pc_dist1'])
-            music.pc_dist2 = self.process_2d_array_field(row['pc_dist2'])
-            music.iv_dist1 = self.process_array_field(row['iv_dist1'])
-            music.ivsize_dist1 = self.process_array_field(row['ivsize_dist1'])
-            music.ivdir_dist1 = self.process_array_field(row['ivdir_dist1'])
-            music.iv_dist2 = self.process_2d_array_field(row['iv_dist2'])
-
-            music.save()
-
-            if created:
-                self.stdout.write(self.style.SUCCESS(f'Created new Music object: {music}'))
-            else:
-                self.stdout.write(self.style.SUCCESS(f'Updated existing Music object: {music}'))
+        df = df.drop_duplicates(subset=['file_name', 'genre'], keep='last')
+
+        invalid = pd.Index([])
+        for field in ARRAY_FIELDS:
+            df[field], field_invalid = parse_array_column(df[field], get_field_shape(field))
+            for index in field_invalid:
+                self.stdout.write(self.style.WARNING(
+                    f"Invalid {field} shape, skipping: {df.at[index, 'genre']}, {df.at[index, 'file_name']}"))
+            invalid = invalid.union(field_invalid)
+        df = df.drop(index=invalid)
+        df['duration'] = df['duration'].astype(object).where(df['duration'].notna(), None)
+
+        existing = {
+            (music.title, music.label): music
+            for music in Music.objects.filter(title__in=df['file_name'].unique()).only('id', 'title', 'label')
+        }
+        updated, created = [], []
+        for row in df[['file_name', 'genre'] + SUPPLEMENTARY_FIELDS].itertuples(index=False, name=None):
+            title, label, values = row[0], row[1], dict(zip(SUPPLEMENTARY_FIELDS, row[2:]))
+            music = existing.get((title, label))
+            if music is None:
+                created.append(Music(title=title, label=label, **values))
+                continue
+            for field, value in values.items():
+                setattr(music, field, value)
+            updated.append(music)
+
+        with transaction.atomic():
+            Music.objects.bulk_create(created, batch_size=batch_size)
+            Music.objects.bulk_update(updated, SUPPLEMENTARY_FIELDS, batch_size=batch_size)
 
+        self.stdout.write(self.style.SUCCESS(
+            f'Created: {len(created)}, updated: {len(updated)}, skipped: {len(invalid)}'))
         self.stdout.write(self.style.SUCCESS('Data import completed successfully'))
+        try:
+            rebuild_snapshots()
+            self.stdout.write(self.style.SUCCESS('Analysis snapshots rebuilt'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Failed to rebuild analysis snapshots: {str(e)}'))
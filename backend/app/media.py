@@ -0,0 +1,152 @@
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from collections import OrderedDict
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+
+# bytes read from disk at a time when streaming a media file
+chunk_size = 64 * 1024
+range_pattern = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class MediaUrlCache:
+    """
+    In-memory cache of the URLs of stored files, so serializing a list of tracks does not generate, and with a
+    remote storage sign, a URL for every file on every request.
+    URLs are reused for MEDIA_URL_TTL seconds, or half the expiry of the storage's signed URLs if that is shorter,
+    so a cached URL never expires before it is replaced. Least recently used URLs are dropped beyond max_entries.
+    """
+
+    def __init__(self, ttl=None, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._urls = OrderedDict()
+
+    def clear(self):
+        with self._lock:
+            self._urls.clear()
+
+    def get_ttl(self, storage):
+        ttl = self.ttl if self.ttl is not None else settings.MEDIA_URL_TTL
+        expiration = getattr(storage, 'expiration', None)
+        if expiration is not None:
+            ttl = min(ttl, expiration.total_seconds() / 2)
+        return ttl
+
+    def get_url(self, file):
+        """
+        Args:
+            file (FieldFile): Stored file
+        Returns:
+            str: URL of the file, possibly generated earlier
+        """
+        key = (id(file.storage), file.name)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._urls.get(key)
+            if entry and entry[1] > now:
+                self._urls.move_to_end(key)
+                return entry[0]
+        url = file.url
+        with self._lock:
+            self._urls[key] = url, now + self.get_ttl(file.storage)
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.max_entries:
+                self._urls.popitem(last=False)
+        return url
+
+
+media_url_cache = MediaUrlCache()
+
+
+def parse_range(header, size):
+    """
+    Parses a Range header asking for a single range of bytes.
+    Args:
+        header (str): Value of the Range header, e.g. 'bytes=0-1023', 'bytes=1024-' or 'bytes=-1024'
+        size (int): Size of the file in bytes
+    Returns:
+        tuple: (first, last) byte positions, inclusive. None if the header is not a single byte range, which is
+            served as a request of the whole file.
+    Raises:
+        ValueError: If the range lies outside of the file
+    """
+    match = range_pattern.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # a suffix range, the last bytes of the file
+        if not int(last) or not size:
+            raise ValueError(f'Range not satisfiable: {header}')
+        return max(size - int(last), 0), size - 1
+    first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last:
+        raise ValueError(f'Range not satisfiable: {header}')
+    return first, last
+
+
+def read_chunks(file, length):
+    """
+    Yields length bytes of an open file in chunks, then closes it.
+    """
+    try:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def serve_media(request, path):
+    """
+    Serves a file of the local media storage in chunks, replacing django.views.static.serve for media files.
+    Supports single range requests, so audio players can seek and browsers fetch WAV files progressively instead of
+    downloading them whole.
+    Returns:
+        200: The whole file
+        206: The requested range of the file
+        404: File not found
+        416: Range outside of the file
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except Exception:
+        raise Http404('File not found')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found')
+    stat = os.stat(full_path)
+    last_modified = http_date(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path)
+    byte_range = None
+    # a range of an outdated copy (If-Range) is answered with the whole file
+    if 'Range' in request.headers and request.headers.get('If-Range', last_modified) == last_modified:
+        try:
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+    first, last = byte_range or (0, stat.st_size - 1)
+    file = open(full_path, 'rb')
+    file.seek(first)
+    response = StreamingHttpResponse(read_chunks(file, last - first + 1), status=206 if byte_range else 200,
+                                     content_type=content_type or 'application/octet-stream')
+    if byte_range:
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    # an explicit encoding keeps GZipMiddleware from compressing the file, which would break the byte ranges
+    response['Content-Encoding'] = encoding or 'identity'
+    response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    return response
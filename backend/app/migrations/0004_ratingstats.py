@@ -0,0 +1,46 @@
+# Generated by Django 5.1 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Rating = apps.get_model('app', 'Rating')
+    RatingStats = apps.get_model('app', 'RatingStats')
+    aggregates = Rating.objects.order_by().values('song_id').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        total_squares=Sum(F('rating') * F('rating')),
+        **{f'count_{i}': Count('id', filter=Q(rating=i)) for i in range(1, 6)},
+    )
+    RatingStats.objects.bulk_create([RatingStats(**aggregate) for aggregate in aggregates], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_analysissnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingStats',
+            fields=[
+                ('song', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='app.music')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('total_squares', models.PositiveIntegerField(default=0)),
+                ('count_1', models.PositiveIntegerField(default=0)),
+                ('count_2', models.PositiveIntegerField(default=0)),
+                ('count_3', models.PositiveIntegerField(default=0)),
+                ('count_4', models.PositiveIntegerField(default=0)),
+                ('count_5', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Rating Statistics',
+                'verbose_name_plural': 'Rating Statistics',
+            },
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
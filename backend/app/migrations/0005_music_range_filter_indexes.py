@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_ratingstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='music',
+            index=models.Index(fields=['label', 'note_density'], name='music_label_note_density_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='music',
+            index=models.Index(fields=['label', 'duration'], name='music_label_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='music',
+            index=models.Index(fields=['label', 'pitch_range'], name='music_label_pitch_range_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-17 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_music_range_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='music',
+            name='clip',
+            field=models.FileField(blank=True, max_length=255, null=True, upload_to=''),
+        ),
+    ]
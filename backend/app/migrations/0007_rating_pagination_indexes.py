@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_music_clip'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='rating',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['-created_at', '-id'], name='rating_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['song', '-created_at', '-id'], name='rating_song_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+def create_generation(apps, schema_editor):
+    apps.get_model('app', 'SnapshotGeneration').objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_rating_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_generation, migrations.RunPython.noop),
+    ]
@@ -12,9 +12,12 @@ class Music(models.Model):
         ('exp2', 'trained with pop and classical'),
         ('exp3', 'trained with pop and classical(CnG major)'),
     ]
+    HUMAN_LABELS = ['classical', 'pop']
     title = models.CharField(max_length=255)
     label = models.CharField(choices=LABEL_CHOICES, max_length=50)
     file = models.FileField(storage=default_storage, null=True, blank=True, max_length=255)
+    # short, downsampled excerpt of the file played in the Turing test, see the generate_renditions command
+    clip = models.FileField(storage=default_storage, null=True, blank=True, max_length=255)
     key = models.CharField(max_length=3, null=True, blank=True)
     npvi = models.FloatField(null=True, blank=True)
     note_density = models.FloatField(null=True, blank=True)
@@ -44,6 +47,12 @@ class Music(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['title', 'label'], name='unique_music_title_label')
         ]
+        # range filters of the scatter data endpoint, which always restrict the label as well
+        indexes = [
+            models.Index(fields=['label', 'note_density'], name='music_label_note_density_idx'),
+            models.Index(fields=['label', 'duration'], name='music_label_duration_idx'),
+            models.Index(fields=['label', 'pitch_range'], name='music_label_pitch_range_idx'),
+        ]
 
     def __str__(self):
         return f"{self.label}, {self.title}"
@@ -57,7 +66,73 @@ class Rating(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        # keyset pagination of the rating listings, see app.api.pagination
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='rating_created_at_id_idx'),
+            models.Index(fields=['song', '-created_at', '-id'], name='rating_song_created_at_idx'),
+        ]
 
     def __str__(self):
         return f"Rating {self.rating} for {self.song.file}"
+
+
+class RatingStats(models.Model):
+    """
+    Running aggregate of the ratings of a track, maintained incrementally as ratings are written.
+    """
+    song = models.OneToOneField(Music, on_delete=models.CASCADE, primary_key=True, related_name='rating_stats')
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    total_squares = models.PositiveIntegerField(default=0)
+    count_1 = models.PositiveIntegerField(default=0)
+    count_2 = models.PositiveIntegerField(default=0)
+    count_3 = models.PositiveIntegerField(default=0)
+    count_4 = models.PositiveIntegerField(default=0)
+    count_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Rating Statistics"
+        verbose_name_plural = "Rating Statistics"
+
+    def __str__(self):
+        return f"Rating statistics for {self.song}"
+
+    @property
+    def histogram(self):
+        return [self.count_1, self.count_2, self.count_3, self.count_4, self.count_5]
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def std(self):
+        if not self.count:
+            return None
+        return max(self.total_squares / self.count - self.mean ** 2, 0.0) ** 0.5
+
+
+class AnalysisSnapshot(models.Model):
+    """
+    Serialized response of an analysis endpoint, rebuilt whenever the underlying music data changes.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    payload = models.BinaryField()
+    content_type = models.CharField(max_length=100, default='application/json')
+    etag = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Snapshot {self.name} ({self.etag})"
+
+
+class SnapshotGeneration(models.Model):
+    """
+    Single row counting the changes to the music data. Invalidating the snapshots increments it, and a snapshot is
+    only stored if the generation it was built from is still current.
+    """
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Snapshot generation {self.value}"
@@ -0,0 +1,85 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Music, Rating, RatingStats
+
+HISTOGRAM_FIELDS = ['count_1', 'count_2', 'count_3', 'count_4', 'count_5']
+
+
+def apply_rating_changes(added=(), removed=()):
+    """
+    Incrementally updates the per-song rating statistics.
+    Args:
+        added (iterable): (song_id, rating) pairs of ratings that were written
+        removed (iterable): (song_id, rating) pairs of ratings that were deleted
+    """
+    added, removed = list(added), list(removed)
+    deltas = defaultdict(lambda: defaultdict(int))
+    for changes, sign in ((added, 1), (removed, -1)):
+        for song_id, rating in changes:
+            delta = deltas[song_id]
+            delta['count'] += sign
+            delta['total'] += sign * rating
+            delta['total_squares'] += sign * rating * rating
+            if 1 <= rating <= len(HISTOGRAM_FIELDS):
+                delta[HISTOGRAM_FIELDS[rating - 1]] += sign
+    if not deltas:
+        return
+    # only songs that gained ratings may need a statistics row, a removal never creates one
+    new_song_ids = {song_id for song_id, _ in added}
+    RatingStats.objects.bulk_create([RatingStats(song_id=song_id) for song_id in new_song_ids], ignore_conflicts=True)
+    for song_id, delta in deltas.items():
+        RatingStats.objects.filter(song_id=song_id).update(
+            **{field: F(field) + value for field, value in delta.items() if value}
+        )
+
+
+def rebuild_rating_stats():
+    """
+    Recomputes the statistics of every song from its ratings, e.g. after ratings were imported in bulk.
+    The statistics are replaced in one transaction, which locks the statistics table against rating writers: a
+    rating committed before the lock is counted by the aggregation, and a writer still in flight waits for the
+    rebuild and then applies its change to the rebuilt statistics.
+    Returns:
+        int: Number of songs with ratings
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # blocks the updates of apply_rating_changes, but not reads of the statistics
+            cursor.execute(f'LOCK TABLE {RatingStats._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+        aggregates = Rating.objects.order_by().values('song_id').annotate(
+            count=Count('id'),
+            total=Sum('rating'),
+            total_squares=Sum(F('rating') * F('rating')),
+            **{field: Count('id', filter=Q(rating=i + 1)) for i, field in enumerate(HISTOGRAM_FIELDS)},
+        )
+        RatingStats.objects.all().delete()
+        stats = RatingStats.objects.bulk_create([RatingStats(**aggregate) for aggregate in aggregates])
+    return len(stats)
+
+
+def get_label_stats():
+    """
+    Aggregates the song statistics per label, including how often listeners were fooled: human-made tracks rated
+    as AI (1-2) and AI-generated tracks rated as human (4-5).
+    Returns:
+        dict: Maps each label to its rating count, histogram and fooled rate
+    """
+    aggregates = RatingStats.objects.order_by().values('song__label').annotate(
+        ratings=Sum('count'),
+        **{f'sum_{field}': Sum(field) for field in HISTOGRAM_FIELDS},
+    )
+    result = {}
+    for aggregate in aggregates:
+        label = aggregate['song__label']
+        histogram = [aggregate[f'sum_{field}'] for field in HISTOGRAM_FIELDS]
+        fooled = histogram[0] + histogram[1] if label in Music.HUMAN_LABELS else histogram[3] + histogram[4]
+        count = aggregate['ratings']
+        result[label] = {
+            'count': count,
+            'histogram': histogram,
+            'fooled_rate': fooled / count if count else None,
+        }
+    return result
@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+
+# number of points at which fitted lines and confidence bands are evaluated
+trendline_points = 50
+
+
+def regularized_incomplete_beta(a, b, x):
+    """
+    Evaluates the regularized incomplete beta function I_x(a, b) with Lentz's continued fraction.
+    Args:
+        a (float): First shape parameter, positive
+        b (float): Second shape parameter, positive
+        x (float): Upper integration limit, between 0 and 1
+    Returns:
+        float: I_x(a, b)
+    """
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        # the continued fraction converges quickly only below the mean
+        return 1.0 - regularized_incomplete_beta(b, a, 1.0 - x)
+    log_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-15:
+            break
+    return math.exp(log_front) * result / a
+
+
+def t_two_sided_pvalue(t, df):
+    """
+    Returns P(|T| >= |t|) for a Student's t distribution with df degrees of freedom.
+    """
+    if math.isinf(t):
+        return 0.0
+    return regularized_incomplete_beta(df / 2, 0.5, df / (df + t * t))
+
+
+def t_critical_value(confidence, df):
+    """
+    Returns the two-sided critical value of a Student's t distribution, i.e. t with P(|T| <= t) = confidence.
+    """
+    low, high = 0.0, 1.0
+    while t_two_sided_pvalue(high, df) > 1 - confidence:
+        high *= 2
+    for _ in range(100):
+        middle = (low + high) / 2
+        if t_two_sided_pvalue(middle, df) > 1 - confidence:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def fit_ols(x, y, confidence=0.95, points=trendline_points):
+    """
+    Fits y = intercept + slope * x by ordinary least squares, as Plotly's 'ols' trendline does with statsmodels.
+    Args:
+        x (ndarray): Explanatory values
+        y (ndarray): Response values
+        confidence (float): Confidence level of the band around the fitted line
+        points (int): Number of evenly spaced x values at which the line and band are evaluated
+    Returns:
+        dict: n, slope, intercept, r2, slope_pvalue, intercept_pvalue, and the evaluated 'x', 'y', 'lower' and
+            'upper' lists of the line and its confidence band, or None if the line is not identifiable (fewer than
+            three points or constant x)
+    """
+    n = len(x)
+    if n < 3 or np.ptp(x) == 0:
+        return None
+    design = np.column_stack([np.ones(n), x])
+    (intercept, slope), *_ = np.linalg.lstsq(design, y, rcond=None)
+    intercept, slope = float(intercept), float(slope)
+    dof = n - 2
+    residuals = y - (intercept + slope * x)
+    sse = float(residuals @ residuals)
+    sst = float(((y - y.mean()) ** 2).sum())
+    sxx = float(((x - x.mean()) ** 2).sum())
+    variance = sse / dof
+    slope_se = math.sqrt(variance / sxx)
+    intercept_se = math.sqrt(variance * (1 / n + x.mean() ** 2 / sxx))
+    grid = np.linspace(x.min(), x.max(), points)
+    fitted = intercept + slope * grid
+    half_width = t_critical_value(confidence, dof) * np.sqrt(variance * (1 / n + (grid - x.mean()) ** 2 / sxx))
+    return {
+        'n': n,
+        'slope': slope,
+        'intercept': intercept,
+        'r2': 1 - sse / sst if sst > 0 else 1.0,
+        'slope_pvalue': t_two_sided_pvalue(slope / slope_se if slope_se else math.inf, dof),
+        'intercept_pvalue': t_two_sided_pvalue(intercept / intercept_se if intercept_se else math.inf, dof),
+        'x': grid.tolist(),
+        'y': fitted.tolist(),
+        'lower': (fitted - half_width).tolist(),
+        'upper': (fitted + half_width).tolist(),
+    }
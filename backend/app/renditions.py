@@ -0,0 +1,166 @@
+import io
+import os
+import struct
+import wave
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_layout(path):
+    """
+    Reads the format of a WAV file and locates its sample data, without reading the samples.
+    Args:
+        path (str): Path of the WAV file
+    Returns:
+        dict: format (PCM or IEEE float), channels, sample_rate, sample_width in bytes, and data_offset and
+            frames of the sample data
+    Raises:
+        ValueError: If the file is not a WAV file or its format is not supported
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] not in (b'RIFF', b'RF64') or header[8:] != b'WAVE':
+            raise ValueError('Not a WAV file')
+        layout = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError('WAV file has no sample data')
+            chunk_id, size = struct.unpack('<4sI', chunk)
+            if chunk_id == b'fmt ':
+                body = f.read(size + size % 2)
+                format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    format_tag = struct.unpack('<H', body[24:26])[0]
+                if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT) or bits not in (8, 16, 24, 32, 64):
+                    raise ValueError(f'Unsupported WAV format {format_tag} with {bits} bit samples')
+                layout = {'format': format_tag, 'channels': channels, 'sample_rate': sample_rate,
+                          'sample_width': bits // 8, 'block_align': block_align}
+            elif chunk_id == b'data':
+                if layout is None:
+                    raise ValueError('WAV file has no format chunk')
+                data_offset = f.tell()
+                # streamed and RF64 files may not record the true data size
+                size = min(size, file_size - data_offset)
+                return {**layout, 'data_offset': data_offset, 'frames': size // layout['block_align']}
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)
+
+
+def decode_samples(raw, layout):
+    """
+    Converts raw sample bytes to floats.
+    Args:
+        raw (ndarray): uint8 array of shape (frames, block_align)
+        layout (dict): Format of the samples, see read_wav_layout
+    Returns:
+        ndarray: float32 array of shape (frames, channels) with samples between -1 and 1
+    """
+    frames, channels, width = len(raw), layout['channels'], layout['sample_width']
+    raw = np.ascontiguousarray(raw[:, :channels * width]).reshape(frames, channels, width)
+    if layout['format'] == WAVE_FORMAT_IEEE_FLOAT:
+        return raw.view(f'<f{width}').reshape(frames, channels).astype(np.float32)
+    if width == 1:
+        # 8 bit PCM is unsigned
+        return (raw.reshape(frames, channels).astype(np.float32) - 128) / 128
+    if width == 3:
+        padded = np.zeros((frames, channels, 4), dtype=np.uint8)
+        padded[..., 1:] = raw
+        samples = padded.view('<i4').reshape(frames, channels)
+    else:
+        samples = raw.view(f'<i{width}').reshape(frames, channels)
+    scale = 2.0 ** 31 if width == 3 else 2.0 ** (8 * width - 1)
+    return (samples / scale).astype(np.float32)
+
+
+def read_excerpt(path, duration, offset=None):
+    """
+    Reads an excerpt of a WAV file. The file is memory-mapped, so only the excerpt is read from disk, however long
+    the track is.
+    Args:
+        path (str): Path of the WAV file
+        duration (float): Length of the excerpt in seconds
+        offset (float, optional): Start of the excerpt in seconds. Defaults to the excerpt centred in the track.
+            Excerpts are moved back to fit into the track.
+    Returns:
+        tuple: (float32 array of shape (frames, channels), sample rate)
+    """
+    layout = read_wav_layout(path)
+    rate, frames = layout['sample_rate'], layout['frames']
+    length = min(int(round(duration * rate)), frames)
+    start = (frames - length) // 2 if offset is None else int(round(offset * rate))
+    start = min(max(start, 0), frames - length)
+    if not length:
+        return np.zeros((0, layout['channels']), dtype=np.float32), rate
+    data = np.memmap(path, dtype=np.uint8, mode='r', offset=layout['data_offset'],
+                     shape=(frames, layout['block_align']))
+    try:
+        return decode_samples(data[start:start + length], layout), rate
+    finally:
+        del data
+
+
+def resample(samples, rate, target_rate):
+    """
+    Lowers the sample rate of a mono signal, smoothing it first so the dropped frequencies do not alias.
+    Args:
+        samples (ndarray): Mono samples
+        rate (int): Sample rate of the samples
+        target_rate (int): Sample rate of the result. Higher rates than the original are not upsampled.
+    Returns:
+        tuple: (resampled samples, their sample rate)
+    """
+    if target_rate >= rate or not len(samples):
+        return samples, rate
+    ratio = rate / target_rate
+    width = int(round(ratio))
+    if width > 1:
+        samples = np.convolve(samples, np.full(width, 1 / width, dtype=np.float32), mode='same')
+    positions = np.arange(int(len(samples) / ratio)) * ratio
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32), target_rate
+
+
+def encode_wav(samples, rate):
+    """
+    Returns:
+        bytes: Mono 16 bit PCM WAV file of the samples
+    """
+    pcm = (np.clip(samples, -1, 1) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def render_clip(path, duration, offset=None, sample_rate=22050):
+    """
+    Renders the playback rendition of a track: a mono 16 bit excerpt at a reduced sample rate.
+    Runs in worker processes of generate_renditions, so it must not use Django.
+    Args:
+        path (str): Path of the original WAV file
+        duration (float): Length of the excerpt in seconds
+        offset (float, optional): Start of the excerpt in seconds, see read_excerpt
+        sample_rate (int): Sample rate of the rendition
+    Returns:
+        bytes: WAV file of the rendition
+    """
+    samples, rate = read_excerpt(path, duration, offset)
+    samples, rate = resample(samples.mean(axis=1), rate, sample_rate)
+    return encode_wav(samples, rate)
+
+
+def clip_name(name, duration, offset=None, sample_rate=22050):
+    """
+    Returns the storage name of a rendition, which records the parameters it was rendered with, e.g.
+    clips/pop/pop_001_center_30s_22050hz.wav for pop/pop_001.wav.
+    """
+    start = 'center' if offset is None else f'{offset:g}s'
+    return f'clips/{os.path.splitext(name)[0]}_{start}_{duration:g}s_{sample_rate}hz.wav'
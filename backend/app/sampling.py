@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Music
+
+BALANCE_MODES = ('label', 'origin')
+
+
+class TrackSampler:
+    """
+    In-memory index of track ids per label, used to pick random tracks in constant time instead of sorting a label
+    partition by random() on every request.
+    The index is dropped whenever a track is saved or deleted in this process, and rebuilt once it is older than
+    its TTL so changes made by other processes (e.g. import commands) are picked up as well.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def get_index(self):
+        """
+        Returns:
+            dict: Maps each label to a list of track ids
+        """
+        ttl = self.ttl if self.ttl is not None else settings.RANDOM_TRACK_INDEX_TTL
+        with self._lock:
+            if self._index is None or time.monotonic() - self._built_at > ttl:
+                index = {}
+                for label, track_id in Music.objects.order_by().values_list('label', 'id'):
+                    index.setdefault(label, []).append(track_id)
+                self._index = index
+                self._built_at = time.monotonic()
+            return self._index
+
+    @staticmethod
+    def label_weights(labels, balance='label'):
+        """
+        Computes the probability of picking each label.
+        Args:
+            labels (list): Labels present in the index
+            balance (str): 'label' gives every label equal odds, 'origin' gives human-made and AI-generated tracks
+                equal odds, split evenly between the labels of each group
+        Returns:
+            list: Weight of each label, in the order of labels
+        """
+        if balance not in BALANCE_MODES:
+            raise ValueError(f'Unknown balance mode: {balance}')
+        human = [label for label in labels if label in Music.HUMAN_LABELS]
+        generated = [label for label in labels if label not in Music.HUMAN_LABELS]
+        if balance == 'label' or not human or not generated:
+            return [1.0] * len(labels)
+        return [1.0 / len(human) if label in Music.HUMAN_LABELS else 1.0 / len(generated) for label in labels]
+
+    def sample_id(self, balance='label'):
+        """
+        Picks a label by its weight, then a track id within that label.
+        Args:
+            balance (str): Label balancing mode, see label_weights
+        Returns:
+            int: Id of the sampled track, or None if there are no tracks
+        """
+        ids = self.sample_ids(1, balance)
+        return ids[0] if ids else None
+
+    def sample_ids(self, n, balance='label'):
+        """
+        Picks up to n distinct track ids, choosing a label by its weight for every pick.
+        Labels are dropped from the draw once all of their tracks have been picked.
+        Args:
+            n (int): Number of track ids to pick
+            balance (str): Label balancing mode, see label_weights
+        Returns:
+            list: Ids of the sampled tracks, fewer than n if there are not enough tracks
+        """
+        index = self.get_index()
+        labels = [label for label in index if index[label]]
+        picked = {label: set() for label in labels}
+        result = []
+        while len(result) < n and labels:
+            label = random.choices(labels, weights=self.label_weights(labels, balance))[0]
+            ids, used = index[label], picked[label]
+            if len(used) * 2 < len(ids):
+                track_id = random.choice(ids)
+                while track_id in used:
+                    track_id = random.choice(ids)
+            else:
+                track_id = random.choice([i for i in ids if i not in used])
+            used.add(track_id)
+            result.append(track_id)
+            if len(used) == len(ids):
+                labels.remove(label)
+        return result
+
+
+track_sampler = TrackSampler()
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Music, Rating
+from .rating_stats import apply_rating_changes
+from .sampling import track_sampler
+from .snapshots import invalidate_snapshots
+
+
+@receiver(post_save, sender=Music)
+@receiver(post_delete, sender=Music)
+def invalidate_analysis_snapshots(sender, **kwargs):
+    """
+    Stored analysis snapshots are derived from the music table, so any change to a track discards them.
+    """
+    invalidate_snapshots()
+
+
+@receiver(post_save, sender=Music)
+@receiver(post_delete, sender=Music)
+def invalidate_track_index(sender, **kwargs):
+    """
+    Drops the in-memory index of random track candidates, so it is rebuilt with the changed track.
+    """
+    track_sampler.invalidate()
+
+
+@receiver(pre_save, sender=Rating)
+def remember_previous_rating(sender, instance, raw=False, **kwargs):
+    """
+    Keeps the stored score of an updated rating, so its statistics can be corrected after the save.
+    """
+    instance._previous = None
+    if instance.pk and not raw:
+        instance._previous = Rating.objects.filter(pk=instance.pk).values_list('song_id', 'rating').first()
+
+
+@receiver(post_save, sender=Rating)
+def update_rating_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Adds a written rating to its song's statistics. Ratings created with bulk_create do not send this signal and
+    are added by the caller.
+    """
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    apply_rating_changes(added=[(instance.song_id, instance.rating)], removed=[previous] if previous else [])
+
+
+@receiver(post_delete, sender=Rating)
+def update_rating_stats_on_delete(sender, instance, **kwargs):
+    """
+    Removes a deleted rating from its song's statistics.
+    """
+    apply_rating_changes(removed=[(instance.song_id, instance.rating)])
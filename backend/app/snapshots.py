@@ -0,0 +1,263 @@
+import functools
+import hashlib
+import io
+import json
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+
+from .data_processing import (analysis_sections, default_analysis_fields, get_analysis_fields,
+                              get_processed_music_columns, get_processed_music_data, get_section_columns,
+                              get_section_data)
+from .histograms import get_feature_histograms
+from .models import AnalysisSnapshot, SnapshotGeneration
+
+FEATURE_ANALYSIS = 'feature-analysis'
+FEATURE_ANALYSIS_NPZ = 'feature-analysis.npz'
+FEATURE_HISTOGRAMS = 'feature-analysis.histograms'
+FEATURE_SECTION = 'feature-analysis.sections.{section}'
+NPZ_CONTENT_TYPE = 'application/x-npz'
+# variants of the stored snapshots chosen by query parameters, e.g. custom histogram bins, are kept per process
+# instead of in the database, at most this many
+DERIVED_SNAPSHOT_CACHE_SIZE = 32
+
+
+def encode_json(data):
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def encode_npz(data):
+    """
+    Encodes a dict of arrays as a compressed NPZ archive. Text values, e.g. error messages, are stored as string
+    arrays, so the archive can be loaded without pickle.
+    """
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **{key: np.asarray(value) for key, value in data.items()})
+    return buffer.getvalue()
+
+
+ENCODERS = {
+    'json': (encode_json, 'application/json'),
+    'npz': (encode_npz, NPZ_CONTENT_TYPE),
+}
+
+SNAPSHOT_BUILDERS = {
+    FEATURE_ANALYSIS: (get_processed_music_data, 'json'),
+    FEATURE_ANALYSIS_NPZ: (get_processed_music_columns, 'npz'),
+    FEATURE_HISTOGRAMS: (get_feature_histograms, 'json'),
+    **{FEATURE_SECTION.format(section=section): (functools.partial(get_section_data, section), 'json')
+       for section in analysis_sections},
+    **{FEATURE_SECTION.format(section=section) + '.npz': (functools.partial(get_section_columns, section), 'npz')
+       for section in analysis_sections},
+}
+
+
+def get_snapshot(name, builder=None, format='json'):
+    """
+    Returns the stored snapshot for the given name, building and persisting it on a miss.
+    Args:
+        name (str): Snapshot name, e.g. 'feature-analysis'
+        builder (callable, optional): Function returning the response data. Defaults to the registered builder.
+        format (str): Encoding of the builder's data, 'json' or 'npz'. Ignored for registered snapshots.
+    Returns:
+        AnalysisSnapshot: Stored snapshot, or an unsaved one if the builder reported an error
+    """
+    snapshot = AnalysisSnapshot.objects.filter(name=name).first()
+    if snapshot is None:
+        snapshot = build_snapshot(name, builder, format)
+    return snapshot
+
+
+def get_generation():
+    """
+    Returns:
+        int: Current generation of the music data, see SnapshotGeneration
+    """
+    return SnapshotGeneration.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+
+def build_snapshot(name, builder=None, format='json'):
+    """
+    Runs the builder for a snapshot and stores its serialized result.
+    Results containing an 'error' key are returned without being stored, so they are retried on the next request.
+    So are results of a build that overlapped a change of the music data, which may have read the data before the
+    change: the generation is read before the build and compared, under a lock of its row, before storing.
+    Args:
+        name (str): Snapshot name
+        builder (callable, optional): Function returning the response data. Defaults to the registered builder.
+        format (str): Encoding of the builder's data, 'json' or 'npz'. Ignored for registered snapshots.
+    Returns:
+        AnalysisSnapshot: The serialized snapshot
+    """
+    if builder is None:
+        builder, format = SNAPSHOT_BUILDERS[name]
+    encoder, content_type = ENCODERS[format]
+    generation = get_generation()
+    data = builder()
+    payload = encoder(data)
+    etag = hashlib.sha256(payload).hexdigest()[:32]
+    if 'error' in data:
+        return AnalysisSnapshot(name=name, payload=payload, content_type=content_type, etag=etag)
+    with transaction.atomic():
+        # waits for an invalidation in progress, which updates the row
+        current = SnapshotGeneration.objects.select_for_update().filter(pk=1).values_list('value', flat=True)
+        if (current.first() or 0) != generation:
+            return AnalysisSnapshot(name=name, payload=payload, content_type=content_type, etag=etag)
+        snapshot, _ = AnalysisSnapshot.objects.update_or_create(
+            name=name,
+            defaults={'payload': payload, 'content_type': content_type, 'etag': etag},
+        )
+    return snapshot
+
+
+def project_analysis_payload(snapshot, fields):
+    """
+    Keeps the given columns of origin_df in an encoded feature analysis snapshot, leaving the other sections as they
+    are.
+    Args:
+        snapshot (AnalysisSnapshot): Feature analysis snapshot, JSON or NPZ
+        fields (list): Canonical columns of origin_df, all present in the snapshot
+    Returns:
+        dict: Response data of the projection, encoded like the snapshot
+    """
+    # payloads read from the database are memoryviews
+    payload = bytes(snapshot.payload)
+    if snapshot.content_type == NPZ_CONTENT_TYPE:
+        with np.load(io.BytesIO(payload)) as arrays:
+            # origin_df/<column>, origin_df/<column>.codes or origin_df/<column>.categories
+            return {key: arrays[key] for key in arrays.files
+                    if not key.startswith('origin_df/') or key[len('origin_df/'):].split('.')[0] in fields}
+    data = json.loads(payload)
+    if 'origin_df' in data:
+        data['origin_df'] = [{field: item[field] for field in fields} for item in data['origin_df']]
+    return data
+
+
+def get_analysis_snapshot(fields=None, format='json'):
+    """
+    Returns the feature analysis snapshot for a projection of origin_df.
+    Only the default projection is stored. Other projections are derived per request, see get_derived_snapshot:
+    subsets of the default columns from the stored snapshot, and projections with the per-track matrices from the
+    builder.
+    Args:
+        fields (list, optional): Columns of origin_df, see get_analysis_fields
+        format (str): 'json' or 'npz'
+    Returns:
+        AnalysisSnapshot: Stored snapshot, or an unsaved one for other projections or if the builder reported an
+            error
+    Raises:
+        ValueError: If a requested column does not exist
+    """
+    fields = get_analysis_fields(fields)
+    name = FEATURE_ANALYSIS_NPZ if format == 'npz' else FEATURE_ANALYSIS
+    snapshot = get_snapshot(name)
+    if fields == default_analysis_fields:
+        return snapshot
+    if set(fields) <= set(default_analysis_fields):
+        builder = functools.partial(project_analysis_payload, snapshot, fields)
+    else:
+        builder = functools.partial(SNAPSHOT_BUILDERS[name][0], fields)
+    return get_derived_snapshot(snapshot, 'fields-' + ','.join(fields), builder, format)
+
+
+_derived_snapshots = OrderedDict()
+_derived_snapshots_lock = threading.Lock()
+
+
+def get_derived_snapshot(base, key, builder, format='json'):
+    """
+    Returns a variant of a stored snapshot without storing it, since clients choose the variants and a row per
+    variant would let them grow the snapshot table without bound. Variants are kept in a per-process LRU cache of
+    DERIVED_SNAPSHOT_CACHE_SIZE entries instead, keyed on the ETag of their base so they follow its rebuilds.
+    Args:
+        base (AnalysisSnapshot): Snapshot the variant belongs to
+        key (str): Canonical description of the variant
+        builder (callable): Function returning the response data of the variant
+        format (str): Encoding of the builder's data, 'json' or 'npz'
+    Returns:
+        AnalysisSnapshot: Unsaved snapshot, only cached if the base is stored
+    """
+    cache_key = (base.name, base.etag, key)
+    with _derived_snapshots_lock:
+        snapshot = _derived_snapshots.get(cache_key)
+        if snapshot is not None:
+            _derived_snapshots.move_to_end(cache_key)
+            return snapshot
+    encoder, content_type = ENCODERS[format]
+    # derived from the base ETag rather than the payload, since NPZ archives record their creation time
+    etag = hashlib.sha256(f'{base.etag}:{key}'.encode()).hexdigest()[:32]
+    snapshot = AnalysisSnapshot(name=f'{base.name}.{key}', payload=encoder(builder()), content_type=content_type,
+                                etag=etag)
+    if base.pk is None:
+        # the base was not stored, since it reported an error or was built while the data changed
+        return snapshot
+    with _derived_snapshots_lock:
+        _derived_snapshots[cache_key] = snapshot
+        while len(_derived_snapshots) > DERIVED_SNAPSHOT_CACHE_SIZE:
+            _derived_snapshots.popitem(last=False)
+    return snapshot
+
+
+def get_histogram_snapshot(bin_widths=None):
+    """
+    Returns the feature histograms snapshot for the given bin widths.
+    Requests without bin widths use the registered snapshot; others are computed per request, see
+    get_derived_snapshot.
+    Args:
+        bin_widths (dict, optional): Maps features to bin widths, see get_feature_histograms
+    Returns:
+        AnalysisSnapshot: Stored snapshot, or an unsaved one for custom bin widths or if the builder reported an error
+    """
+    snapshot = get_snapshot(FEATURE_HISTOGRAMS)
+    if not bin_widths:
+        return snapshot
+    key = 'bins-' + ','.join(f'{feature}:{width!r}' for feature, width in sorted(bin_widths.items()))
+    return get_derived_snapshot(snapshot, key, functools.partial(get_feature_histograms, bin_widths))
+
+
+def get_section_snapshot(section, format='json'):
+    """
+    Returns the snapshot of one section of the feature analysis data.
+    Args:
+        section (str): Section name, see analysis_sections
+        format (str): 'json' or 'npz'
+    Returns:
+        AnalysisSnapshot: Stored snapshot, or an unsaved one if the builder reported an error
+    Raises:
+        KeyError: If the section does not exist
+    """
+    name = FEATURE_SECTION.format(section=section) + ('.npz' if format == 'npz' else '')
+    if name not in SNAPSHOT_BUILDERS:
+        raise KeyError(section)
+    return get_snapshot(name)
+
+
+def invalidate_snapshots():
+    """
+    Drops every stored snapshot and starts a new generation, so builds still running on the previous data are not
+    stored. The snapshots are rebuilt lazily on the next request.
+    """
+    with transaction.atomic():
+        if not SnapshotGeneration.objects.filter(pk=1).update(value=F('value') + 1):
+            SnapshotGeneration.objects.get_or_create(pk=1, defaults={'value': 1})
+        AnalysisSnapshot.objects.all().delete()
+    with _derived_snapshots_lock:
+        _derived_snapshots.clear()
+
+
+def rebuild_snapshots():
+    """
+    Drops every stored snapshot and eagerly rebuilds the registered ones.
+    Intended to run after data imports, so the first request after an import is served from the snapshot.
+    Returns:
+        list: Names of the rebuilt snapshots
+    """
+    invalidate_snapshots()
+    for name in SNAPSHOT_BUILDERS:
+        build_snapshot(name)
+    return list(SNAPSHOT_BUILDERS)
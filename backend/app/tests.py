@@ -1,12 +1,48 @@
 import json
+import os
+import struct
+import tempfile
+import wave
+from datetime import timedelta
+import numpy as np
+import pandas as pd
 
 from app.api.serializers import RatingSerializer
-from app.models import Music, Rating
-from django.db import IntegrityError
+from app.data_processing import get_genre_means, get_genre_means_from_database, get_trendlines
+from app.histograms import get_bin_edges, get_box_statistics
+from app.media import MediaUrlCache, serve_media
+from app.models import AnalysisSnapshot, Music, Rating, RatingStats
+from app.rating_stats import rebuild_rating_stats
+from app.renditions import clip_name, read_excerpt, render_clip, resample
+from app.regression import fit_ols, t_critical_value, t_two_sided_pvalue
+from app.sampling import TrackSampler, track_sampler
+from app.snapshots import (FEATURE_ANALYSIS, FEATURE_ANALYSIS_NPZ, FEATURE_HISTOGRAMS, FEATURE_SECTION,
+                           get_snapshot, rebuild_snapshots)
+from app.uploads import UploadPipeline
+from app.management.commands.supplementary_data import parse_array_column
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.http import Http404
+from django.middleware.gzip import GZipMiddleware
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from io import BytesIO, StringIO
 from rest_framework import status
+from unittest.mock import patch
+
+
+class APITestCase(TestCase):
+    """
+    Base class for tests calling the API. Clears the cache before every test, so the history of the anonymous
+    rate throttle does not carry over between tests.
+    """
+    def setUp(self):
+        cache.clear()
 
 
 # test models
@@ -51,8 +87,9 @@ class RatingModelTests(TestCase):
 
 
 # test views
-class MusicViewSetTests(TestCase):
+class MusicViewSetTests(APITestCase):
     def setUp(self):
+        super().setUp()
         self.expected_fields = [
             'id', 'title', 'label', 'file'
         ]
@@ -68,15 +105,117 @@ class MusicViewSetTests(TestCase):
         for field in self.expected_fields:
             self.assertIn(field, response.json())
 
+    def test_random_music_balance(self):
+        response = self.client.get(reverse('music-random'), {'balance': 'origin'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('music-random'), {'balance': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_random_music_stale_index(self):
+        track_sampler.get_index()
+        Music.objects.filter(label='exp1').delete()
+        for _ in range(10):
+            response = self.client.get(reverse('music-random'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response.json()['label'], 'exp1')
+
+    def test_random_music_empty(self):
+        Music.objects.all().delete()
+        response = self.client.get(reverse('music-random'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_random_batch_endpoint(self):
+        response = self.client.get(reverse('music-random-batch'), {'n': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 2)
+        for field in self.expected_fields:
+            self.assertIn(field, response.json()[0])
+
+    def test_random_batch_distinct(self):
+        response = self.client.get(reverse('music-random-batch'), {'n': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [track['id'] for track in response.json()]
+        self.assertEqual(len(ids), len(self.music_data))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_random_batch_invalid_size(self):
+        for n in [0, 1000, 'abc']:
+            response = self.client.get(reverse('music-random-batch'), {'n': n})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_music_list_endpoint(self):
         response = self.client.get(reverse('music-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.json()), len(self.music_data))
+        self.assertEqual(len(response.json()['results']), len(self.music_data))
+        self.assertIsNone(response.json()['next'])
+
+    def test_music_list_pages(self):
+        response = self.client.get(reverse('music-list'), {'page_size': 2})
+        first = response.json()
+        self.assertEqual([track['id'] for track in first['results']],
+                         list(Music.objects.order_by('id').values_list('id', flat=True)[:2]))
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 1)
+        self.assertGreater(second['results'][0]['id'], first['results'][-1]['id'])
+        self.assertIsNone(second['next'])
+
+    def test_music_list_defers_features(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('music-list'))
+        music_query = next(query['sql'] for query in queries.captured_queries if 'app_music' in query['sql'])
+        self.assertNotIn('pc_dist2', music_query)
+        self.assertIn('"app_music"."clip"', music_query)
+
+    def test_random_music_serves_clip(self):
+        Music.objects.update(file='pop/pop_001.wav', clip='clips/pop/pop_001_center_30s_22050hz.wav')
+        response = self.client.get(reverse('music-random'))
+        self.assertTrue(response.json()['file'].endswith('/clips/pop/pop_001_center_30s_22050hz.wav'))
+        response = self.client.get(reverse('music-random-batch'), {'n': 2})
+        self.assertTrue(all('/clips/' in track['file'] for track in response.json()))
+        response = self.client.get(reverse('music-list'))
+        self.assertTrue(response.json()['results'][0]['file'].endswith('/pop/pop_001.wav'))
+
+
+class TrackSamplerTests(TestCase):
+    def setUp(self):
+        self.sampler = TrackSampler(ttl=300)
+        self.tracks = [Music.objects.create(title=f'Song {i}', label=label)
+                       for i, label in enumerate(['pop', 'classical', 'exp1', 'exp1'])]
+
+    def test_index(self):
+        index = self.sampler.get_index()
+        self.assertEqual(sorted(index), ['classical', 'exp1', 'pop'])
+        self.assertEqual(len(index['exp1']), 2)
+
+    def test_index_cached_until_invalidated(self):
+        self.sampler.get_index()
+        Music.objects.create(title='New Song', label='exp2')
+        self.assertNotIn('exp2', self.sampler.get_index())
+        self.sampler.invalidate()
+        self.assertIn('exp2', self.sampler.get_index())
+
+    def test_label_weights(self):
+        labels = ['pop', 'classical', 'exp1']
+        self.assertEqual(TrackSampler.label_weights(labels, 'label'), [1.0, 1.0, 1.0])
+        self.assertEqual(TrackSampler.label_weights(labels, 'origin'), [0.5, 0.5, 1.0])
+        self.assertEqual(TrackSampler.label_weights(['pop', 'classical'], 'origin'), [1.0, 1.0])
+        with self.assertRaises(ValueError):
+            TrackSampler.label_weights(labels, 'invalid')
 
+    def test_sample_ids(self):
+        ids = self.sampler.sample_ids(10, 'origin')
+        self.assertEqual(sorted(ids), sorted(track.id for track in self.tracks))
 
-class RatingViewSetTests(TestCase):
+    def test_sample_id(self):
+        ids = {track.id for track in self.tracks}
+        for _ in range(20):
+            self.assertIn(self.sampler.sample_id('origin'), ids)
+
+
+class RatingViewSetTests(APITestCase):
 
     def setUp(self):
+        super().setUp()
         self.music = Music.objects.create(title='Test Song', label='pop')
         self.rating_data = {'song': self.music.id, 'rating': 3}
 
@@ -91,12 +230,75 @@ class RatingViewSetTests(TestCase):
         response = self.create_rating(self.rating_data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def create_ratings(self, ratings):
+        return self.client.post(
+            reverse('rating-rate-batch'),
+            data=json.dumps(ratings),
+            content_type='application/json'
+        )
+
+    def test_rate_batch_endpoint(self):
+        other = Music.objects.create(title='Other Song', label='exp1')
+        response = self.create_ratings([self.rating_data, {'song': other.id, 'rating': 5}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['rating'] for item in response.json()], [3, 5])
+        self.assertEqual(Rating.objects.count(), 2)
+
+    def test_rate_batch_query_count(self):
+        ratings = [{'song': self.music.id, 'rating': i % 5 + 1} for i in range(20)]
+        with self.assertNumQueries(6):
+            response = self.create_ratings(ratings)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_rate_batch_non_existent_music(self):
+        response = self.create_ratings([self.rating_data, {'song': 99999999, 'rating': 2}])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), {'error': 'Song not found', 'songs': [99999999]})
+        self.assertFalse(Rating.objects.exists())
+
+    def test_rate_batch_invalid_input(self):
+        for ratings in [[], self.rating_data, [{'song': self.music.id, 'rating': 6}], [{'rating': 3}]]:
+            response = self.create_ratings(ratings)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Rating.objects.exists())
+
     def test_song_ratings_endpoint(self):
         self.test_rate_song_endpoint()
         response = self.client.get(reverse('rating-song-ratings'), {'song': self.music.id})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.json()), 1)
-        self.assertEqual(response.json()[0]['rating'], 3)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(response.json()['results'][0]['rating'], 3)
+
+    def test_song_ratings_pages(self):
+        other = Music.objects.create(title='Other Song', label='classical')
+        Rating.objects.bulk_create([Rating(song=song, rating=i % 5 + 1)
+                                    for i in range(5) for song in [self.music, other]])
+        ratings = list(Rating.objects.filter(song=self.music).values_list('id', flat=True))
+        url, ids = reverse('rating-song-ratings'), []
+        params = {'song': self.music.id, 'page_size': 2}
+        while url:
+            page = self.client.get(url, params).json()
+            ids += [rating['id'] for rating in page['results']]
+            self.assertTrue(all(rating['song'] == self.music.id for rating in page['results']))
+            url, params = page['next'], None
+        self.assertEqual(ids, ratings)
+
+    def test_rating_list_pages(self):
+        Rating.objects.bulk_create([Rating(song=self.music, rating=i % 5 + 1) for i in range(7)])
+        ratings = list(Rating.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        url, ids = reverse('rating-list') + '?page_size=3', []
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 3)
+            ids += [rating['id'] for rating in page['results']]
+            url = page['next']
+        self.assertEqual(ids, ratings)
+
+    def test_rating_list_invalid_cursor(self):
+        response = self.client.get(reverse('rating-list'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('rating-song-ratings'), {'song': self.music.id, 'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_get_song_ratings_without_song_id(self):
         response = self.client.get(reverse('rating-song-ratings'))
@@ -127,10 +329,81 @@ class RatingViewSetTests(TestCase):
         self.assertEqual(response.json(), {'error': 'Song not found'})
 
 
-class MusicAnalysisDataTests(TestCase):
+class RatingStatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.human = Music.objects.create(title='Human Song', label='pop')
+        self.ai = Music.objects.create(title='AI Song', label='exp1')
+
+    def rate(self, ratings):
+        return self.client.post(reverse('rating-rate-batch'), data=json.dumps(ratings),
+                                content_type='application/json')
+
+    def test_stats_updated_by_rate_song(self):
+        for rating in [2, 4]:
+            self.client.post(reverse('rating-rate-song'), data=json.dumps({'song': self.human.id, 'rating': rating}),
+                             content_type='application/json')
+        stats = RatingStats.objects.get(song=self.human)
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.mean, 3.0)
+        self.assertEqual(stats.std, 1.0)
+        self.assertEqual(stats.histogram, [0, 1, 0, 1, 0])
+
+    def test_stats_updated_by_rate_batch(self):
+        self.rate([{'song': self.ai.id, 'rating': 5}, {'song': self.ai.id, 'rating': 1}])
+        self.assertEqual(RatingStats.objects.get(song=self.ai).histogram, [1, 0, 0, 0, 1])
+
+    def test_stats_updated_on_change_and_delete(self):
+        rating = Rating.objects.create(song=self.ai, rating=5)
+        rating.rating = 3
+        rating.save()
+        self.assertEqual(RatingStats.objects.get(song=self.ai).histogram, [0, 0, 1, 0, 0])
+        rating.delete()
+        stats = RatingStats.objects.get(song=self.ai)
+        self.assertEqual((stats.count, stats.total, stats.total_squares), (0, 0, 0))
+
+    def test_song_deletion(self):
+        Rating.objects.create(song=self.ai, rating=5)
+        self.ai.delete()
+        self.assertFalse(RatingStats.objects.exists())
+
+    def test_rebuild_rating_stats(self):
+        self.rate([{'song': self.ai.id, 'rating': 5}, {'song': self.human.id, 'rating': 1}])
+        expected = {stats.song_id: stats.histogram for stats in RatingStats.objects.all()}
+        RatingStats.objects.all().delete()
+        self.assertEqual(rebuild_rating_stats(), 2)
+        self.assertEqual({stats.song_id: stats.histogram for stats in RatingStats.objects.all()}, expected)
+
+    def test_rebuild_rating_stats_atomic(self):
+        self.rate([{'song': self.ai.id, 'rating': 5}])
+        with patch.object(RatingStats.objects, 'bulk_create', side_effect=RuntimeError), \
+                CaptureQueriesContext(connection) as queries, self.assertRaises(RuntimeError):
+            rebuild_rating_stats()
+        self.assertTrue(any(query['sql'].startswith('LOCK TABLE') for query in queries))
+        # the failed rebuild left the statistics as they were
+        self.assertEqual(RatingStats.objects.get(song=self.ai).histogram, [0, 0, 0, 0, 1])
+
+    def test_stats_endpoint(self):
+        self.rate([{'song': self.human.id, 'rating': 1}, {'song': self.human.id, 'rating': 5},
+                   {'song': self.ai.id, 'rating': 4}, {'song': self.ai.id, 'rating': 2}])
+        response = self.client.get(reverse('rating-stats'), {'song': [self.human.id, self.ai.id]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(len(data['songs']), 2)
+        self.assertEqual(data['labels']['pop']['fooled_rate'], 0.5)
+        self.assertEqual(data['labels']['exp1']['count'], 2)
+        self.assertEqual(data['labels']['exp1']['fooled_rate'], 0.5)
+
+    def test_stats_endpoint_invalid_song(self):
+        response = self.client.get(reverse('rating-stats'), {'song': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class MusicAnalysisDataTests(APITestCase):
     fixtures = ['test_music_data.json']
 
     def setUp(self):
+        super().setUp()
         self.fields = ['origin_df', 'pitch_class_dist', 'pitch_transition_dist', 'interval_dist', 'interval_size_dist',
                        'interval_dir_dist', 'interval_transition_dist']
 
@@ -161,7 +434,298 @@ class MusicAnalysisDataTests(TestCase):
         self.assertEqual(data['error'], 'No music data available for analysis')
 
 
-class MusicAnalysisIncompleteDataTests(TestCase):
+class MusicAnalysisProjectionTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def test_matrices_left_out_by_default(self):
+        origin_df = self.client.get(reverse('feature-analysis')).json()['origin_df']
+        for item in origin_df:
+            self.assertNotIn('pc_dist2', item)
+            self.assertNotIn('iv_dist2', item)
+            self.assertIn('pc_dist1', item)
+            self.assertIn('genre', item)
+
+    def test_field_projection(self):
+        response = self.client.get(reverse('feature-analysis'), {'fields': 'npvi,genre,iv_dist2'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data['origin_df'][0]), ['npvi', 'iv_dist2', 'genre'])
+        self.assertEqual({item['genre'] for item in data['origin_df']}, {'pop', 'classical'})
+        self.assertIn('interval_transition_dist', data)
+
+    def test_projection_snapshots(self):
+        self.client.get(reverse('feature-analysis'), {'fields': 'npvi,genre'})
+        self.client.get(reverse('feature-analysis'), {'fields': 'genre,npvi'})
+        self.client.get(reverse('feature-analysis'))
+        self.client.get(reverse('feature-analysis'), {'fields': 'npvi,pc_dist2'})
+        self.assertEqual(list(AnalysisSnapshot.objects.values_list('name', flat=True)), [FEATURE_ANALYSIS])
+        Music.objects.first().save()
+        self.assertFalse(AnalysisSnapshot.objects.exists())
+
+    def test_subset_projected_from_snapshot(self):
+        full = self.client.get(reverse('feature-analysis')).json()
+        response = self.client.get(reverse('feature-analysis'), {'fields': 'genre,npvi,genre'})
+        self.assertEqual(response.json()['origin_df'],
+                         [{'npvi': item['npvi'], 'genre': item['genre']} for item in full['origin_df']])
+        response = self.client.get(reverse('feature-analysis'), {'fields': 'npvi,genre'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('feature-analysis'), {'fields': 'npvi,tempo'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Unknown fields: tempo')
+
+    @override_settings(ANALYSIS_AGGREGATION='python')
+    def test_projection_python_backend(self):
+        response = self.client.get(reverse('feature-analysis'), {'fields': 'npvi'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['origin_df'][0]), ['npvi'])
+        self.assertEqual(len(response.json()['interval_transition_dist']['pop']['data']), 25)
+
+
+class MusicFeaturesTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def setUp(self):
+        super().setUp()
+        self.music = Music.objects.exclude(pc_dist2=None).first()
+
+    def test_default_features(self):
+        response = self.client.get(reverse('music-features', args=[self.music.id]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data), ['id', 'pc_dist2', 'iv_dist2'])
+        self.assertEqual(data['pc_dist2'], self.music.pc_dist2)
+
+    def test_selected_features(self):
+        response = self.client.get(reverse('music-features', args=[self.music.id]), {'fields': 'pc_dist1,npvi'})
+        self.assertEqual(list(response.json()), ['id', 'npvi', 'pc_dist1'])
+
+    def test_unknown_feature(self):
+        response = self.client.get(reverse('music-features', args=[self.music.id]), {'fields': 'genre'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_music_not_found(self):
+        response = self.client.get(reverse('music-features', args=[99999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class FeatureHistogramTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def get_histograms(self, params=None):
+        response = self.client.get(reverse('feature-histograms'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_histograms(self):
+        data = self.get_histograms()
+        for feature in ['duration', 'npvi', 'note_density', 'pitch_range', 'complexity', 'originality', 'gradus']:
+            edges = data[feature]['bin_edges']
+            for genre in ['pop', 'classical']:
+                stats = data[feature]['genres'][genre]
+                values = [value for value in Music.objects.filter(label=genre).values_list(feature, flat=True)
+                          if value is not None]
+                self.assertEqual(stats['count'], len(values))
+                self.assertEqual(sum(stats['counts']), len(values))
+                self.assertEqual(len(stats['counts']), len(edges) - 1)
+                if values:
+                    self.assertAlmostEqual(stats['median'], float(np.median(values)))
+        self.assertEqual(sum(data['key']['genres']['pop']['counts']), Music.objects.filter(label='pop').count())
+        self.assertTrue(AnalysisSnapshot.objects.filter(name=FEATURE_HISTOGRAMS).exists())
+
+    def test_bin_width(self):
+        data = self.get_histograms({'bin_width': 'duration:30,npvi:5'})
+        self.assertTrue(np.allclose(np.diff(data['duration']['bin_edges']), 30))
+        self.assertTrue(np.allclose(np.diff(data['npvi']['bin_edges']), 5))
+        self.assertEqual(data['npvi']['bin_edges'][0] % 5, 0)
+
+    def test_bin_widths_not_stored(self):
+        for width in [30, 31, 32.5]:
+            self.get_histograms({'bin_width': f'duration:{width}'})
+        self.assertEqual(list(AnalysisSnapshot.objects.values_list('name', flat=True)), [FEATURE_HISTOGRAMS])
+        response = self.client.get(reverse('feature-histograms'), {'bin_width': 'duration:30'})
+        etag = response['ETag']
+        response = self.client.get(reverse('feature-histograms'), {'bin_width': 'duration:30'},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get(reverse('feature-histograms'))['ETag'], etag)
+
+    def test_invalid_bin_width(self):
+        for bin_width in ['tempo:5', 'npvi:0', 'npvi:abc', 'npvi']:
+            response = self.client.get(reverse('feature-histograms'), {'bin_width': bin_width})
+            self.assertEqual(response.status_code, 400)
+
+    def test_no_music_data(self):
+        Music.objects.all().delete()
+        response = self.client.get(reverse('feature-histograms'))
+        self.assertEqual(response.json(), {'error': 'No music data available for analysis'})
+
+    def test_bin_edges(self):
+        values = np.array([0.5, 3.0, 9.9])
+        np.testing.assert_allclose(get_bin_edges(values, 2), [0, 2, 4, 6, 8, 10])
+        self.assertLessEqual(len(get_bin_edges(np.array([0.0, 1e6]), 1e-3)), 502)
+
+    def test_box_statistics(self):
+        stats = get_box_statistics(np.array([1.0, 2.0, 3.0, 4.0, 100.0]))
+        self.assertEqual((stats['q1'], stats['median'], stats['q3']), (2.0, 3.0, 4.0))
+        self.assertEqual((stats['lowerfence'], stats['upperfence']), (1.0, 4.0))
+        self.assertEqual(stats['outliers'], [100.0])
+        self.assertEqual(get_box_statistics(np.array([])), {'count': 0})
+
+
+class MusicAnalysisSectionTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def get_section(self, section, **kwargs):
+        response = self.client.get(reverse('feature-section', args=[section]), **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_sections_match_full_data(self):
+        data = self.client.get(reverse('feature-analysis')).json()
+        origin_df = pd.DataFrame(data['origin_df'])
+        rhythm = self.get_section('rhythm').json()
+        self.assertEqual(set(rhythm), {'origin_df', 'trendlines'})
+        self.assertEqual(rhythm['trendlines'], data['trendlines'])
+        pd.testing.assert_frame_equal(pd.DataFrame(rhythm['origin_df']),
+                                      origin_df[['genre', 'duration', 'npvi', 'note_density']])
+        intervals = self.get_section('intervals').json()
+        self.assertEqual(set(intervals), {'interval_dist', 'interval_size_dist', 'interval_dir_dist',
+                                          'interval_transition_dist'})
+        self.assertEqual(intervals['interval_dist'], data['interval_dist'])
+        self.assertEqual(list(self.get_section('keys').json()['origin_df'][0]), ['genre', 'key'])
+
+    def test_section_npz(self):
+        response = self.get_section('pitch', HTTP_ACCEPT='application/x-npz')
+        self.assertEqual(response['Content-Type'], 'application/x-npz')
+        arrays = np.load(BytesIO(response.content))
+        self.assertEqual(arrays['pitch_transition_dist/pop'].shape, (12, 12))
+        self.assertFalse(any(key.startswith('origin_df/') for key in arrays.files))
+        arrays = np.load(BytesIO(self.get_section('complexity', HTTP_ACCEPT='application/x-npz').content))
+        self.assertIn('origin_df/gradus', arrays.files)
+
+    def test_section_snapshot(self):
+        etag = self.get_section('keys')['ETag']
+        self.assertTrue(AnalysisSnapshot.objects.filter(name=FEATURE_SECTION.format(section='keys')).exists())
+        response = self.client.get(reverse('feature-section', args=['keys']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_section(self):
+        response = self.client.get(reverse('feature-section', args=['tempo']))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('Unknown section', response.json()['error'])
+
+    def test_no_music_data(self):
+        Music.objects.all().delete()
+        for section in ['keys', 'intervals']:
+            response = self.get_section(section)
+            self.assertEqual(response.json(), {'error': 'No music data available for analysis'})
+        self.assertFalse(AnalysisSnapshot.objects.exists())
+
+
+class FilteredMusicDataTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def get_rows(self, params):
+        response = self.client.get(reverse('feature-scatter'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['origin_df']
+
+    def test_range_filter(self):
+        rows = self.get_rows({'fields': 'id,genre,note_density', 'note_density': '2:7'})
+        expected = Music.objects.filter(label__in=['pop', 'classical'], note_density__gte=2, note_density__lte=7)
+        self.assertEqual([row['id'] for row in rows], sorted(expected.values_list('id', flat=True)))
+        self.assertEqual(set(rows[0]), {'id', 'genre', 'note_density'})
+        self.assertTrue(all(2 <= row['note_density'] <= 7 for row in rows))
+
+    def test_open_bounds(self):
+        rows = self.get_rows({'fields': 'duration', 'duration': ':270', 'pitch_range': '45:'})
+        expected = Music.objects.filter(label__in=['pop', 'classical'], duration__lte=270, pitch_range__gte=45)
+        self.assertEqual(len(rows), expected.count())
+        self.assertTrue(all(row['duration'] <= 270 for row in rows))
+
+    def test_no_match(self):
+        self.assertEqual(self.get_rows({'note_density': '100:'}), [])
+        response = self.client.get(reverse('feature-scatter'), {'fields': 'genre,npvi', 'note_density': '100:'},
+                                   HTTP_ACCEPT='application/x-npz')
+        arrays = np.load(BytesIO(response.content))
+        self.assertEqual(arrays['origin_df/npvi'].shape, (0,))
+        self.assertEqual(arrays['origin_df/genre.codes'].shape, (0,))
+
+    def test_npz(self):
+        response = self.client.get(reverse('feature-scatter'), {'fields': 'genre,duration', 'duration': '250:'},
+                                   HTTP_ACCEPT='application/x-npz')
+        self.assertEqual(response['Content-Type'], 'application/x-npz')
+        self.assertIn('max-age', response['Cache-Control'])
+        arrays = np.load(BytesIO(response.content))
+        self.assertTrue((arrays['origin_df/duration'] >= 250).all())
+        self.assertEqual(len(arrays['origin_df/genre.codes']), len(arrays['origin_df/duration']))
+
+    def test_invalid_filters(self):
+        for params in [{'note_density': '2'}, {'note_density': 'a:b'}, {'duration': 'nan:'}, {'fields': 'tempo'}]:
+            response = self.client.get(reverse('feature-scatter'), params)
+            self.assertEqual(response.status_code, 400)
+
+
+class RegressionTests(TestCase):
+    def test_t_distribution(self):
+        self.assertAlmostEqual(t_critical_value(0.95, 10), 2.228138852, places=6)
+        self.assertAlmostEqual(t_critical_value(0.95, 1), 12.70620474, places=5)
+        self.assertAlmostEqual(t_two_sided_pvalue(2.0, 10), 0.07338803, places=6)
+        self.assertEqual(t_two_sided_pvalue(0.0, 10), 1.0)
+
+    def test_fit_ols(self):
+        rng = np.random.default_rng(0)
+        x = rng.normal(size=40)
+        y = 2 * x + 1 + rng.normal(size=40)
+        fit = fit_ols(x, y)
+        slope, intercept = np.polyfit(x, y, 1)
+        self.assertAlmostEqual(fit['slope'], slope)
+        self.assertAlmostEqual(fit['intercept'], intercept)
+        self.assertAlmostEqual(fit['r2'], np.corrcoef(x, y)[0, 1] ** 2)
+        self.assertLess(fit['slope_pvalue'], 1e-6)
+        self.assertEqual(len(fit['x']), 50)
+        for lower, fitted, upper in zip(fit['lower'], fit['y'], fit['upper']):
+            self.assertLess(lower, fitted)
+            self.assertLess(fitted, upper)
+
+    def test_unidentifiable_fit(self):
+        self.assertIsNone(fit_ols(np.array([1.0, 2.0]), np.array([1.0, 2.0])))
+        self.assertIsNone(fit_ols(np.array([1.0, 1.0, 1.0]), np.array([1.0, 2.0, 3.0])))
+
+
+class TrendlineTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            Music.objects.create(title=f'trend{i}.mid', label='pop', note_density=float(i), npvi=3.0 * i + 10,
+                                 duration=100.0 + i)
+
+    def test_trendlines(self):
+        trendlines = get_trendlines([('note_density', 'npvi')])
+        pop = trendlines['note_density']['npvi']['pop']
+        self.assertEqual(pop['n'], Music.objects.filter(label='pop').exclude(npvi=None).count())
+        self.assertIsNone(trendlines['note_density']['npvi']['classical'])
+
+    def test_analysis_data_trendlines(self):
+        data = self.client.get(reverse('feature-analysis')).json()
+        self.assertEqual(set(data['trendlines']), {'note_density', 'duration'})
+        self.assertIn('pop', data['trendlines']['duration']['npvi'])
+
+    @override_settings(ANALYSIS_TRENDLINES=[('note_density', 'npvi')])
+    def test_npz_trendlines(self):
+        response = self.client.get(reverse('feature-analysis'), HTTP_ACCEPT='application/x-npz')
+        arrays = np.load(BytesIO(response.content))
+        self.assertEqual(arrays['trendlines/note_density/npvi/pop/x'].shape, (50,))
+        self.assertFalse(any(key.startswith('trendlines/note_density/npvi/classical') for key in arrays.files))
+        self.assertFalse(any(key.startswith('trendlines/duration') for key in arrays.files))
+
+
+class MusicAnalysisIncompleteDataTests(APITestCase):
     fixtures = ['test_music_data_incomplete.json']
 
     def test_incomplete_music_data(self):
@@ -172,6 +736,211 @@ class MusicAnalysisIncompleteDataTests(TestCase):
         self.assertEqual(data['error'], 'An unexpected error occurred during data processing')
 
 
+class MusicAnalysisNPZTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def get_npz(self, **kwargs):
+        response = self.client.get(reverse('feature-analysis'), HTTP_ACCEPT='application/x-npz', **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-npz')
+        return np.load(BytesIO(response.content))
+
+    def test_npz_matches_json(self):
+        data = self.client.get(reverse('feature-analysis')).json()
+        arrays = self.get_npz()
+        origin_df = pd.DataFrame(data['origin_df'])
+        np.testing.assert_array_equal(arrays['origin_df/id'], origin_df['id'])
+        np.testing.assert_allclose(arrays['origin_df/npvi'], origin_df['npvi'], rtol=1e-6)
+        labels = arrays['origin_df/label.categories'][arrays['origin_df/label.codes']]
+        self.assertEqual(list(labels), list(origin_df['label']))
+        self.assertEqual(arrays['origin_df/pc_dist1'].shape, (len(origin_df), 12))
+        self.assertNotIn('origin_df/pc_dist2', arrays)
+        self.assertTrue(np.isnan(arrays['origin_df/complexity']).any())
+        np.testing.assert_allclose(arrays['pitch_class_dist/pop'], data['pitch_class_dist']['pop'], rtol=1e-6)
+        np.testing.assert_allclose(arrays['interval_transition_dist/classical'],
+                                   data['interval_transition_dist']['classical']['data'], rtol=1e-6)
+        self.assertEqual(list(arrays['interval_dist/intervals']), data['interval_dist']['intervals'])
+
+    def test_npz_projection(self):
+        arrays = self.get_npz(QUERY_STRING='fields=genre,pc_dist2')
+        origin_keys = sorted(key for key in arrays.files if key.startswith('origin_df/'))
+        self.assertEqual(origin_keys, ['origin_df/genre.categories', 'origin_df/genre.codes', 'origin_df/pc_dist2'])
+        self.assertEqual(arrays['origin_df/pc_dist2'].shape[1:], (12, 12))
+
+    def test_npz_subset_projection(self):
+        full = self.get_npz()
+        arrays = self.get_npz(QUERY_STRING='fields=npvi,label')
+        origin_keys = sorted(key for key in arrays.files if key.startswith('origin_df/'))
+        self.assertEqual(origin_keys, ['origin_df/label.categories', 'origin_df/label.codes', 'origin_df/npvi'])
+        np.testing.assert_array_equal(arrays['origin_df/npvi'], full['origin_df/npvi'])
+        np.testing.assert_array_equal(arrays['pitch_class_dist/pop'], full['pitch_class_dist/pop'])
+
+    def test_npz_snapshot(self):
+        self.get_npz()
+        self.assertTrue(AnalysisSnapshot.objects.filter(name=FEATURE_ANALYSIS_NPZ).exists())
+        response = self.client.get(reverse('feature-analysis'), HTTP_ACCEPT='application/x-npz')
+        self.assertIn('Accept', response['Vary'])
+        etag = response['ETag']
+        response = self.client.get(reverse('feature-analysis'), HTTP_ACCEPT='application/x-npz',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_npz_no_music_data(self):
+        Music.objects.all().delete()
+        arrays = self.get_npz()
+        self.assertEqual(str(arrays['error']), 'No music data available for analysis')
+
+
+class GenreMeansTests(TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'genre': ['pop', 'pop', 'pop', 'classical'],
+            'pc_dist1': [[1.0] * 12, [3.0] * 12, None, [0.5] * 12],
+            'pc_dist2': [[[1.0] * 12] * 12, None, [[2.0] * 12] * 12, [[0.5] * 12] * 12],
+            'iv_dist1': [[1.0] * 25] * 4,
+            'ivsize_dist1': [[1.0] * 13] * 4,
+            'ivdir_dist1': [[1.0] * 12] * 4,
+            'iv_dist2': [[[1.0] * 25] * 25] * 4,
+        })
+
+    def test_null_arrays_are_skipped(self):
+        means = get_genre_means(self.df)
+        np.testing.assert_allclose(means['pc_dist1']['pop'], [2.0] * 12)
+        np.testing.assert_allclose(means['pc_dist2']['pop'], np.full((12, 12), 1.5))
+        np.testing.assert_allclose(means['pc_dist1']['classical'], [0.5] * 12)
+        self.assertEqual(means['iv_dist2']['classical'].shape, (25, 25))
+
+    def test_missing_genre_data(self):
+        self.df['ivsize_dist1'] = [[1.0] * 13, [1.0] * 13, [1.0] * 13, None]
+        with self.assertRaises(ValueError):
+            get_genre_means(self.df)
+
+
+class DatabaseGenreMeansTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def test_matches_python_aggregation(self):
+        df = pd.DataFrame(Music.objects.filter(label__in=['pop', 'classical']).values())
+        df['genre'] = df['label']
+        expected = get_genre_means(df)
+        means = get_genre_means_from_database()
+        for column, genre_means in expected.items():
+            for genre, mean in genre_means.items():
+                np.testing.assert_allclose(means[column][genre], mean)
+
+    def test_missing_genre_data(self):
+        Music.objects.filter(label='classical').update(iv_dist2=None)
+        with self.assertRaises(ValueError):
+            get_genre_means_from_database()
+
+    @override_settings(ANALYSIS_AGGREGATION='python')
+    def test_python_backend(self):
+        response = self.client.get(reverse('feature-analysis'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['interval_transition_dist']['pop']['data']), 25)
+
+
+class AnalysisSnapshotTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def test_snapshot_created_on_first_request(self):
+        self.assertFalse(AnalysisSnapshot.objects.exists())
+        response = self.client.get(reverse('feature-analysis'))
+        self.assertEqual(response.status_code, 200)
+        snapshot = AnalysisSnapshot.objects.get(name=FEATURE_ANALYSIS)
+        self.assertEqual(response['ETag'], f'"{snapshot.etag}"')
+
+    def test_not_modified(self):
+        etag = self.client.get(reverse('feature-analysis'))['ETag']
+        response = self.client.get(reverse('feature-analysis'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_music_change_invalidates_snapshot(self):
+        etag = self.client.get(reverse('feature-analysis'))['ETag']
+        music = Music.objects.filter(label='pop').first()
+        music.npvi = 10.0
+        music.save()
+        self.assertFalse(AnalysisSnapshot.objects.exists())
+        response = self.client.get(reverse('feature-analysis'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_rebuild_snapshots(self):
+        rebuild_snapshots()
+        self.assertTrue(AnalysisSnapshot.objects.filter(name=FEATURE_ANALYSIS).exists())
+        self.assertTrue(AnalysisSnapshot.objects.filter(name=FEATURE_SECTION.format(section='rhythm')).exists())
+
+    def test_build_overlapping_change_not_stored(self):
+        def builder():
+            data = {'npvi': list(Music.objects.values_list('npvi', flat=True))}
+            # the music data changes after the build read it
+            music = Music.objects.first()
+            music.npvi = 10.0
+            music.save()
+            return data
+
+        snapshot = get_snapshot('stale', builder)
+        self.assertIsNone(snapshot.pk)
+        self.assertFalse(AnalysisSnapshot.objects.exists())
+        self.assertIsNotNone(get_snapshot('stale', lambda: {'npvi': []}).pk)
+
+    def test_error_result_not_stored(self):
+        Music.objects.all().delete()
+        response = self.client.get(reverse('feature-analysis'))
+        self.assertIn('error', response.json())
+        self.assertFalse(AnalysisSnapshot.objects.exists())
+
+
+class ConditionalGetTests(APITestCase):
+    fixtures = ['test_music_data.json']
+
+    def assert_revalidates(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return response
+
+    def test_music_list(self):
+        self.assert_revalidates(reverse('music-list'))
+        response = self.client.get(reverse('music-list'))
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    def test_music_changes_etag(self):
+        etag = self.client.get(reverse('music-list'))['ETag']
+        Music.objects.filter(pk=Music.objects.order_by('id').first().pk).update(title='Renamed')
+        response = self.client.get(reverse('music-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_song_ratings(self):
+        music = Music.objects.first()
+        Rating.objects.create(song=music, rating=3)
+        url = reverse('rating-song-ratings')
+        etag = self.assert_revalidates(url, {'song': music.id})['ETag']
+        self.assertIn('no-cache', self.client.get(url, {'song': music.id})['Cache-Control'])
+        Rating.objects.create(song=music, rating=4)
+        response = self.client.get(url, {'song': music.id}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_random_not_cached(self):
+        response = self.client.get(reverse('music-random'))
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertNotIn('ETag', response)
+
+    def test_feature_analysis_gzip(self):
+        response = self.client.get(reverse('feature-analysis'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        response = self.client.get(reverse('feature-analysis'), HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
 # test serializers
 class RatingSerializerTests(TestCase):
     def setUp(self):
@@ -189,3 +958,388 @@ class RatingSerializerTests(TestCase):
         self.rating_data['rating'] = 0
         serializer = RatingSerializer(data=self.rating_data)
         self.assertFalse(serializer.is_valid())
+
+
+# test management commands
+class InitialDbPopulationTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        root = self.temp_dir.name
+        for genre, file_name in [('pop', '001.mid'), ('pop', '002.mid'), ('exp1', '001.mid')]:
+            os.makedirs(os.path.join(root, 'wav', genre), exist_ok=True)
+            with open(os.path.join(root, 'wav', genre, f'{genre}_{file_name[:3]}.wav'), 'wb') as f:
+                f.write(b'RIFF')
+        pd.DataFrame({'file_name': ['001.mid', '002.mid', '003.mid'], 'genre': ['pop', 'pop', 'pop'],
+                      'key': ['C', 'd', 'E'], 'npvi': [50.0, None, 40.0],
+                      'pitch_range': [40, 41, 42]}).to_csv(os.path.join(root, 'ds.csv'), index=False)
+        pd.DataFrame({'file_name': ['001.mid'], 'genre': ['exp1'], 'key': ['G'], 'npvi': [30.0],
+                      'pitch_range': [20]}).to_csv(os.path.join(root, 'exp.csv'), index=False)
+        self.settings_override = override_settings(
+            DATASET_FEATURES_PATH=os.path.join(root, 'ds.csv'),
+            EXP_FEATURES_PATH=os.path.join(root, 'exp.csv'),
+            WAV_FILE_PATH=os.path.join(root, 'wav'),
+            MEDIA_ROOT=os.path.join(root, 'media'),
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_bulk_import(self):
+        Music.objects.create(title='002.mid', label='pop')
+        out = StringIO()
+        call_command('initial_db_population', '--bulk', '--batch-size', '1', stdout=out)
+        self.assertIn('Created: 2, skipped: 1, failed: 1', out.getvalue())
+        music = Music.objects.get(title='001.mid', label='pop')
+        self.assertEqual((music.key, music.npvi, music.pitch_range), ('C', 50.0, 40))
+        self.assertEqual(music.file.name, 'pop/pop_001.wav')
+        self.assertEqual(Music.objects.count(), 3)
+
+    def test_bulk_import_is_idempotent(self):
+        call_command('initial_db_population', '--bulk', stdout=StringIO())
+        out = StringIO()
+        call_command('initial_db_population', '--bulk', stdout=out)
+        self.assertIn('Created: 0, skipped: 3, failed: 1', out.getvalue())
+
+
+def write_wav(path, samples, rate, width=2):
+    """
+    Writes float samples of shape (frames, channels) as a PCM WAV file with an extra chunk before the sample data.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    frames, channels = samples.shape
+    if width == 3:
+        values = np.round(samples * (2 ** 23 - 1)).astype('<i4').view(np.uint8).reshape(frames, channels, 4)
+        data = values[..., :3].tobytes()
+    else:
+        data = np.round(samples * (2 ** (8 * width - 1) - 1)).astype(f'<i{width}').tobytes()
+    fmt = struct.pack('<HHIIHH', 1, channels, rate, rate * channels * width, channels * width, 8 * width)
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'LIST' + struct.pack('<I', 3) + b'abc\x00'
+    chunks += b'data' + struct.pack('<I', len(data)) + data
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 4 + len(chunks)) + b'WAVE' + chunks)
+
+
+class RenditionTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, 'track.wav')
+        # a ramp of 10 seconds at 100 Hz, the right channel inverted
+        ramp = np.linspace(-0.5, 0.5, 1000)
+        write_wav(self.path, np.column_stack([ramp, -ramp]), 100)
+
+    def test_read_excerpt(self):
+        samples, rate = read_excerpt(self.path, 2, offset=1)
+        self.assertEqual((samples.shape, rate), ((200, 2), 100))
+        self.assertAlmostEqual(samples[0, 0], -0.4, places=3)
+        np.testing.assert_allclose(samples[:, 1], -samples[:, 0], atol=1e-4)
+
+    def test_read_excerpt_placement(self):
+        centred, _ = read_excerpt(self.path, 2)
+        self.assertAlmostEqual(centred[0, 0], -0.1, places=3)
+        late, _ = read_excerpt(self.path, 2, offset=9)
+        self.assertAlmostEqual(late[-1, 0], 0.5, places=3)
+        whole, _ = read_excerpt(self.path, 60)
+        self.assertEqual(len(whole), 1000)
+
+    def test_read_excerpt_24_bit(self):
+        path = os.path.join(self.temp_dir.name, '24bit.wav')
+        write_wav(path, [[0.5], [-0.25], [0.0]], 100, width=3)
+        samples, _ = read_excerpt(path, 1)
+        np.testing.assert_allclose(samples[:, 0], [0.5, -0.25, 0.0], atol=1e-6)
+
+    def test_read_invalid_file(self):
+        path = os.path.join(self.temp_dir.name, 'invalid.wav')
+        with open(path, 'wb') as f:
+            f.write(b'RIFF')
+        with self.assertRaises(ValueError):
+            read_excerpt(path, 1)
+
+    def test_resample(self):
+        samples, rate = resample(np.ones(1000, dtype=np.float32), 44100, 22050)
+        self.assertEqual((len(samples), rate), (500, 22050))
+        self.assertAlmostEqual(float(samples[100]), 1.0)
+        self.assertEqual(resample(np.ones(10), 8000, 22050)[1], 8000)
+
+    def test_render_clip(self):
+        with wave.open(BytesIO(render_clip(self.path, 3, offset=0, sample_rate=50))) as clip:
+            self.assertEqual((clip.getnchannels(), clip.getsampwidth(), clip.getframerate()), (1, 2, 50))
+            self.assertEqual(clip.getnframes(), 150)
+
+    def test_clip_name(self):
+        self.assertEqual(clip_name('pop/pop_001.wav', 30.0), 'clips/pop/pop_001_center_30s_22050hz.wav')
+        self.assertEqual(clip_name('pop/pop_001.wav', 15, 12.5, 16000), 'clips/pop/pop_001_12.5s_15s_16000hz.wav')
+
+
+class GenerateRenditionsTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        media = os.path.join(self.temp_dir.name, 'media')
+        os.makedirs(os.path.join(media, 'pop'))
+        write_wav(os.path.join(media, 'pop', 'pop_001.wav'), np.zeros((4410, 2)), 4410)
+        self.settings_override = override_settings(MEDIA_ROOT=media, CLIP_DURATION=0.5, CLIP_OFFSET='center',
+                                                   CLIP_SAMPLE_RATE=2205)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.music = Music.objects.create(title='001.mid', label='pop', file='pop/pop_001.wav')
+        Music.objects.create(title='002.mid', label='pop', file='pop/pop_002.wav')
+        Music.objects.create(title='003.mid', label='pop')
+
+    def test_generate(self):
+        out = StringIO()
+        call_command('generate_renditions', '--workers', '1', stdout=out)
+        self.assertIn('Created: 1, skipped: 0, failed: 1', out.getvalue())
+        self.music.refresh_from_db()
+        self.assertEqual(self.music.clip.name, 'clips/pop/pop_001_center_0.5s_2205hz.wav')
+        with wave.open(self.music.clip.open('rb')) as clip:
+            self.assertEqual((clip.getframerate(), clip.getnframes()), (2205, 1102))
+
+    def test_skip_up_to_date_clips(self):
+        call_command('generate_renditions', '--workers', '1', stdout=StringIO())
+        out = StringIO()
+        call_command('generate_renditions', '--workers', '1', stdout=out)
+        self.assertIn('Created: 0, skipped: 1, failed: 1', out.getvalue())
+        out = StringIO()
+        call_command('generate_renditions', '--workers', '1', '--offset', '0.25', stdout=out)
+        self.assertIn('Created: 1, skipped: 0, failed: 1', out.getvalue())
+
+    def test_snapshots_rebuilt(self):
+        # a snapshot served before the clips were rendered, without them
+        AnalysisSnapshot.objects.create(name=FEATURE_ANALYSIS, payload=b'{}', etag='stale')
+        out = StringIO()
+        call_command('generate_renditions', '--workers', '1', stdout=out)
+        # the test tracks have no features, so the snapshot is dropped but cannot be rebuilt
+        self.assertIn('Failed to rebuild analysis snapshots', out.getvalue())
+        self.assertFalse(AnalysisSnapshot.objects.filter(etag='stale').exists())
+        out = StringIO()
+        call_command('generate_renditions', '--workers', '1', stdout=out)
+        self.assertNotIn('analysis snapshots', out.getvalue())
+
+    def test_invalid_offset(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_renditions', '--offset', 'start', stdout=StringIO())
+
+
+class CountingStorage(FileSystemStorage):
+    def __init__(self, expiration=None, **kwargs):
+        super().__init__(**kwargs)
+        self.expiration = expiration
+        self.urls = 0
+
+    def url(self, name):
+        self.urls += 1
+        return super().url(name)
+
+
+class MediaUrlCacheTests(TestCase):
+    def setUp(self):
+        self.storage = CountingStorage(base_url='/media/')
+
+    def test_reuse_url(self):
+        cache = MediaUrlCache(ttl=60)
+        music = Music(file='pop/pop_001.wav')
+        music.file.storage = self.storage
+        self.assertEqual(cache.get_url(music.file), '/media/pop/pop_001.wav')
+        self.assertEqual(cache.get_url(music.file), '/media/pop/pop_001.wav')
+        self.assertEqual(self.storage.urls, 1)
+
+    def test_expired_url(self):
+        cache = MediaUrlCache(ttl=0)
+        music = Music(file='pop/pop_001.wav')
+        music.file.storage = self.storage
+        cache.get_url(music.file)
+        cache.get_url(music.file)
+        self.assertEqual(self.storage.urls, 2)
+
+    def test_ttl_shorter_than_signed_url_expiry(self):
+        cache = MediaUrlCache(ttl=3600)
+        self.assertEqual(cache.get_ttl(CountingStorage(expiration=timedelta(minutes=10))), 300)
+        self.assertEqual(cache.get_ttl(self.storage), 3600)
+
+    def test_max_entries(self):
+        cache = MediaUrlCache(ttl=60, max_entries=2)
+        files = []
+        for i in range(3):
+            music = Music(file=f'pop/{i}.wav')
+            music.file.storage = self.storage
+            files.append(music.file)
+            cache.get_url(music.file)
+        cache.get_url(files[0])
+        self.assertEqual(self.storage.urls, 4)
+
+
+class ServeMediaTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        os.makedirs(os.path.join(self.temp_dir.name, 'pop'))
+        self.content = bytes(range(256)) * 1024
+        with open(os.path.join(self.temp_dir.name, 'pop', 'pop_001.wav'), 'wb') as f:
+            f.write(self.content)
+        self.settings_override = override_settings(MEDIA_ROOT=self.temp_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.factory = RequestFactory()
+
+    def get(self, path='pop/pop_001.wav', **headers):
+        response = serve_media(self.factory.get(f'/media/{path}', headers=headers), path)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_whole_file(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.content)
+        self.assertEqual(response['Content-Type'], 'audio/x-wav')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response['Content-Length']), len(self.content))
+
+    def test_range(self):
+        response, content = self.get(Range='bytes=100-70099')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(content, self.content[100:70100])
+        self.assertEqual(response['Content-Range'], f'bytes 100-70099/{len(self.content)}')
+        self.assertEqual(int(response['Content-Length']), 70000)
+
+    def test_range_not_compressed(self):
+        request = self.factory.get('/media/pop/pop_001.wav', headers={'Range': 'bytes=0-99',
+                                                                      'Accept-Encoding': 'gzip'})
+        response = GZipMiddleware(lambda request: serve_media(request, 'pop/pop_001.wav'))(request)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 206)
+        self.assertNotEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(content), 100)
+        self.assertEqual(int(response['Content-Length']), 100)
+        self.assertEqual(content, self.content[:100])
+
+    def test_open_and_suffix_ranges(self):
+        self.assertEqual(self.get(Range='bytes=262000-')[1], self.content[262000:])
+        self.assertEqual(self.get(Range='bytes=-10')[1], self.content[-10:])
+        self.assertEqual(self.get(Range='bytes=0-999999')[1], self.content)
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(Range=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_ignored_ranges(self):
+        self.assertEqual(self.get(Range='bytes=0-1,5-6')[0].status_code, 200)
+        self.assertEqual(self.get(Range='bytes=0-1', **{'If-Range': 'Thu, 01 Jan 1970 00:00:00 GMT'})[0].status_code,
+                         200)
+
+    def test_not_found(self):
+        for path in ['pop/missing.wav', '../secret.txt', 'pop']:
+            with self.assertRaises(Http404):
+                serve_media(self.factory.get('/media/'), path)
+
+
+class SupplementaryDataTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.music = Music.objects.create(title='001.mid', label='pop', key='C', npvi=50.0)
+
+    @staticmethod
+    def array_string(rows, cols, value):
+        return ';'.join('[' + ' '.join([str(value)] * cols) + ']' for _ in range(rows))
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        pd.DataFrame(rows).to_csv(path, index=False)
+        return path
+
+    def row(self, file_name, genre, value=0.5):
+        return {
+            'file_name': file_name, 'genre': genre, 'duration': 120.0,
+            'pc_dist1': self.array_string(1, 12, value), 'pc_dist2': self.array_string(12, 12, value),
+            'iv_dist1': self.array_string(1, 25, value), 'ivsize_dist1': self.array_string(1, 13, value),
+            'ivdir_dist1': self.array_string(1, 12, value), 'iv_dist2': self.array_string(25, 25, value),
+        }
+
+    def test_parse_array_column(self):
+        series = pd.Series(['[1 2 3 4];[5 6 7 8]', None, '[1 2 3]', '[0.5 0.25 0 1; 1 1 1 1]'])
+        values, invalid = parse_array_column(series, (2, 4))
+        self.assertEqual(values[0], [[1.0, 2.0, 3.0, 4.0], [5.0, 6.0, 7.0, 8.0]])
+        self.assertIsNone(values[1])
+        self.assertEqual(values[3][0], [0.5, 0.25, 0.0, 1.0])
+        self.assertEqual(list(invalid), [2])
+
+    def test_import(self):
+        invalid = dict(self.row('003.mid', 'pop'), pc_dist1='[1 2 3]')
+        ds = self.write_csv('ds.csv', [self.row('001.mid', 'pop'), invalid])
+        exp = self.write_csv('exp.csv', [dict(self.row('002.mid', 'exp1', 0.25), iv_dist2=None)])
+        out = StringIO()
+        with override_settings(DATASET_FEATURES_PATH=ds, EXP_FEATURES_PATH=exp):
+            call_command('supplementary_data', stdout=out)
+        self.assertIn('Created: 1, updated: 1, skipped: 1', out.getvalue())
+        self.music.refresh_from_db()
+        self.assertEqual((self.music.key, self.music.npvi, self.music.duration), ('C', 50.0, 120.0))
+        self.assertEqual(self.music.pc_dist2, [[0.5] * 12] * 12)
+        created = Music.objects.get(title='002.mid', label='exp1')
+        self.assertEqual(created.ivsize_dist1, [0.25] * 13)
+        self.assertIsNone(created.iv_dist2)
+        self.assertFalse(Music.objects.filter(title='003.mid').exists())
+
+
+class FlakyStorage(FileSystemStorage):
+    def __init__(self, failures, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.saves = 0
+
+    def save(self, name, content, max_length=None):
+        self.saves += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('Upload failed')
+        return super().save(name, content, max_length)
+
+
+class UploadPipelineTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.files = []
+        for i in range(4):
+            path = os.path.join(self.temp_dir.name, f'{i}.wav')
+            with open(path, 'wb') as f:
+                f.write(b'x' * (i + 1))
+            self.files.append((f'pop/{i}.wav', path))
+        self.location = os.path.join(self.temp_dir.name, 'storage')
+        self.progress_path = os.path.join(self.temp_dir.name, 'progress.jsonl')
+
+    def pipeline(self, failures=0, **kwargs):
+        storage = FlakyStorage(failures, location=self.location)
+        return UploadPipeline(storage, max_workers=2, backoff=0, **kwargs)
+
+    def test_upload(self):
+        pipeline = self.pipeline()
+        results = pipeline.run(self.files)
+        self.assertEqual(results, {name: (name, None) for name, _ in self.files})
+        self.assertEqual(pipeline.storage.size('pop/3.wav'), 4)
+
+    def test_retry(self):
+        pipeline = self.pipeline(failures=2, retries=2)
+        self.assertEqual(pipeline.run(self.files[:1]), {'pop/0.wav': ('pop/0.wav', None)})
+        self.assertEqual(pipeline.storage.saves, 3)
+
+    def test_retries_exhausted(self):
+        pipeline = self.pipeline(failures=3, retries=2)
+        self.assertEqual(pipeline.run(self.files[:1]), {'pop/0.wav': (None, 'Upload failed')})
+
+    def test_skip_existing(self):
+        self.pipeline().run(self.files)
+        with open(self.files[0][1], 'wb') as f:
+            f.write(b'changed')
+        pipeline = self.pipeline()
+        results = pipeline.run(self.files)
+        self.assertEqual(pipeline.storage.saves, 1)
+        self.assertEqual(results['pop/0.wav'], ('pop/0.wav', None))
+        self.assertEqual(pipeline.storage.size('pop/0.wav'), 7)
+
+    def test_resume_from_progress(self):
+        self.pipeline(progress_path=self.progress_path).run(self.files[:2])
+        pipeline = self.pipeline(progress_path=self.progress_path)
+        self.assertEqual(set(pipeline.progress), {'pop/0.wav', 'pop/1.wav'})
+        pipeline.run(self.files)
+        self.assertEqual(pipeline.storage.saves, 2)
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+
+class UploadPipeline:
+    """
+    Uploads local files to a storage backend from a thread pool, so imports are not bound by the latency of one
+    upload at a time.
+    Files already present in the storage with the same size are not uploaded again. Completed uploads can be
+    recorded in a progress file (one JSON object per line), which lets an interrupted import resume without
+    querying the storage for files it has already uploaded.
+    Args:
+        storage: Django storage backend. Defaults to default_storage.
+        max_workers (int): Number of concurrent uploads
+        retries (int): Number of retries of a failed upload
+        backoff (float): Delay in seconds before the first retry, doubled for every further retry
+        progress_path (str, optional): Path of the progress file
+    """
+
+    def __init__(self, storage=None, max_workers=8, retries=3, backoff=1.0, progress_path=None):
+        self.storage = storage or default_storage
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.progress_path = progress_path
+        self._progress_lock = threading.Lock()
+        self.progress = self._load_progress()
+
+    def _load_progress(self):
+        progress = {}
+        if self.progress_path and os.path.exists(self.progress_path):
+            with open(self.progress_path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        progress[entry['name']] = entry
+        return progress
+
+    def _record_progress(self, name, stored_name, size):
+        entry = {'name': name, 'stored_name': stored_name, 'size': size}
+        with self._progress_lock:
+            self.progress[name] = entry
+            if self.progress_path:
+                with open(self.progress_path, 'a') as f:
+                    f.write(json.dumps(entry) + '\n')
+
+    def is_uploaded(self, name, size):
+        """
+        Returns:
+            str: Storage name of the file if it is already uploaded with the given size, otherwise None
+        """
+        entry = self.progress.get(name)
+        if entry and entry['size'] == size:
+            return entry['stored_name']
+        if self.storage.exists(name) and self.storage.size(name) == size:
+            return name
+        return None
+
+    def upload(self, name, local_path):
+        """
+        Uploads one file, unless it is already uploaded, retrying with exponential backoff on errors.
+        Args:
+            name (str): Storage name of the file
+            local_path (str): Path of the local file
+        Returns:
+            str: Storage name of the uploaded file
+        """
+        size = os.path.getsize(local_path)
+        stored_name = self.is_uploaded(name, size)
+        if stored_name:
+            return stored_name
+        for attempt in range(self.retries + 1):
+            try:
+                if self.storage.exists(name):
+                    # a partial or outdated upload, replace it instead of saving under an alternative name
+                    self.storage.delete(name)
+                with open(local_path, 'rb') as file:
+                    stored_name = self.storage.save(name, File(file))
+                break
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+        self._record_progress(name, stored_name, size)
+        return stored_name
+
+    def run(self, files):
+        """
+        Uploads files concurrently.
+        Args:
+            files (iterable): (storage name, local path) pairs
+        Returns:
+            dict: Maps each storage name to a tuple of (stored name, error message), one of which is None
+        """
+        files = list(files)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {name: executor.submit(self.upload, name, local_path) for name, local_path in files}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(), None
+            except Exception as e:
+                results[name] = None, str(e)
+        return results
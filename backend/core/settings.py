@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -84,6 +86,8 @@ else:
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
     MEDIA_URL = '/media/'
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Seconds the URLs of stored files are reused, capped at half the expiry of signed URLs (GS_EXPIRATION)
+MEDIA_URL_TTL = int(os.environ.get('MEDIA_URL_TTL', 3600))
 
 # Static Files Configuration
 STATIC_URL = 'static/'
@@ -133,6 +137,28 @@ API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000/api/')
 DATASET_FEATURES_PATH = os.environ.get('DATASET_FEATURES_PATH', None)
 EXP_FEATURES_PATH = os.environ.get('EXP_FEATURES_PATH', None)
 WAV_FILE_PATH = os.environ.get('WAV_FILE_PATH', None)
+# 'database' aggregates feature distributions in PostgreSQL, 'python' aggregates them with NumPy
+ANALYSIS_AGGREGATION = os.environ.get('ANALYSIS_AGGREGATION', 'database')
+# <x>:<y> feature pairs with precomputed per-genre regression lines in the feature analysis data
+ANALYSIS_TRENDLINES = [
+    tuple(pair.split(':', 1))
+    for pair in os.environ.get('ANALYSIS_TRENDLINES', 'note_density:npvi,duration:npvi').split(',') if pair
+]
+# 'label' gives every label equal odds in the Turing test, 'origin' gives human and AI tracks equal odds
+RANDOM_TRACK_BALANCE = os.environ.get('RANDOM_TRACK_BALANCE', 'label')
+RANDOM_TRACK_INDEX_TTL = int(os.environ.get('RANDOM_TRACK_INDEX_TTL', 300))
+RANDOM_BATCH_MAX_SIZE = int(os.environ.get('RANDOM_BATCH_MAX_SIZE', 20))
+RATING_BATCH_MAX_SIZE = int(os.environ.get('RATING_BATCH_MAX_SIZE', 100))
+# Excerpts played in the Turing test instead of the full-length WAV files, see the generate_renditions command:
+# length and start in seconds ('center' centres the excerpt in the track) and sample rate of the mono rendition
+CLIP_DURATION = float(os.environ.get('CLIP_DURATION', 30))
+CLIP_OFFSET = os.environ.get('CLIP_OFFSET', 'center')
+CLIP_SAMPLE_RATE = int(os.environ.get('CLIP_SAMPLE_RATE', 22050))
+# Entries per page of the music and rating listings, and the most a client may request with ?page_size=
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+# Seconds clients may reuse music and feature analysis responses before revalidating them with their ETag
+API_CACHE_MAX_AGE = int(os.environ.get('API_CACHE_MAX_AGE', 60))
 
 # Internationalization
 LANGUAGE_CODE = 'en-us'
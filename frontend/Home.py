@@ -1,10 +1,11 @@
 import streamlit as st
 
-from utils import load_css
+from utils import flush_session_ratings, load_css
 
 
 st.set_page_config(layout='wide', initial_sidebar_state='collapsed', page_icon=':notes:')
 load_css()
+flush_session_ratings()
 
 st.title('Tune Judge')
 
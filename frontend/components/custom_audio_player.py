@@ -1,39 +1,66 @@
+import functools
+import html
 import streamlit.components.v1 as components
 
+from string import Template
 
-def custom_audio_player(audio_url=None):
-    with open('static/style.css', 'r') as f:
-        css = f'<style>{f.read()}</style>'
-    custom_html = f"""
+
+PLAYER_TEMPLATE = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <link href="https://fonts.googleapis.com/css2?family=Josefin+Sans&display=swap" rel="stylesheet">
-        {css}
+        <style>$css</style>
     </head>
     <body>
         <div class="audio-container">
-            <audio id="audioPlayer" src="{audio_url}"></audio>
+            <audio id="audioPlayer" src="$audio_url" preload="auto"></audio>
             <button id="playPauseBtn" class="play-button">Play</button>
         </div>
+        $preload
 
         <script>
             var audio = document.getElementById('audioPlayer');
             var playPauseBtn = document.getElementById('playPauseBtn');
 
-            playPauseBtn.addEventListener('click', function() {{
-                if (audio.paused) {{
+            playPauseBtn.addEventListener('click', function() {
+                if (audio.paused) {
                     audio.play();
                     playPauseBtn.textContent = 'Pause';
-                }} else {{
+                } else {
                     audio.pause();
                     playPauseBtn.textContent = 'Play';
-                }}
-            }});
+                }
+            });
         </script>
     </body>
     </html>
     """
+# hidden element buffering the next track, so the browser cache already holds it when the next track is played
+PRELOAD_TEMPLATE = '<audio src="$next_url" preload="auto" muted hidden></audio>'
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(css_path='static/style.css'):
+    """
+    Reads the stylesheet once per process and inlines it into the player template.
+    Returns:
+        Template: Player document with $audio_url and $preload placeholders
+    """
+    with open(css_path, 'r') as f:
+        css = f.read().replace('$', '$$')
+    return Template(Template(PLAYER_TEMPLATE).safe_substitute(css=css))
+
+
+def custom_audio_player(audio_url=None, next_url=None):
+    """
+    Renders the play button of the Turing test.
+    Args:
+        audio_url (str): URL of the track to play
+        next_url (str, optional): URL of the track played next, which is preloaded in the background
+    """
+    preload = Template(PRELOAD_TEMPLATE).substitute(next_url=html.escape(next_url)) if next_url else ''
+    custom_html = load_template().substitute(audio_url=html.escape(audio_url or ''), preload=preload)
     components.html(custom_html, height=100)
@@ -2,3 +2,23 @@ import os
 
 
 API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000/api/')
+TRACK_BATCH_SIZE = int(os.environ.get('TRACK_BATCH_SIZE', 5))
+RATING_BUFFER_SIZE = int(os.environ.get('RATING_BUFFER_SIZE', 5))
+# Ratings buffered at most while the API is unreachable; must not exceed the API's RATING_BATCH_MAX_SIZE
+RATING_BATCH_MAX_SIZE = int(os.environ.get('RATING_BATCH_MAX_SIZE', 100))
+# (connect, read) timeouts of API requests, in seconds
+REQUEST_TIMEOUT = (
+    float(os.environ.get('REQUEST_CONNECT_TIMEOUT', 3.05)),
+    float(os.environ.get('REQUEST_READ_TIMEOUT', 30)),
+)
+REQUEST_POOL_SIZE = int(os.environ.get('REQUEST_POOL_SIZE', 10))
+# Seconds before the cached feature analysis data is revalidated with the API
+ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 300))
+# Scatter plots with more points than this are rendered with WebGL instead of SVG
+WEBGL_POINT_THRESHOLD = int(os.environ.get('WEBGL_POINT_THRESHOLD', 1000))
+# Points drawn per scatter plot at most; larger data is downsampled for display
+MAX_DISPLAY_POINTS = int(os.environ.get('MAX_DISPLAY_POINTS', 5000))
+# Figures kept per process by the figure cache of the Data Analysis page
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 128))
+# Seconds a widget has to stay unchanged before the filtered data it selects is fetched
+WIDGET_DEBOUNCE = float(os.environ.get('WIDGET_DEBOUNCE', 0.3))
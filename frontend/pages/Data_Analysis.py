@@ -1,25 +1,100 @@
+import functools
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 
 from plotly.subplots import make_subplots
-from utils import (no_header, load_data, plot_histogram, plot_bar, plot_transition_heatmap, classify_key_type, plot_pie,
-                   change_container_width)
+from utils import (no_header, load_section, load_histograms, fetch_concurrently, load_filtered_rows, debounce,
+                   cached_figure, plot_histogram, plot_category_histogram, histogram_traces, add_trendlines,
+                   scatter_figure, scatter_3d_figure, violin_figure, plot_bar, plot_transition_heatmap,
+                   classify_key_type, plot_pie, change_container_width, flush_session_ratings)
 
 
 st.set_page_config(layout='wide', initial_sidebar_state='collapsed', page_icon=':bar_chart:')
 change_container_width(75)
 no_header()
+flush_session_ratings()
+
+# every tab's data is fetched concurrently, and each tab only waits for its own data, so the first tab is drawn as
+# soon as its data has arrived
+sections = fetch_concurrently({
+    'histograms': load_histograms,
+    **{section: functools.partial(load_section, section)
+       for section in ['keys', 'rhythm', 'pitch', 'intervals', 'complexity']},
+})
+color_map = {'pop': '#1f77b4', 'classical': '#ff7f0e'}
 
-df_dict, error = load_data()
-if error:
-    st.error(error)
-    st.stop()
 
-df = df_dict['origin_df']
-df_pop = df[df['genre'] == 'pop']
-df_classical = df[df['genre'] == 'classical']
-color_map = {'pop': '#1f77b4', 'classical': '#ff7f0e'}
+def section_data(name):
+    data, error = sections[name].result()
+    if error:
+        st.error(error)
+        st.stop()
+    return data
+
+
+# figures are cached per process on their inputs, so reruns only build the figures whose inputs changed
+@cached_figure
+def npvi_violin_figure(df, color_map):
+    fig = violin_figure(df, y='npvi', x='genre', color='genre', box=True, points='all',
+                        title='nPVI Distribution by Genre', color_discrete_map=color_map)
+    fig.update_traces(marker=dict(size=3))
+    fig.update_layout(legend=dict(x=0.87, y=0.95))
+    return fig
+
+
+@cached_figure
+def note_density_npvi_figure(df, trendlines, color_map, density):
+    fig = scatter_figure(df, x='note_density', y='npvi', color='genre', density=density, opacity=0.75,
+                         title='nPVI vs Note Density by Genre',
+                         labels={'npvi': 'nPVI', 'note_density': 'note density'},
+                         color_discrete_map=color_map)
+    fig.update_traces(marker=dict(size=3), selector=dict(mode='markers'))
+    add_trendlines(fig, trendlines, 'note_density', 'npvi', color_map)
+    fig.update_layout(legend=dict(x=0.75, y=0.95))
+    return fig
+
+
+@cached_figure
+def duration_npvi_figure(df, trendlines, color_map, density):
+    fig = scatter_figure(df, x='duration', y='npvi', color='genre', density=density, opacity=0.4,
+                         title='nPVI vs Duration by Genre',
+                         labels={'duration': 'duration', 'npvi': 'npvi'},
+                         color_discrete_map=color_map)
+    add_trendlines(fig, trendlines, 'duration', 'npvi', color_map)
+    fig.update_layout(legend=dict(x=0.79, y=0.95))
+    return fig
+
+
+@cached_figure
+def pitch_range_duration_figure(filtered_df, color_map):
+    return scatter_figure(filtered_df, x='pitch_range', y='duration', size='note_density', color='genre',
+                          sample_method='grid', title='Pitch Range vs Duration by Genre with Note Density',
+                          labels={'pitch_range': 'pitch range', 'duration': 'duration (s)',
+                                  'note_density': 'note density'},
+                          color_discrete_map=color_map)
+
+
+@cached_figure
+def complexity_histograms_figure(histograms, color_map):
+    features = ['complexity', 'originality', 'gradus']
+    fig = make_subplots(rows=1, cols=3)
+    for i, feature in enumerate(features):
+        for trace in histogram_traces(histograms[feature], color_map, showlegend=i == 0):
+            trace.name = trace.name.capitalize()
+            fig.add_trace(trace, row=1, col=i + 1)
+        fig.update_xaxes(title_text=feature, row=1, col=i + 1)
+    fig.update_yaxes(title_text="probability", row=1, col=1)
+    fig.update_layout(title_text='Histograms of Complexity, Originality, and Gradus(Melodiousness) by Genre',
+                      barmode='overlay', bargap=0, showlegend=True, legend=dict(x=1, y=1),
+                      height=500, width=1000)
+    return fig
+
+
+@cached_figure
+def complexity_scatter_figure(df, color_map):
+    return scatter_3d_figure(df[['complexity', 'originality', 'gradus', 'genre']].dropna(), x='complexity',
+                             y='originality', z='gradus', color='genre', color_discrete_map=color_map, size_max=1,
+                             opacity=0.75)
+
 
 st.title('Musical Characteristics Analysis: Classical vs Pop Music')
 st.write("""
@@ -47,23 +122,22 @@ with tab1:
     - How do key preferences differ between classical and pop music? 
     - What might these differences tell us about these two genre of music?
     """)
+    histograms = section_data('histograms')
+    keys_df = section_data('keys')['origin_df']
     # key distribution
     col1, col2 = st.columns([1, 1])
     with col1:
-        plot_histogram(df_pop, 'key', 'Histogram of Keys in Pop Dataset',
-                       category_orders={'key': df_pop['key'].value_counts().index},
-                       color_discrete_sequence=[color_map['pop']])
+        plot_category_histogram(histograms, 'key', 'pop', 'Histogram of Keys in Pop Dataset', color=color_map['pop'])
     with col2:
-        plot_histogram(df_classical, 'key', 'Histogram of Keys in Classical Dataset',
-                       category_orders={'key': df_classical['key'].value_counts().index},
-                       color_discrete_sequence=[color_map['classical']])
+        plot_category_histogram(histograms, 'key', 'classical', 'Histogram of Keys in Classical Dataset',
+                                color=color_map['classical'])
     # key type pie chart
     col1, col2 = st.columns([1, 1])
     with col1:
-        pop_key_type = classify_key_type(df_pop)
+        pop_key_type = classify_key_type(keys_df[keys_df['genre'] == 'pop'])
         plot_pie(pop_key_type, 'key_type', 'count', title='Pop key types')
     with col2:
-        classical_key_type = classify_key_type(df_classical)
+        classical_key_type = classify_key_type(keys_df[keys_df['genre'] == 'classical'])
         plot_pie(classical_key_type, 'key_type', 'count', title='Classical key types')
 
     st.write("""
@@ -116,11 +190,11 @@ with tab2:
     4. Is there a correlation between note density and rhythmic variability in these two genres?
     5. Are longer songs with more rhythmic variability?
     """)
+    rhythm = section_data('rhythm')
+    rhythm_df = rhythm['origin_df']
 
     # song duration
-    plot_histogram(df, 'duration', 'Histogram of Duration by Genre', color='genre',
-                   histnorm='probability', barmode='overlay',
-                   color_discrete_map=color_map, opacity=0.75, marginal='box')
+    plot_histogram(histograms, 'duration', 'Histogram of Duration by Genre', color_map=color_map)
     st.write('##### Findings')
     col1, col2 = st.columns([1, 1])
     with col1:
@@ -144,16 +218,11 @@ with tab2:
     col1, col2 = st.columns([1, 1])
     with col1:
         # histogram
-        plot_histogram(df, 'npvi', 'Histogram of nPVI(normalised Pairwise Variability Index)',
-                       color='genre', histnorm='probability', barmode='overlay',
-                       color_discrete_map=color_map, opacity=0.75, marginal='box')
+        plot_histogram(histograms, 'npvi', 'Histogram of nPVI(normalised Pairwise Variability Index)',
+                       color_map=color_map)
     with col2:
         # violin plot
-        fig_npvi_violin = px.violin(df, y='npvi', x='genre', color='genre', box=True, points='all',
-                                    title='nPVI Distribution by Genre', color_discrete_map=color_map)
-        fig_npvi_violin.update_traces(marker=dict(size=3))
-        fig_npvi_violin.update_layout(legend=dict(x=0.87, y=0.95))
-        st.plotly_chart(fig_npvi_violin)
+        st.plotly_chart(npvi_violin_figure(rhythm_df, color_map))
     with st.expander('📝 Note on Rhythmic Variability (nPVI)'):
         st.write("""
         The normalized Pairwise Variability Index (nPVI) measures the degree of durational contrast between successive 
@@ -185,56 +254,47 @@ with tab2:
     histogram and violin plot
     """)
 
-    col1, col2 = st.columns([6, 4])
-    with col1:
-        # note density
-        plot_histogram(df, 'note_density', 'Note Count per Beat by Genre', color='genre',
-                       histnorm='probability', barmode='overlay',
-                       color_discrete_map=color_map, opacity=0.75,
-                       xaxis_title='note density (notes per beat)', marginal='box')
-    with col2:
-        fig_nd_npvi = px.scatter(df, x='note_density', y='npvi', color='genre', opacity=0.75,
-                                 title='nPVI vs Note Density by Genre',
-                                 labels={'npvi': 'nPVI', 'note_density': 'note density'},
-                                 trendline='ols', trendline_scope='trace',
-                                 color_discrete_map=color_map)
-        fig_nd_npvi.update_traces(marker=dict(size=3))
-        fig_nd_npvi.update_layout(legend=dict(x=0.75, y=0.95))
-        st.plotly_chart(fig_nd_npvi)
-    st.write("""
-    ##### Findings
-    - Notes per beat typically fall between 2-10, with most concentrated between 4-7
-    - Both genres show a negative correlation between note density and nPVI，as note density increases, rhythmic 
-    variability (nPVI) tends to decrease, while classical shows a steeper negative slope, suggesting stronger 
-    correlation.
-    - Higher note densities generally correspond to more regular rhythmic patterns (lower nPVI), this might reflect 
-    practical limitations in performing complex rhythms at high note densities
-    - Classical music shows greater variability in both measures, while pop music tends to cluster more tightly around 
-    certain values
-    """)
-
-    col1, col2 = st.columns([6, 4])
-    with col1:
-        fig_dur_npvi = px.scatter(df, x='duration', y='npvi', color='genre', opacity=0.4,
-                                  title='nPVI vs Duration by Genre',
-                                  labels={'duration': 'duration', 'npvi': 'npvi'},
-                                  trendline='ols', trendline_scope='trace',
-                                  color_discrete_map=color_map)
-        fig_dur_npvi.update_layout(legend=dict(x=0.79, y=0.95))
-        st.plotly_chart(fig_dur_npvi)
-    with col2:
-        st.write('')
-        st.write('')
-        st.write('')
-        st.write('')
+    # the toggle only reruns the note density and duration plots
+    @st.fragment
+    def note_density_and_duration_plots():
+        show_density = st.toggle('Show the scatter plots as point densities')
+        col1, col2 = st.columns([6, 4])
+        with col1:
+            # note density
+            plot_histogram(histograms, 'note_density', 'Note Count per Beat by Genre', color_map=color_map,
+                           xaxis_title='note density (notes per beat)')
+        with col2:
+            st.plotly_chart(note_density_npvi_figure(rhythm_df, rhythm['trendlines'], color_map, show_density))
         st.write("""
         ##### Findings
-        - Density of points is highest in the 200-400 second range
-        - Length of a classical piece doesn't strongly has positive correlation to its rhythmic complexity, while pop 
-        music shows increasing trend when it get longer.
-        - Classical shows greater range in both dimensions
+        - Notes per beat typically fall between 2-10, with most concentrated between 4-7
+        - Both genres show a negative correlation between note density and nPVI，as note density increases, rhythmic 
+        variability (nPVI) tends to decrease, while classical shows a steeper negative slope, suggesting stronger 
+        correlation.
+        - Higher note densities generally correspond to more regular rhythmic patterns (lower nPVI), this might reflect 
+        practical limitations in performing complex rhythms at high note densities
+        - Classical music shows greater variability in both measures, while pop music tends to cluster more tightly around 
+        certain values
         """)
 
+        col1, col2 = st.columns([6, 4])
+        with col1:
+            st.plotly_chart(duration_npvi_figure(rhythm_df, rhythm['trendlines'], color_map, show_density))
+        with col2:
+            st.write('')
+            st.write('')
+            st.write('')
+            st.write('')
+            st.write("""
+            ##### Findings
+            - Density of points is highest in the 200-400 second range
+            - Length of a classical piece doesn't strongly has positive correlation to its rhythmic complexity, while pop 
+            music shows increasing trend when it get longer.
+            - Classical shows greater range in both dimensions
+            """)
+
+    note_density_and_duration_plots()
+
 
 with tab3:
     st.header('Pitch Characteristics and Range')
@@ -245,12 +305,12 @@ with tab3:
     3. How do the different patterns of pitch transitions between Classical and Pop music reflect changes in 
     compositional approaches?
     """)
+    pitch = section_data('pitch')
     # pitch range
     col1, col2 = st.columns([6, 4])
     with col1:
-        plot_histogram(df, 'pitch_range', 'Pitch range in semitones by genre', color='genre', opacity=0.75,
-                       histnorm='probability', barmode='overlay', color_discrete_map=color_map,
-                       xaxis_title='pitch range in semitones', marginal='box')
+        plot_histogram(histograms, 'pitch_range', 'Pitch range in semitones by genre', color_map=color_map,
+                       xaxis_title='pitch range in semitones')
     with col2:
         st.write('')
         st.write('')
@@ -266,24 +326,31 @@ with tab3:
             - Modern production conventions  
         """)
 
-    st.write('Do longer songs have wider pitch range in classical vs. pop?')
-    min_density, max_density = st.slider(
-        'Select a range of note density (notes per beat)',
-        min_value=0.0,
-        max_value=15.0,
-        value=(0.0, 15.0),
-        step=1.0
-    )
-    filtered_df = df[(df['note_density'] >= min_density) & (df['note_density'] <= max_density)]
-    fig_pr_dur_nd = px.scatter(filtered_df, x='pitch_range', y='duration', size='note_density', color='genre',
-                               title='Pitch Range vs Duration by Genre with Note Density',
-                               labels={'pitch_range': 'pitch range', 'duration': 'duration (s)',
-                                       'note_density': 'note density'},
-                               color_discrete_map=color_map)
-    st.plotly_chart(fig_pr_dur_nd)
+    # the slider only reruns this plot, which draws the tracks within the selected range fetched from the API
+    @st.fragment
+    def pitch_range_duration_plot():
+        st.write('Do longer songs have wider pitch range in classical vs. pop?')
+        min_density, max_density = st.slider(
+            'Select a range of note density (notes per beat)',
+            min_value=0.0,
+            max_value=15.0,
+            value=(0.0, 15.0),
+            step=1.0
+        )
+        fields = ('genre', 'pitch_range', 'duration', 'note_density')
+        ranges = (('note_density', min_density, max_density),)
+        if not load_filtered_rows.cached(fields, ranges):
+            debounce()
+        filtered_df, error = load_filtered_rows(fields, ranges)
+        if error:
+            st.error(error)
+        else:
+            st.plotly_chart(pitch_range_duration_figure(filtered_df, color_map))
+
+    pitch_range_duration_plot()
 
     # pitch class
-    mean_pcdist1 = df_dict['pitch_class_dist']
+    mean_pcdist1 = pitch['pitch_class_dist']
     col1, col2 = st.columns([1, 1])
     with col1:
         plot_bar(mean_pcdist1, x_axis='pitch_classes', y_axis='pop',
@@ -303,7 +370,7 @@ with tab3:
     """)
 
     # pitch class transition
-    mean_pcdist2 = df_dict['pitch_transition_dist']
+    mean_pcdist2 = pitch['pitch_transition_dist']
     col1, col2 = st.columns([1, 1])
     with col1:
         plot_transition_heatmap(mean_pcdist2['pop'], 'Blues',
@@ -330,8 +397,9 @@ with tab4:
     2. How do interval sizes and directions differ between genres?
     3. What do transition patterns reveal about melodic construction?
     """)
+    intervals_data = section_data('intervals')
     # intervals
-    mean_ivdist1 = df_dict['interval_dist']
+    mean_ivdist1 = intervals_data['interval_dist']
 
     intervals = mean_ivdist1['intervals'].tolist()
     tick_labels = [label if i % 3 == 0 else '' for i, label in enumerate(intervals)]
@@ -356,14 +424,14 @@ with tab4:
     col1, col2 = st.columns([1, 1])
     with col1:
         # interval size
-        mean_ivsizedist1 = df_dict['interval_size_dist']
+        mean_ivsizedist1 = intervals_data['interval_size_dist']
         melted_df = mean_ivsizedist1.melt(id_vars='intervals', var_name='genre', value_name='probability')
 
         plot_bar(melted_df, 'intervals', 'probability', color='genre', color_map=color_map,
                  title='Mean Interval Size Distribution Probability by Genre', sort=False)
     with col2:
         # interval direction
-        mean_ivdirdist1 = df_dict['interval_dir_dist']
+        mean_ivdirdist1 = intervals_data['interval_dir_dist']
         melted_df = mean_ivdirdist1.melt(id_vars='intervals', var_name='genre', value_name='probability')
 
         plot_bar(melted_df, 'intervals', 'probability', color='genre', color_map=color_map,
@@ -380,7 +448,7 @@ with tab4:
     """)
 
     # interval transition
-    mean_ivdist2 = df_dict['interval_transition_dist']
+    mean_ivdist2 = intervals_data['interval_transition_dist']
     col1, col2 = st.columns([1, 1])
     with col1:
         plot_transition_heatmap(mean_ivdist2['pop'], 'Blues',
@@ -414,29 +482,9 @@ with tab5:
     1. How do objective measures of complexity differ between genres?
     2. What is the relationship between complexity, originality, and melodiousness?
     """)
+    complexity_df = section_data('complexity')['origin_df']
     # complexity & originality & gradus
-    features = ['complexity', 'originality', 'gradus']
-
-    fig = make_subplots(rows=1, cols=3)
-    for i, feature in enumerate(features):
-        pop_data = df_pop[feature].dropna()
-        classical_data = df_classical[feature].dropna()
-
-        fig.add_trace(
-            go.Histogram(x=pop_data, name='Pop', histnorm='probability', marker_color=color_map['pop'], opacity=0.75,
-                         showlegend=True if i == 0 else False), row=1, col=i + 1
-        )
-        fig.add_trace(
-            go.Histogram(x=classical_data, name='Classical', histnorm='probability',
-                         marker_color=color_map['classical'],
-                         opacity=0.75, showlegend=True if i == 0 else False), row=1, col=i + 1
-        )
-        fig.update_xaxes(title_text=feature, row=1, col=i + 1)
-    fig.update_yaxes(title_text="probability", row=1, col=1)
-    fig.update_layout(title_text='Histograms of Complexity, Originality, and Gradus(Melodiousness) by Genre',
-                      barmode='overlay', showlegend=True, legend=dict(x=1, y=1),
-                      height=500, width=1000)
-    st.plotly_chart(fig)
+    st.plotly_chart(complexity_histograms_figure(histograms, color_map))
     with st.expander('📝 Note on complexity, originality and gradus'):
         st.write("""
         - **Complexity**
@@ -482,10 +530,7 @@ with tab5:
         foundations of systematic musicology. Berlin: Springer.
         """)
 
-    fig_cp_og_gd = px.scatter_3d(df[['complexity', 'originality', 'gradus', 'genre']].dropna(), x='complexity',
-                                 y='originality', z='gradus', color='genre', color_discrete_map=color_map, size_max=1,
-                                 opacity=0.75)
-    st.plotly_chart(fig_cp_og_gd)
+    st.plotly_chart(complexity_scatter_figure(complexity_df, color_map))
     st.write("""
     ##### Findings
     - Complexity:
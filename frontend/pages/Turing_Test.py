@@ -1,22 +1,31 @@
 import streamlit as st
-import time
 
 from components.custom_audio_player import custom_audio_player
-from utils import fetch_random_music, submit_rating, load_css
+from utils import RatingBuffer, TrackQueue, submit_rating, load_css
 
 
 st.set_page_config(initial_sidebar_state='collapsed', page_icon=':musical_note:')
 load_css()
 
+if 'track_queue' not in st.session_state:
+    st.session_state.track_queue = TrackQueue()
+if 'rating_buffer' not in st.session_state:
+    st.session_state.rating_buffer = RatingBuffer()
+
 if 'random_track' not in st.session_state:
-    track_data, error = fetch_random_music()
+    track_data, error = st.session_state.track_queue.pop()
     if error:
         st.error(error)
         st.stop()
     else:
         st.session_state.random_track = track_data
 
-custom_audio_player(st.session_state.random_track['file'])
+# confirms the rating of the previous track, submitted before the rerun that loaded this one
+if st.session_state.pop('rating_submitted', False):
+    st.success('Rating submitted successfully! Here is the next track.')
+
+next_track = st.session_state.track_queue.peek()
+custom_audio_player(st.session_state.random_track['file'], next_url=next_track['file'] if next_track else None)
 
 st.markdown('<p style="font-size: 20px;">Do you think this track was generated by AI?</p>', unsafe_allow_html=True)
 rating = st.select_slider('Use the slider to rate from 1 (Definitely AI) to 5 (Definitely Human)',
@@ -33,22 +42,21 @@ rating_labels = {
 st.write(f'Your rating: {rating} - {rating_labels[rating]}')
 
 if st.button('Submit Rating', type='primary'):
-    result, error = submit_rating(st.session_state.random_track['id'], rating)
+    result, error = submit_rating(st.session_state.random_track['id'], rating, buffer=st.session_state.rating_buffer)
     if error:
         st.error(error)
     else:
-        st.success('Rating submitted successfully!')
-        st.info('Up next: Moving to the next track...')
-        time.sleep(1)
-        track_data, error = fetch_random_music()
+        track_data, error = st.session_state.track_queue.pop()
         if error:
+            st.success('Rating submitted successfully!')
             st.error(error)
         else:
             st.session_state.random_track = track_data
+            st.session_state.rating_submitted = True
             st.rerun()
 
 if st.button('Skip to Next Song'):
-    track_data, error = fetch_random_music()
+    track_data, error = st.session_state.track_queue.pop()
     if error:
         st.error(error)
     else:
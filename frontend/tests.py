@@ -1,10 +1,20 @@
+import io
+import threading
+import time
+import numpy as np
 import pandas as pd
+import plotly.graph_objects as go
 import pytest
 import requests
+import utils
 
+from components.custom_audio_player import custom_audio_player, load_template
 from streamlit.testing.v1 import AppTest
 from unittest.mock import patch, MagicMock
-from utils import fetch_random_music, submit_rating, load_data
+from utils import (FetchCache, RatingBuffer, TrackQueue, add_trendlines, api_get_validated, box_traces,
+                   compact_frame, downsample, fetch_concurrently, fetch_random_batch, fetch_random_music,
+                   histogram_figure, histogram_traces, load_filtered_rows, load_section, sample_positions,
+                   scatter_figure, submit_rating, submit_rating_batch, load_data, violin_figure, post_rating_batch)
 
 
 @pytest.fixture
@@ -47,9 +57,9 @@ def test_home_page():
 
 
 # test Turing_Test page
-@patch('utils.fetch_random_music')
-def test_turing_test_page(mock_fetch_random_music, mock_random_track):
-    mock_fetch_random_music.return_value = mock_random_track, None
+@patch('utils.fetch_random_batch')
+def test_turing_test_page(mock_fetch_random_batch, mock_random_track):
+    mock_fetch_random_batch.return_value = [mock_random_track], None
 
     at = AppTest.from_file('pages/Turing_Test.py').run()
     assert not at.exception
@@ -60,36 +70,38 @@ def test_turing_test_page(mock_fetch_random_music, mock_random_track):
     assert 'Skip to Next Song' in at.button[1].label
 
 
-@patch('utils.fetch_random_music')
-def test_turing_test_page_error(mock_fetch_random_music):
-    mock_fetch_random_music.return_value = None, 'Test error'
+@patch('utils.fetch_random_batch')
+def test_turing_test_page_error(mock_fetch_random_batch):
+    mock_fetch_random_batch.return_value = None, 'Test error'
 
     at = AppTest.from_file('pages/Turing_Test.py').run()
     assert any('Test error' in element.value for element in at.error)
 
 
-@patch('utils.fetch_random_music')
+@patch('utils.fetch_random_batch')
 @patch('utils.submit_rating')
-def test_rating_submission(mock_submit_rating, mock_fetch_random_music, mock_random_track, mock_rating_response,
-                           monkeypatch):
-    monkeypatch.setattr('streamlit.rerun', lambda: None)
-    mock_fetch_random_music.return_value = mock_random_track, None
+def test_rating_submission(mock_submit_rating, mock_fetch_random_batch, mock_random_track, mock_rating_response):
+    next_track = dict(mock_random_track, id=2)
+    mock_fetch_random_batch.return_value = [mock_random_track, next_track], None
     mock_submit_rating.return_value = mock_rating_response, None
 
     at = AppTest.from_file('pages/Turing_Test.py').run()
     at.select_slider[0].set_value(4).run()
     assert at.select_slider[0].value == 4
     assert 'Your rating: 4 - Probably Human' in at.markdown[2].value
+    assert not at.success
 
     at.button[0].click().run()
+    assert at.session_state['random_track'] == next_track
     assert 'Rating submitted successfully!' in at.success[0].value
-    assert 'Up next: Moving to the next track...' in at.info[0].value
+    at.run()
+    assert not at.success
 
 
-@patch('utils.fetch_random_music')
+@patch('utils.fetch_random_batch')
 @patch('utils.submit_rating')
-def test_rating_submission_error(mock_submit_rating, mock_fetch_random_music, mock_random_track):
-    mock_fetch_random_music.return_value = mock_random_track, None
+def test_rating_submission_error(mock_submit_rating, mock_fetch_random_batch, mock_random_track):
+    mock_fetch_random_batch.return_value = [mock_random_track], None
     mock_submit_rating.return_value = None, 'Invalid request'
 
     at = AppTest.from_file('pages/Turing_Test.py').run()
@@ -97,25 +109,213 @@ def test_rating_submission_error(mock_submit_rating, mock_fetch_random_music, mo
     assert 'Invalid request' in at.error[0].value
 
 
-@patch('utils.fetch_random_music')
-def test_skip_song(mock_fetch_random_music, mock_random_track):
-    mock_fetch_random_music.return_value = mock_random_track, None
+@patch('utils.fetch_random_batch')
+def test_skip_song(mock_fetch_random_batch, mock_random_track):
+    next_track = dict(mock_random_track, id=2)
+    mock_fetch_random_batch.return_value = [mock_random_track, next_track], None
     at = AppTest.from_file('pages/Turing_Test.py').run()
     at.button[1].click().run()
-    assert at.session_state['random_track'] == mock_random_track
+    assert at.session_state['random_track'] == next_track
+
+
+@patch('components.custom_audio_player.components.html')
+def test_custom_audio_player(mock_html):
+    load_template.cache_clear()
+    custom_audio_player('http://localhost/media/clips/a.wav', next_url='http://localhost/media/clips/b.wav?x=1&y=2')
+    custom_audio_player('http://localhost/media/clips/b.wav?x=1&y=2')
+    first, second = (call.args[0] for call in mock_html.call_args_list)
+    assert 'id="audioPlayer" src="http://localhost/media/clips/a.wav"' in first
+    assert '<audio src="http://localhost/media/clips/b.wav?x=1&amp;y=2" preload="auto"' in first
+    assert 'preload="auto" muted hidden' not in second
+    assert '.play-button' in second
+    assert load_template.cache_info().misses == 1
+
+
+@patch('utils.fetch_random_batch')
+def test_turing_test_page_preloads_next_track(mock_fetch_random_batch, mock_random_track):
+    mock_fetch_random_batch.return_value = [mock_random_track, dict(mock_random_track, id=2, file='next.wav')], None
+    at = AppTest.from_file('pages/Turing_Test.py').run()
+    assert 'src="next.wav" preload="auto"' in at.get('iframe')[0].proto.srcdoc
+
+
+# test track queue
+@patch('utils.fetch_random_batch')
+def test_track_queue(mock_fetch_random_batch, mock_random_track):
+    tracks = [dict(mock_random_track, id=i) for i in range(1, 6)]
+    mock_fetch_random_batch.return_value = tracks, None
+    queue = TrackQueue(batch_size=5, low_watermark=1)
+    assert queue.pop() == (tracks[0], None)
+    assert queue.pop() == (tracks[1], None)
+    assert queue.pop() == (tracks[2], None)
+    assert mock_fetch_random_batch.call_count == 1
+
+
+@patch('utils.fetch_random_batch')
+def test_track_queue_background_refill(mock_fetch_random_batch, mock_random_track):
+    tracks = [dict(mock_random_track, id=i) for i in range(1, 3)]
+    mock_fetch_random_batch.return_value = tracks, None
+    queue = TrackQueue(batch_size=2, low_watermark=1)
+    queue.pop()
+    queue._pending.result()
+    assert mock_fetch_random_batch.call_count == 2
+    queue.pop()
+    assert len(queue.tracks) == 1
+
+
+@patch('utils.fetch_random_batch')
+def test_track_queue_peek(mock_fetch_random_batch, mock_random_track):
+    tracks = [dict(mock_random_track, id=i) for i in range(1, 3)]
+    mock_fetch_random_batch.return_value = tracks, None
+    queue = TrackQueue(batch_size=2, low_watermark=0)
+    assert queue.peek() is None
+    queue.pop()
+    assert queue.peek() == tracks[1]
+    assert queue.pop() == (tracks[1], None)
+
+
+@patch('utils.fetch_random_batch')
+def test_track_queue_error(mock_fetch_random_batch):
+    mock_fetch_random_batch.return_value = None, 'Test error'
+    result, error = TrackQueue().pop()
+    assert result is None
+    assert error == 'Test error'
 
 
 # test Data_Analysis page
-@patch('utils.load_data')
-def test_page_loading_error(mock_load_data):
-    mock_load_data.return_value = None, 'Test error'
+@patch('utils.load_histograms')
+@patch('utils.load_section')
+def test_page_loading_error(mock_load_section, mock_load_histograms):
+    mock_load_section.return_value = None, 'Test error'
+    mock_load_histograms.return_value = {}, None
     at = AppTest.from_file('pages/Data_Analysis.py').run()
-    assert not at.tabs
     assert any('Test error' in element.value for element in at.error)
+    assert not at.get('plotly_chart')
+
+
+@patch('utils.load_histograms')
+@patch('utils.load_section')
+def test_page_histograms_error(mock_load_section, mock_load_histograms, mock_analysis_data):
+    mock_load_section.return_value = {'origin_df': pd.DataFrame(mock_analysis_data['origin_df'])}, None
+    mock_load_histograms.return_value = None, 'Histogram error'
+    at = AppTest.from_file('pages/Data_Analysis.py').run()
+    assert any('Histogram error' in element.value for element in at.error)
+    assert not at.get('plotly_chart')
+
+
+@pytest.fixture
+def mock_histogram():
+    return {
+        'bin_edges': [0.0, 1.0, 2.0],
+        'genres': {
+            'pop': {'counts': [1, 3], 'count': 4, 'mean': 1.2, 'q1': 1.0, 'median': 1.5, 'q3': 1.8,
+                    'lowerfence': 0.5, 'upperfence': 1.9, 'outliers': []},
+            'classical': {'counts': [2, 0], 'count': 3, 'mean': 0.5, 'q1': 0.2, 'median': 0.5, 'q3': 0.7,
+                          'lowerfence': 0.1, 'upperfence': 0.9, 'outliers': [5.0]},
+        },
+    }
+
+
+def test_histogram_traces(mock_histogram):
+    pop, classical = histogram_traces(mock_histogram, {'pop': 'blue'})
+    assert list(pop.x) == [0.5, 1.5]
+    assert list(pop.y) == [0.25, 0.75]
+    assert list(pop.width) == [1.0, 1.0]
+    assert pop.marker.color == 'blue'
+    assert list(classical.y) == [2 / 3, 0.0]
+
+
+def test_box_traces(mock_histogram):
+    traces = box_traces(mock_histogram)
+    assert [trace.type for trace in traces] == ['box', 'box', 'scatter']
+    assert traces[0].median == (1.5,)
+    assert traces[2].x == (5.0,)
+
+
+def test_cached_figure(mock_histogram):
+    fig = histogram_figure(mock_histogram, 'Histogram of Duration', 'duration')
+    assert histogram_figure(mock_histogram, 'Histogram of Duration', 'duration') is fig
+    assert histogram_figure(mock_histogram, 'Histogram of nPVI', 'npvi') is not fig
+    changed = {**mock_histogram, 'bin_edges': [0.0, 2.0, 4.0]}
+    assert histogram_figure(changed, 'Histogram of Duration', 'duration') is not fig
+
+
+def test_add_trendlines():
+    fig = go.Figure()
+    fit = {'n': 10, 'slope': 2.0, 'intercept': 1.0, 'r2': 0.9, 'slope_pvalue': 0.01, 'x': [0.0, 1.0],
+           'y': [1.0, 3.0], 'lower': [0.5, 2.5], 'upper': [1.5, 3.5]}
+    trendlines = {'note_density': {'npvi': {'pop': fit, 'classical': None}}}
+    add_trendlines(fig, trendlines, 'note_density', 'npvi', {'pop': 'blue'})
+    band, line = fig.data
+    assert list(band.x) == [0.0, 1.0, 1.0, 0.0]
+    assert list(band.y) == [1.5, 3.5, 2.5, 0.5]
+    assert list(line.y) == [1.0, 3.0]
+    assert line.line.color == 'blue'
+    add_trendlines(fig, trendlines, 'duration', 'npvi')
+    assert len(fig.data) == 2
+
+
+@pytest.fixture
+def large_frame():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        'genre': pd.Categorical(['pop'] * 3000 + ['classical'] * 1000),
+        'note_density': rng.normal(5, 1, 4000),
+        'npvi': rng.normal(50, 10, 4000),
+    })
+    df.attrs['version'] = 'W/"1"'
+    return df
+
+
+def test_sample_positions():
+    groups = np.array([0] * 900 + [1] * 100 + [2])
+    positions = sample_positions(groups, 100)
+    assert np.all(np.diff(positions) > 0)
+    assert np.bincount(groups[positions]).tolist() == [90, 10, 1]
+    assert np.array_equal(positions, sample_positions(groups, 100))
+    assert len(sample_positions(groups, 5000)) == len(groups)
+
+
+def test_downsample(large_frame):
+    sample = downsample(large_frame, 400)
+    assert sample['genre'].value_counts().to_dict() == {'pop': 300, 'classical': 100}
+    assert downsample(large_frame.copy(deep=False), 400) is not sample
+    with patch('utils.sample_positions') as mock_sample_positions:
+        assert downsample(large_frame.copy(deep=False), 400).index.equals(sample.index)
+        mock_sample_positions.assert_not_called()
+    assert downsample(large_frame, 5000) is large_frame
+    with pytest.raises(ValueError):
+        downsample(large_frame, 400, method='random')
+
+
+def test_downsample_grid_keeps_outliers(large_frame):
+    df = large_frame.copy()
+    df.loc[0, 'npvi'] = 500.0
+    sample = downsample(df, 400, method='grid', x='note_density', y='npvi')
+    assert 0 in sample.index
+    assert len(sample) < len(df)
+
+
+def test_scatter_figure(large_frame):
+    fig = scatter_figure(large_frame, 'note_density', 'npvi', max_points=2000)
+    assert {trace.type for trace in fig.data} == {'scattergl'}
+    assert sum(len(trace.x) for trace in fig.data) == 2000
+    fig = scatter_figure(large_frame.head(10), 'note_density', 'npvi')
+    assert {trace.type for trace in fig.data} == {'scatter'}
+    fig = scatter_figure(large_frame, 'note_density', 'npvi', density=True, color_discrete_map={'pop': 'blue'},
+                         labels={'npvi': 'nPVI'})
+    classical, pop = fig.data
+    assert pop.type == 'contour' and pop.name == 'pop'
+    assert np.asarray(pop.z).sum() == pytest.approx(1.0)
+    assert fig.layout.yaxis.title.text == 'nPVI'
+
+
+def test_violin_figure(large_frame):
+    assert violin_figure(large_frame, 'genre', 'npvi').data[0].points == 'outliers'
+    assert violin_figure(large_frame.head(10), 'genre', 'npvi').data[0].points == 'all'
 
 
 # test endpoint
-@patch('requests.get')
+@patch('utils.session.get')
 def test_fetch_random_music(mock_get, mock_random_track):
     mock_response = MagicMock()
     mock_response.status_code = 200
@@ -126,7 +326,7 @@ def test_fetch_random_music(mock_get, mock_random_track):
     assert error is None
 
 
-@patch('requests.get')
+@patch('utils.session.get')
 def test_fetch_random_music_endpoint_error(mock_get):
     mock_response = MagicMock()
     mock_response.status_code = 500
@@ -137,7 +337,7 @@ def test_fetch_random_music_endpoint_error(mock_get):
     assert error == 'Server returned error 500: Test endpoint error'
 
 
-@patch('requests.get')
+@patch('utils.session.get')
 def test_fetch_random_music_connection_error(mock_get):
     mock_get.side_effect = requests.ConnectionError
     result, error = fetch_random_music()
@@ -145,7 +345,7 @@ def test_fetch_random_music_connection_error(mock_get):
     assert error == 'Could not connect to the server.'
 
 
-@patch('requests.get')
+@patch('utils.session.get')
 def test_fetch_random_music_request_timeout(mock_get):
     mock_get.side_effect = requests.Timeout
     result, error = fetch_random_music()
@@ -153,7 +353,7 @@ def test_fetch_random_music_request_timeout(mock_get):
     assert error == 'Request timed out. Please try again.'
 
 
-@patch('requests.get')
+@patch('utils.session.get')
 def test_fetch_random_music_request_exception(mock_get):
     mock_get.side_effect = requests.RequestException('Request Exception')
     result, error = fetch_random_music()
@@ -161,7 +361,30 @@ def test_fetch_random_music_request_exception(mock_get):
     assert error == 'Error fetching track: Request Exception'
 
 
-@patch('requests.post')
+@patch('utils.session.get')
+def test_fetch_random_batch(mock_get, mock_random_track):
+    mock_response = MagicMock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = [mock_random_track]
+    mock_get.return_value = mock_response
+    result, error = fetch_random_batch(1)
+    assert result == [mock_random_track]
+    assert error is None
+    assert mock_get.call_args.kwargs['params'] == {'n': 1}
+
+
+@patch('utils.session.get')
+def test_fetch_random_batch_endpoint_error(mock_get):
+    mock_response = MagicMock()
+    mock_response.status_code = 404
+    mock_response.json.return_value = {'error': 'No music tracks available in the database'}
+    mock_get.return_value = mock_response
+    result, error = fetch_random_batch()
+    assert result is None
+    assert error == 'Server returned error 404: No music tracks available in the database'
+
+
+@patch('utils.session.post')
 def test_submit_rating(mock_post, rating_payload, mock_rating_response):
     mock_response = MagicMock()
     mock_response.status_code = 201
@@ -172,7 +395,7 @@ def test_submit_rating(mock_post, rating_payload, mock_rating_response):
     assert error is None
 
 
-@patch('requests.post')
+@patch('utils.session.post')
 def test_submit_rating_endpoint_error(mock_post, rating_payload):
     mock_response = MagicMock()
     mock_response.status_code = 404
@@ -183,7 +406,7 @@ def test_submit_rating_endpoint_error(mock_post, rating_payload):
     assert error == 'Server returned error 404: Test song not found'
 
 
-@patch('requests.post')
+@patch('utils.session.post')
 def test_submit_rating_connection_error(mock_post, rating_payload):
     mock_post.side_effect = requests.ConnectionError
     result, error = submit_rating(rating_payload['song'], rating_payload['rating'])
@@ -191,7 +414,7 @@ def test_submit_rating_connection_error(mock_post, rating_payload):
     assert error == 'Could not connect to the server.'
 
 
-@patch('requests.post')
+@patch('utils.session.post')
 def test_submit_rating_request_timeout(mock_post, rating_payload):
     mock_post.side_effect = requests.Timeout
     result, error = submit_rating(rating_payload['song'], rating_payload['rating'])
@@ -199,7 +422,7 @@ def test_submit_rating_request_timeout(mock_post, rating_payload):
     assert error == 'Request timed out. Please try again.'
 
 
-@patch('requests.post')
+@patch('utils.session.post')
 def test_submit_rating_request_exception(mock_post, rating_payload):
     mock_post.side_effect = requests.RequestException('Request exception')
     result, error = submit_rating(rating_payload['song'], rating_payload['rating'])
@@ -207,7 +430,128 @@ def test_submit_rating_request_exception(mock_post, rating_payload):
     assert error == 'Error submitting rating: Request exception'
 
 
-@patch('requests.get')
+@patch('utils.session.post')
+def test_submit_rating_batch(mock_post, rating_payload, mock_rating_response):
+    mock_response = MagicMock()
+    mock_response.status_code = 201
+    mock_response.json.return_value = [mock_rating_response]
+    mock_post.return_value = mock_response
+    result, error = submit_rating_batch([rating_payload])
+    assert result == [mock_rating_response]
+    assert error is None
+    assert mock_post.call_args.kwargs['json'] == [rating_payload]
+
+
+@patch('utils.session.post')
+def test_submit_rating_batch_connection_error(mock_post, rating_payload):
+    mock_post.side_effect = requests.ConnectionError
+    result, error = submit_rating_batch([rating_payload])
+    assert result is None
+    assert error == 'Could not connect to the server.'
+
+
+@patch('utils.post_rating_batch')
+def test_buffered_submit_rating(mock_post_rating_batch, mock_rating_response):
+    mock_post_rating_batch.return_value = 201, [mock_rating_response] * 3, None
+    buffer = RatingBuffer(size=3)
+    for song_id in [1, 2]:
+        result, error = submit_rating(song_id, 4, buffer=buffer)
+        assert result == {'song': song_id, 'rating': 4}
+        assert error is None
+    mock_post_rating_batch.assert_not_called()
+    submit_rating(3, 5, buffer=buffer)
+    mock_post_rating_batch.assert_called_once_with([{'song': 1, 'rating': 4}, {'song': 2, 'rating': 4},
+                                                    {'song': 3, 'rating': 5}])
+    assert buffer.pending == []
+
+
+@patch('utils.post_rating_batch')
+def test_rating_buffer_retry_after_error(mock_post_rating_batch, mock_rating_response):
+    mock_post_rating_batch.return_value = None, None, 'Could not connect to the server.'
+    buffer = RatingBuffer(size=1)
+    result, error = submit_rating(1, 4, buffer=buffer)
+    # the rating stays buffered, so it counts as submitted and is not added again
+    assert result == {'song': 1, 'rating': 4}
+    assert error is None
+    assert buffer.pending == [{'song': 1, 'rating': 4}]
+    mock_post_rating_batch.return_value = 503, {'error': 'Unavailable'}, 'Server returned error 503: Unavailable'
+    submit_rating(2, 3, buffer=buffer)
+    assert len(buffer.pending) == 2
+    mock_post_rating_batch.return_value = 201, [mock_rating_response] * 3, None
+    submit_rating(3, 5, buffer=buffer)
+    mock_post_rating_batch.assert_called_with([{'song': 1, 'rating': 4}, {'song': 2, 'rating': 3},
+                                               {'song': 3, 'rating': 5}])
+    assert buffer.pending == []
+
+
+@patch('utils.post_rating_batch')
+def test_rating_buffer_drops_rejected_ratings(mock_post_rating_batch, mock_rating_response):
+    mock_post_rating_batch.side_effect = [
+        (404, {'error': 'Song not found', 'songs': [2]}, 'Server returned error 404: Song not found'),
+        (201, [mock_rating_response] * 2, None),
+    ]
+    buffer = RatingBuffer(size=3)
+    buffer.add(1, 4)
+    buffer.add(2, 4)
+    result, error = buffer.add(3, 5)
+    assert (result, error) == ({'song': 3, 'rating': 5}, None)
+    assert mock_post_rating_batch.call_args.args[0] == [{'song': 1, 'rating': 4}, {'song': 3, 'rating': 5}]
+    assert buffer.pending == []
+
+    mock_post_rating_batch.side_effect = [
+        (400, [{}, {'rating': ['Ensure this value is less than or equal to 5.']}], 'Server returned error 400'),
+        (201, [mock_rating_response], None),
+    ]
+    buffer = RatingBuffer(size=2)
+    buffer.add(1, 4)
+    result, error = buffer.add(2, 9)
+    assert result is None
+    assert error == 'Server returned error 400'
+    assert mock_post_rating_batch.call_args.args[0] == [{'song': 1, 'rating': 4}]
+    assert buffer.pending == []
+
+
+@patch('utils.post_rating_batch')
+def test_rating_buffer_keeps_throttled_ratings(mock_post_rating_batch):
+    mock_post_rating_batch.return_value = 429, {'detail': 'Throttled'}, 'Server returned error 429: Throttled'
+    buffer = RatingBuffer(size=1)
+    assert buffer.add(1, 4) == ({'song': 1, 'rating': 4}, None)
+    assert buffer.pending == [{'song': 1, 'rating': 4}]
+
+
+@patch('utils.post_rating_batch')
+def test_rating_buffer_full(mock_post_rating_batch):
+    mock_post_rating_batch.return_value = None, None, 'Could not connect to the server.'
+    buffer = RatingBuffer(size=1, max_size=3)
+    for song_id in range(3):
+        assert buffer.add(song_id, 3)[1] is None
+    result, error = buffer.add(3, 3)
+    assert result is None
+    assert error.startswith('Could not connect to the server.')
+    assert [item['song'] for item in buffer.pending] == [0, 1, 2]
+
+
+@patch('utils.session.post')
+def test_post_rating_batch_invalid_ratings(mock_post):
+    mock_post.return_value = MagicMock(status_code=400)
+    mock_post.return_value.json.return_value = [{}, {'rating': ['Invalid']}]
+    status, result, error = post_rating_batch([{'song': 1, 'rating': 4}, {'song': 2, 'rating': 9}])
+    assert (status, result) == (400, [{}, {'rating': ['Invalid']}])
+    assert error == 'Server returned error 400: Invalid rating'
+
+
+@patch('utils.post_rating_batch')
+def test_ratings_flushed_on_leaving_turing_test(mock_post_rating_batch):
+    mock_post_rating_batch.return_value = 201, [], None
+    at = AppTest.from_file('Home.py')
+    at.session_state['rating_buffer'] = RatingBuffer(size=5)
+    at.session_state['rating_buffer'].add(1, 2)
+    at.run()
+    mock_post_rating_batch.assert_called_once_with([{'song': 1, 'rating': 2}])
+    assert at.session_state['rating_buffer'].pending == []
+
+
+@patch('utils.session.get')
 def test_load_data(mock_get, mock_analysis_data):
     load_data.clear()
     mock_get.return_value.json.return_value = mock_analysis_data
@@ -218,7 +562,255 @@ def test_load_data(mock_get, mock_analysis_data):
     assert isinstance(result['origin_df'], pd.DataFrame)
 
 
-@patch('requests.get')
+def npz_response(**arrays):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    response = MagicMock()
+    response.headers = {'Content-Type': 'application/x-npz'}
+    response.content = buffer.getvalue()
+    return response
+
+
+@patch('utils.session.get')
+def test_load_data_npz(mock_get):
+    load_data.clear()
+    mock_get.return_value = npz_response(**{
+        'origin_df/id': np.array([1, 2]),
+        'origin_df/npvi': np.array([40.5, 52.0], dtype=np.float32),
+        'origin_df/genre.codes': np.array([1, 0], dtype=np.int8),
+        'origin_df/genre.categories': np.array(['classical', 'pop']),
+        'origin_df/pc_dist1': np.ones((2, 12), dtype=np.float32),
+        'pitch_class_dist/pop': np.full(12, 0.1, dtype=np.float32),
+        'pitch_class_dist/pitch_classes': np.array(['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']),
+        'interval_transition_dist/pop': np.eye(2, dtype=np.float32),
+        'interval_transition_dist/labels': np.array(['P1', 'm2']),
+        'trendlines/note_density/npvi/pop/slope': np.array(1.5, dtype=np.float32),
+        'trendlines/note_density/npvi/pop/x': np.linspace(0, 1, 50, dtype=np.float32),
+    })
+    result, error = load_data()
+    assert error is None
+    assert mock_get.call_args.kwargs['headers']['Accept'].startswith('application/x-npz')
+    origin_df = result['origin_df']
+    assert list(origin_df['genre']) == ['pop', 'classical']
+    assert origin_df['npvi'].dtype == np.float32
+    assert 'pc_dist1' not in origin_df
+    assert result['origin_arrays']['pc_dist1'].shape == (2, 12)
+    assert list(result['pitch_class_dist']['pitch_classes'])[:2] == ['C', 'C#']
+    transitions = result['interval_transition_dist']
+    assert transitions['labels'] == ['P1', 'm2']
+    assert list(transitions['pop']['index']) == ['P1', 'm2']
+    assert list(transitions['pop']['data'][1]) == [0.0, 1.0]
+    fit = result['trendlines']['note_density']['npvi']['pop']
+    assert fit['slope'] == 1.5
+    assert fit['x'].shape == (50,)
+
+
+@patch('utils.session.get')
+def test_load_data_npz_error(mock_get):
+    load_data.clear()
+    mock_get.return_value = npz_response(error=np.array('No music data available for analysis'))
+    result, error = load_data()
+    assert result is None
+    assert error == 'Error loading data: No music data available for analysis'
+
+
+@patch('utils.session.get')
+def test_load_filtered_rows(mock_get):
+    load_filtered_rows.clear()
+    mock_get.return_value = npz_response(**{
+        'origin_df/duration': np.array([250.0, 300.0], dtype=np.float32),
+        'origin_df/genre.codes': np.array([0, 1], dtype=np.int8),
+        'origin_df/genre.categories': np.array(['classical', 'pop']),
+    })
+    mock_get.return_value.status_code = 200
+    fields, ranges = ('genre', 'duration'), (('note_density', 2.0, None),)
+    assert not load_filtered_rows.cached(fields, ranges)
+    rows, error = load_filtered_rows(fields, ranges)
+    assert error is None
+    assert list(rows.columns) == ['genre', 'duration']
+    assert list(rows['genre']) == ['classical', 'pop']
+    params = mock_get.call_args.kwargs['params']
+    assert params == {'fields': 'genre,duration', 'note_density': '2.0:'}
+    assert load_filtered_rows.cached(fields, ranges)
+    load_filtered_rows(fields, ranges)
+    assert mock_get.call_count == 1
+
+
+@patch('utils.session.get')
+def test_load_filtered_rows_endpoint_error(mock_get):
+    load_filtered_rows.clear()
+    mock_get.return_value.status_code = 400
+    mock_get.return_value.json.return_value = {'error': 'Range bounds of npvi must be numbers'}
+    rows, error = load_filtered_rows(('npvi',), (('npvi', 'a', None),))
+    assert rows is None
+    assert error == 'Server returned error 400: Range bounds of npvi must be numbers'
+    assert not load_filtered_rows.cached(('npvi',), (('npvi', 'a', None),))
+
+
+@patch('utils.session.get')
+def test_load_section(mock_get):
+    load_section.clear()
+    mock_get.return_value = npz_response(**{
+        'origin_df/duration': np.array([250.0, 300.0], dtype=np.float32),
+        'origin_df/genre.codes': np.array([0, 1], dtype=np.int8),
+        'origin_df/genre.categories': np.array(['classical', 'pop']),
+        'trendlines/duration/npvi/pop/slope': np.array(1.5, dtype=np.float32),
+    })
+    result, error = load_section('rhythm')
+    assert error is None
+    assert mock_get.call_args.args[0].endswith('feature-analysis/sections/rhythm/')
+    assert list(result['origin_df']['genre']) == ['classical', 'pop']
+    assert result['trendlines']['duration']['npvi']['pop']['slope'] == 1.5
+    load_section('rhythm')
+    assert mock_get.call_count == 1
+
+
+def test_fetch_concurrently():
+    futures = fetch_concurrently({'first': lambda: (1, None), 'second': lambda: (None, 'error')})
+    assert futures['first'].result() == (1, None)
+    assert futures['second'].result() == (None, 'error')
+
+
+@patch('utils.session.get')
+def test_api_get_revalidation(mock_get):
+    mock_get.side_effect = [MagicMock(status_code=200, headers={'ETag': '"abc"'}),
+                            MagicMock(status_code=304, headers={'ETag': '"abc"'})]
+    parse = MagicMock(return_value={'count': 1})
+    assert api_get_validated('music/', parse, params={'page': 2}) == {'count': 1}
+    assert api_get_validated('music/', parse, params={'page': 2}) is parse.return_value
+    assert parse.call_count == 1
+    assert mock_get.call_args.kwargs['headers']['If-None-Match'] == '"abc"'
+    assert mock_get.call_args.kwargs['timeout'] is not None
+    assert utils._validated_results[('music/', (('page', 2),), None)] == ('"abc"', {'count': 1})
+
+
+@patch('utils.session.get')
+def test_api_get_changed_data(mock_get):
+    mock_get.side_effect = [MagicMock(status_code=200, headers={'ETag': '"old"'}),
+                            MagicMock(status_code=200, headers={'ETag': '"new"'}), MagicMock(status_code=304)]
+    parse = MagicMock(side_effect=['old', 'new'])
+    api_get_validated('ratings/', parse)
+    assert api_get_validated('ratings/', parse) == 'new'
+    assert api_get_validated('ratings/', parse) == 'new'
+    assert mock_get.call_args.kwargs['headers']['If-None-Match'] == '"new"'
+
+
+@patch('utils.session.get')
+def test_api_get_validated_bounded(mock_get):
+    mock_get.return_value = MagicMock(status_code=200, headers={'ETag': '"abc"'})
+    for page in range(utils.VALIDATED_CACHE_SIZE + 5):
+        api_get_validated('ratings/', lambda response: page, params={'page': page})
+    assert len(utils._validated_results) == utils.VALIDATED_CACHE_SIZE
+    assert ('ratings/', (('page', 0),), None) not in utils._validated_results
+
+
+def test_fetch_cache_hit():
+    cache = FetchCache(ttl=60)
+    fetch = MagicMock(return_value=({'a': 1}, None))
+    assert cache.get('key', fetch) == ({'a': 1}, None)
+    assert cache.get('key', fetch) == ({'a': 1}, None)
+    fetch.assert_called_once()
+
+
+def wait_for_refresh(cache, key):
+    for _ in range(500):
+        if key not in cache._in_flight:
+            return
+        time.sleep(0.01)
+
+
+def test_fetch_cache_serves_stale_while_revalidating():
+    cache = FetchCache(ttl=0)
+    cache.get('key', lambda: ('old', None))
+    assert cache.get('key', lambda: ('new', None)) == ('old', None)
+    wait_for_refresh(cache, 'key')
+    cache.ttl = 60
+    assert cache.get('key', lambda: ('newer', None)) == ('new', None)
+
+
+def test_fetch_cache_single_flight():
+    cache = FetchCache(ttl=60)
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'data', None
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('key', fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == [('data', None)] * 5
+
+
+def test_fetch_cache_errors_not_cached():
+    cache = FetchCache(ttl=60)
+    cache.get('other', lambda: ('kept', None))
+    error = None, 'Could not connect to the server.'
+    assert cache.get('key', lambda: error) == error
+    assert cache.get('key', lambda: ('data', None)) == ('data', None)
+    assert cache.get('other', lambda: ('refetched', None)) == ('kept', None)
+
+
+def test_fetch_cache_failed_refresh_keeps_stale():
+    cache = FetchCache(ttl=0)
+    cache.get('key', lambda: ('old', None))
+    assert cache.get('key', MagicMock(side_effect=requests.ConnectionError)) == ('old', None)
+    wait_for_refresh(cache, 'key')
+    cache.ttl = 60
+    assert cache.get('key', lambda: ('new', None)) == ('old', None)
+
+
+@patch('utils.session.get')
+def test_load_data_error_not_cached(mock_get, mock_analysis_data):
+    load_data.clear()
+    mock_get.side_effect = requests.ConnectionError
+    assert load_data() == (None, 'Could not connect to the server.')
+    mock_get.side_effect = None
+    mock_get.return_value.json.return_value = mock_analysis_data
+    result, error = load_data()
+    assert error is None
+    assert mock_get.call_count == 2
+
+
+@patch('utils.session.get')
+def test_load_data_shared_view(mock_get, mock_analysis_data):
+    load_data.clear()
+    mock_get.return_value.json.return_value = mock_analysis_data
+    first, _ = load_data()
+    assert first['origin_df']['genre'].dtype == 'category'
+    assert first['origin_df']['complexity'].dtype == np.float32
+    first['origin_df'].loc[0, 'complexity'] = -1.0
+    first['origin_df']['extra'] = 1
+    first['pitch_class_dist'] = None
+    second, _ = load_data()
+    mock_get.assert_called_once()
+    assert second['origin_df']['complexity'].tolist() == [5.0, 7.0]
+    assert 'extra' not in second['origin_df']
+    assert isinstance(second['pitch_class_dist'], pd.DataFrame)
+
+
+def test_compact_frame():
+    df = compact_frame(pd.DataFrame({
+        'id': [1.0, 2.0], 'key': ['C', 'a'], 'title': ['a.mid', 'b.mid'], 'pitch_range': [30.0, None],
+        'pitch_count': [12.0, 20.0], 'npvi': [40.5, 52.0],
+    }))
+    assert df['id'].dtype == np.int8
+    assert df['key'].dtype == 'category'
+    assert df['title'].dtype == object
+    assert df['pitch_range'].dtype == np.float32
+    assert df['pitch_count'].dtype == np.int8
+    assert df['npvi'].dtype == np.float32
+
+
+@patch('utils.session.get')
 def test_load_data_endpoint_error(mock_get):
     load_data.clear()
     mock_response = MagicMock()
@@ -230,7 +822,7 @@ def test_load_data_endpoint_error(mock_get):
     assert error == 'Error loading data: Database processing failed'
 
 
-@patch('requests.get')
+@patch('utils.session.get')
 def test_load_data_connection_error(mock_get):
     load_data.clear()
     mock_get.side_effect = requests.ConnectionError
@@ -239,7 +831,7 @@ def test_load_data_connection_error(mock_get):
     assert error == 'Could not connect to the server.'
 
 
-@patch('requests.get')
+@patch('utils.session.get')
 def test_load_data_request_timeout(mock_get):
     load_data.clear()
     mock_get.side_effect = requests.Timeout
@@ -248,7 +840,7 @@ def test_load_data_request_timeout(mock_get):
     assert error == 'Request timed out. Please try again.'
 
 
-@patch('requests.get')
+@patch('utils.session.get')
 def test_load_data_request_exception(mock_get):
     load_data.clear()
     mock_get.side_effect = requests.RequestException('Request Exception')
@@ -1,11 +1,245 @@
+import functools
+import io
 import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import requests
 import streamlit as st
+import threading
+import time
 
-from config import API_BASE_URL
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import (ANALYSIS_CACHE_TTL, API_BASE_URL, FIGURE_CACHE_SIZE, MAX_DISPLAY_POINTS, RATING_BATCH_MAX_SIZE,
+                    RATING_BUFFER_SIZE, REQUEST_POOL_SIZE, REQUEST_TIMEOUT, TRACK_BATCH_SIZE, WEBGL_POINT_THRESHOLD,
+                    WIDGET_DEBOUNCE)
+from plotly.subplots import make_subplots
+from requests.adapters import HTTPAdapter
+
+# cached analysis data is shared by all sessions; with copy-on-write, the shallow copies handed to each session
+# never write through to it
+pd.set_option('mode.copy_on_write', True)
+
+prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='prefetch')
+# fetches the sections of the Data Analysis page concurrently, see fetch_concurrently
+section_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='sections')
+NPZ_CONTENT_TYPE = 'application/x-npz'
+CATEGORICAL_COLUMNS = ['genre', 'key', 'label']
+INTEGER_COLUMNS = ['id', 'pitch_range', 'pitch_count', 'pitch_class_count']
+
+# shared by all sessions, so connections to the API are kept alive and reused
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_maxsize=REQUEST_POOL_SIZE))
+session.mount('https://', HTTPAdapter(pool_maxsize=REQUEST_POOL_SIZE))
+# ETags and parsed results of revalidated requests, see api_get_validated
+VALIDATED_CACHE_SIZE = 32
+_validated_results = OrderedDict()
+_validated_results_lock = threading.Lock()
+# display samples of large scatter plots, see downsample
+SAMPLE_CACHE_SIZE = 64
+_sample_cache = OrderedDict()
+_sample_cache_lock = threading.Lock()
+
+
+def api_get(path, params=None, headers=None):
+    """
+    Sends a GET request to the API through the shared connection pool.
+    Args:
+        path (str): Endpoint path relative to API_BASE_URL
+        params (dict, optional): Query parameters
+        headers (dict, optional): Request headers
+    Returns:
+        requests.Response: Response of the API
+    Raises:
+        requests.RequestException: If the request fails
+    """
+    return session.get(f'{API_BASE_URL}{path}', params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+
+
+def api_get_validated(path, parse, params=None, headers=None):
+    """
+    Sends a GET request to the API and parses the response, revalidating the last result of the same request with
+    If-None-Match. If the API answers 304 Not Modified, the kept result is returned, so unchanged data is neither
+    transferred nor parsed again.
+    Only the ETag and the parsed result are kept, not the response, for the last VALIDATED_CACHE_SIZE requests.
+    Args:
+        path (str): Endpoint path relative to API_BASE_URL
+        parse (callable): Function turning a response into the result. Results of 200 responses with an ETag are
+            kept, so they must not be modified by the caller.
+        params (dict, optional): Query parameters
+        headers (dict, optional): Request headers
+    Returns:
+        Result of parse
+    Raises:
+        requests.RequestException: If the request fails
+    """
+    headers = dict(headers or {})
+    key = (path, tuple(sorted((params or {}).items())), headers.get('Accept'))
+    with _validated_results_lock:
+        cached = _validated_results.get(key)
+        if cached is not None:
+            _validated_results.move_to_end(key)
+    if cached is not None:
+        headers['If-None-Match'] = cached[0]
+    response = api_get(path, params=params, headers=headers)
+    if response.status_code == 304 and cached is not None:
+        return cached[1]
+    result = parse(response)
+    etag = response.headers.get('ETag')
+    if response.status_code == 200 and etag:
+        with _validated_results_lock:
+            _validated_results[key] = etag, result
+            _validated_results.move_to_end(key)
+            while len(_validated_results) > VALIDATED_CACHE_SIZE:
+                _validated_results.popitem(last=False)
+    return result
+
+
+def api_post(path, json):
+    """
+    Sends a POST request with a JSON body to the API through the shared connection pool.
+    Args:
+        path (str): Endpoint path relative to API_BASE_URL
+        json: Request body
+    Returns:
+        requests.Response: Response of the API
+    Raises:
+        requests.RequestException: If the request fails
+    """
+    return session.post(f'{API_BASE_URL}{path}', json=json, timeout=REQUEST_TIMEOUT)
+
+
+class FetchCache:
+    """
+    Cache of (data, error_message) fetch results shared by all Streamlit sessions of the process.
+    - Entries are kept per key and served for `ttl` seconds.
+    - Expired entries are still served while a single background refresh is in flight (stale-while-revalidate).
+    - Concurrent misses of the same key wait for one fetch instead of each calling the backend (single-flight).
+    - Results with an error message are returned but not cached, and a failed refresh keeps the stale entry.
+    Args:
+        ttl (float): Seconds an entry is served before it is refreshed
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._in_flight = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, fetch):
+        """
+        Returns the cached result for a key, fetching it if there is none.
+        Args:
+            key: Hashable cache key
+            fetch (callable): Function without arguments returning (data, error_message)
+        Returns:
+            tuple: (data, error_message) of the cached or fetched result
+        """
+        with self._lock:
+            generation = self._generation
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, fetched_at = entry
+                if time.monotonic() - fetched_at >= self.ttl and key not in self._in_flight:
+                    future = self._in_flight[key] = Future()
+                    prefetch_executor.submit(self._fetch, key, fetch, future, generation)
+                return result
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if leader:
+            self._fetch(key, fetch, future, generation)
+        return future.result()
+
+    def contains(self, key):
+        """
+        Returns whether a result is cached for a key, fresh or stale, so get() would return without waiting.
+        """
+        with self._lock:
+            return key in self._entries
+
+    def _fetch(self, key, fetch, future, generation):
+        try:
+            result = fetch()
+        except Exception as e:
+            result = None, f'Error fetching data: {str(e)}'
+        with self._lock:
+            # results of fetches started before a clear() are handed to their waiters, but not cached
+            if generation == self._generation:
+                if result[1] is None:
+                    self._entries[key] = result, time.monotonic()
+                self._in_flight.pop(key, None)
+        future.set_result(result)
+
+    def clear(self):
+        """
+        Drops every cached entry. Fetches in flight still complete, but their results are not cached.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._in_flight.clear()
+            self._generation += 1
+
+
+def swr_cache(ttl, view=None):
+    """
+    Decorator caching the (data, error_message) results of a fetch function in a FetchCache, keyed by its arguments.
+    Unlike st.cache_data, errors are not cached and never clear the results of other functions. The cache can be
+    emptied with the `clear` attribute of the decorated function, and `cached(*args, **kwargs)` tells whether a
+    call would be served from it.
+    Args:
+        ttl (float): Seconds a result is served before it is refreshed in the background
+        view (callable, optional): Applied to the cached data on every call, e.g. to hand out cheap views instead of
+            the shared object. By default the shared object itself is returned.
+    Returns:
+        callable: Decorator
+    """
+    def decorator(func):
+        cache = FetchCache(ttl)
+
+        def make_key(args, kwargs):
+            return args, tuple(sorted(kwargs.items()))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            data, error = cache.get(make_key(args, kwargs), lambda: func(*args, **kwargs))
+            if view is not None and data is not None:
+                data = view(data)
+            return data, error
+
+        wrapper.clear = cache.clear
+        wrapper.cached = lambda *args, **kwargs: cache.contains(make_key(args, kwargs))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def cached_figure(func):
+    """
+    Decorator caching the figures built by a function once per process with st.cache_resource, keyed by its
+    arguments, so reruns and other sessions reuse unchanged figures instead of building them again. Cached figures
+    are shared by all sessions and must not be modified once returned.
+    Args:
+        func (callable): Function building a Plotly figure
+    Returns:
+        callable: Decorated function
+    """
+    return st.cache_resource(show_spinner=False, max_entries=FIGURE_CACHE_SIZE)(func)
+
+
+def debounce(seconds=WIDGET_DEBOUNCE):
+    """
+    Waits before an expensive step that follows a widget change. Streamlit stops a run at its next element once a
+    newer rerun is requested, so while the user keeps changing the widget, the superseded runs end here instead of
+    each running the step.
+    Args:
+        seconds (float): Time the widget has to stay unchanged
+    """
+    time.sleep(seconds)
+    st.empty()
 
 
 def load_css(file_path='static/style.css'):
@@ -50,36 +284,80 @@ def no_header():
     st.markdown(css, unsafe_allow_html=True)
 
 
-@st.cache_data
-def load_data():
+def compact_frame(df: pd.DataFrame):
     """
-    Fetches and processes music analysis data from the API.
-    Uses Streamlit caching for performance.
+    Converts an analysis DataFrame to compact dtypes: categorical labels and keys, float32 metrics and the smallest
+    integer type for integer columns without missing values. Other columns (e.g. titles, array columns) are kept.
+    Args:
+        df: DataFrame with music feature columns
+    Returns:
+        DataFrame: Converted DataFrame
+    """
+    columns = {}
+    for column, values in df.items():
+        if column in CATEGORICAL_COLUMNS:
+            values = values.astype('category')
+        elif column in INTEGER_COLUMNS and pd.api.types.is_numeric_dtype(values) and values.notna().all():
+            values = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values) or pd.api.types.is_integer_dtype(values):
+            values = values.astype(np.float32)
+        columns[column] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def freeze(data):
+    """
+    Marks the arrays of cached analysis data as read-only, so accidental in-place writes raise instead of changing
+    the data of every session.
+    Args:
+        data: Analysis data as returned by parse_analysis_json or parse_analysis_npz
+    Returns:
+        The same data
+    """
+    if isinstance(data, dict):
+        for value in data.values():
+            freeze(value)
+    elif isinstance(data, np.ndarray):
+        data.flags.writeable = False
+    return data
+
+
+def view_analysis_data(data):
+    """
+    Returns a per-session view of the shared analysis data. DataFrames are shallow copies, which copy-on-write keeps
+    independent from the shared ones without copying their data, and containers are new objects, so sessions can
+    neither replace nor modify the shared data.
+    Args:
+        data: Analysis data as returned by parse_analysis_json or parse_analysis_npz
+    Returns:
+        Copy of the data structure sharing the underlying arrays
+    """
+    if isinstance(data, pd.DataFrame):
+        return data.copy(deep=False)
+    if isinstance(data, dict):
+        return {key: view_analysis_data(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return list(data)
+    return data
+
+
+def fetch_analysis(path):
+    """
+    Fetches and processes analysis data from an API endpoint serving the feature analysis encodings.
+    Requests the columnar NPZ encoding of the data and falls back to JSON if the server does not provide it. The
+    response is revalidated with its ETag, so unchanged data is not downloaded again. The ETag is kept as the
+    'version' attribute of origin_df, which identifies the data when caching display samples (see downsample).
+    Args:
+        path (str): Endpoint path relative to API_BASE_URL
     Returns:
         tuple: (processed_data, error_message)
             - processed_data: Dictionary of processed music data if successful
             - error_message: Error description if fetch fails
     """
     try:
-        response = requests.get(f'{API_BASE_URL}feature-analysis/')
-        data = response.json()
-        if 'error' in data:
-            return None, f"Error loading data: {data['error']}"
-
-        df_dict = {}
-        for key, value in data.items():
-            if key in ['origin_df', 'pitch_class_dist', 'interval_dist', 'interval_size_dist', 'interval_dir_dist']:
-                df_dict[key] = pd.DataFrame(value)
-            elif key in ['pitch_transition_dist', 'interval_transition_dist']:
-                df_dict[key] = {
-                    genre: pd.DataFrame(data) for genre, data in value.items() if genre != 'labels'
-                }
-                df_dict[key]['labels'] = value['labels']
-            else:
-                df_dict[key] = value
-        return df_dict, None
+        return api_get_validated(path, parse_analysis_response,
+                                 headers={'Accept': f'{NPZ_CONTENT_TYPE}, application/json;q=0.9'})
     except (requests.ConnectionError, requests.Timeout, requests.RequestException) as e:
-        st.cache_data.clear()
         if isinstance(e, requests.ConnectionError):
             return None, 'Could not connect to the server.'
         elif isinstance(e, requests.Timeout):
@@ -88,23 +366,589 @@ def load_data():
             return None, f'Error fetching data: {str(e)}'
 
 
-def plot_histogram(df: pd.DataFrame, x_col, title, xaxis_title=None, color=None, histnorm='probability', **kwargs):
+@swr_cache(ttl=ANALYSIS_CACHE_TTL, view=view_analysis_data)
+def load_data():
+    """
+    Fetches and processes music analysis data from the API.
+    The data is held once per process and shared by all sessions through swr_cache; each call returns a
+    copy-on-write view of it. Once it expires, the stale data is served while it is revalidated in the background,
+    see fetch_analysis. Errors are not cached.
+    Returns:
+        tuple: (processed_data, error_message)
+            - processed_data: Dictionary of processed music data if successful
+            - error_message: Error description if fetch fails
+    """
+    return fetch_analysis('feature-analysis/')
+
+
+@swr_cache(ttl=ANALYSIS_CACHE_TTL, view=view_analysis_data)
+def load_section(section):
     """
-    Creates an interactive histogram using Plotly and displays it in Streamlit.
-    Default normalization shows probability distribution rather than raw counts.
+    Fetches the analysis data drawn by one tab of the Data Analysis page from the API. Cached like load_data.
     Args:
-        df: Pandas DataFrame containing the data to plot
-        x_col: Name of the column to plot on x-axis
+        section (str): 'keys', 'rhythm', 'pitch', 'intervals' or 'complexity'
+    Returns:
+        tuple: (processed_data, error_message), as for load_data, with only the entries of the section
+    """
+    return fetch_analysis(f'feature-analysis/sections/{section}/')
+
+
+def fetch_concurrently(loaders):
+    """
+    Starts independent fetches at once on the section executor, so a page can wait for each result only where it
+    is drawn.
+    Args:
+        loaders (dict): Maps names to functions without arguments returning (data, error_message)
+    Returns:
+        dict: Maps the names to futures of the (data, error_message) results
+    """
+    return {name: section_executor.submit(loader) for name, loader in loaders.items()}
+
+
+@swr_cache(ttl=ANALYSIS_CACHE_TTL)
+def load_histograms():
+    """
+    Fetches the per-genre histograms and box plot statistics of the scalar music features from the API.
+    Cached like load_data.
+    Returns:
+        tuple: (histograms, error_message)
+            - histograms: Dictionary mapping features to their bins and statistics if successful
+            - error_message: Error description if fetch fails
+    """
+    try:
+        data = api_get_validated('feature-analysis/histograms/', lambda response: response.json())
+        if 'error' in data:
+            return None, f"Error loading data: {data['error']}"
+        return data, None
+    except requests.ConnectionError:
+        return None, 'Could not connect to the server.'
+    except requests.Timeout:
+        return None, 'Request timed out. Please try again.'
+    except requests.RequestException as e:
+        return None, f'Error fetching data: {str(e)}'
+
+
+@swr_cache(ttl=ANALYSIS_CACHE_TTL)
+def load_filtered_rows(fields, ranges):
+    """
+    Fetches columns of the tracks whose features are within the given ranges from the API, so a filtered view can
+    be drawn without the full data. Results are cached per filter like load_data.
+    Args:
+        fields (tuple): Columns to fetch, e.g. ('genre', 'duration')
+        ranges (tuple): (feature, min, max) filters, with None for an open bound
+    Returns:
+        tuple: (rows, error_message)
+            - rows: DataFrame of the matching tracks if successful, tagged with the data version like origin_df
+            - error_message: Error description if fetch fails
+    """
+    params = {'fields': ','.join(fields)}
+    for feature, low, high in ranges:
+        params[feature] = f"{'' if low is None else low}:{'' if high is None else high}"
+
+    def parse_rows(response):
+        if response.status_code != 200:
+            error_message = response.json().get('error', 'Unknown error occurred')
+            return None, f'Server returned error {response.status_code}: {error_message}'
+        data, error = parse_analysis_response(response)
+        if error:
+            return None, error
+        rows = data['origin_df'].reindex(columns=list(fields))
+        rows.attrs['version'] = response.headers.get('ETag')
+        return rows, None
+
+    try:
+        return api_get_validated('feature-analysis/scatter/', parse_rows, params=params,
+                                 headers={'Accept': f'{NPZ_CONTENT_TYPE}, application/json;q=0.9'})
+    except requests.ConnectionError:
+        return None, 'Could not connect to the server.'
+    except requests.Timeout:
+        return None, 'Request timed out. Please try again.'
+    except requests.RequestException as e:
+        return None, f'Error fetching data: {str(e)}'
+
+
+def parse_analysis_response(response):
+    """
+    Parses a response of an endpoint serving the feature analysis encodings, NPZ or JSON. The ETag of the response
+    is kept as the 'version' attribute of origin_df.
+    Args:
+        response (requests.Response): Response of the API
+    Returns:
+        tuple: (processed_data, error_message), see parse_analysis_npz and parse_analysis_json
+    """
+    if response.headers.get('Content-Type') == NPZ_CONTENT_TYPE:
+        data, error = parse_analysis_npz(response.content)
+    else:
+        data, error = parse_analysis_json(response.json())
+    if data is not None and 'origin_df' in data:
+        data['origin_df'].attrs['version'] = response.headers.get('ETag')
+    return data, error
+
+
+def parse_analysis_json(data):
+    """
+    Converts the JSON music analysis response into DataFrames.
+    Args:
+        data (dict): Decoded JSON response of the feature analysis endpoint
+    Returns:
+        tuple: (processed_data, error_message), as for load_data
+    """
+    if 'error' in data:
+        return None, f"Error loading data: {data['error']}"
+
+    df_dict = {}
+    for key, value in data.items():
+        if key == 'origin_df':
+            df_dict[key] = compact_frame(pd.DataFrame(value))
+        elif key in ['pitch_class_dist', 'interval_dist', 'interval_size_dist', 'interval_dir_dist']:
+            df_dict[key] = pd.DataFrame(value)
+        elif key in ['pitch_transition_dist', 'interval_transition_dist']:
+            df_dict[key] = {
+                genre: pd.DataFrame(data) for genre, data in value.items() if genre != 'labels'
+            }
+            df_dict[key]['labels'] = value['labels']
+        else:
+            df_dict[key] = value
+    return freeze(df_dict), None
+
+
+def parse_analysis_npz(content):
+    """
+    Converts the columnar NPZ music analysis response into DataFrames, directly from its column arrays.
+    Text columns of origin_df become categorical columns. Per-track array columns (e.g. pc_dist1) are not part of
+    the origin_df DataFrame, but returned as stacked arrays under 'origin_arrays'. Trendlines are returned as nested
+    dicts, as in the JSON response.
+    Args:
+        content (bytes): NPZ archive returned by the feature analysis endpoint
+    Returns:
+        tuple: (processed_data, error_message), as for load_data
+    """
+    with np.load(io.BytesIO(content)) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    if 'error' in arrays:
+        return None, f"Error loading data: {arrays['error']}"
+
+    sections = {}
+    for name, array in arrays.items():
+        section, key = name.split('/', 1)
+        sections.setdefault(section, {})[key] = array
+
+    df_dict = {}
+    for section, entries in sections.items():
+        if section == 'origin_df':
+            columns, origin_arrays = {}, {}
+            for key, array in entries.items():
+                if key.endswith('.codes'):
+                    column = key[:-len('.codes')]
+                    columns[column] = pd.Categorical.from_codes(array, entries[f'{column}.categories'])
+                elif array.ndim > 1:
+                    origin_arrays[key] = array
+                elif not key.endswith('.categories'):
+                    columns[key] = array
+            df_dict['origin_df'] = compact_frame(pd.DataFrame(columns))
+            df_dict['origin_arrays'] = origin_arrays
+        elif section == 'trendlines':
+            trendlines = {}
+            for key, array in entries.items():
+                x_feature, y_feature, genre, statistic = key.split('/')
+                fit = trendlines.setdefault(x_feature, {}).setdefault(y_feature, {}).setdefault(genre, {})
+                fit[statistic] = array.item() if array.ndim == 0 else array
+            df_dict['trendlines'] = trendlines
+        elif 'labels' in entries:
+            labels = entries.pop('labels').tolist()
+            df_dict[section] = {
+                genre: pd.DataFrame({'index': labels, 'columns': labels, 'data': list(matrix)})
+                for genre, matrix in entries.items()
+            }
+            df_dict[section]['labels'] = labels
+        else:
+            df_dict[section] = pd.DataFrame({key: array for key, array in entries.items()})
+    return freeze(df_dict), None
+
+
+def histogram_traces(histogram, color_map=None, opacity=0.75, showlegend=True):
+    """
+    Builds one bar trace per genre from precomputed histogram bins, normalized to probabilities.
+    Args:
+        histogram (dict): Histogram of a numeric feature from load_histograms, with 'bin_edges' and per-genre 'counts'
+        color_map (dict, optional): Maps genres to colors
+        opacity (float): Bar opacity, so overlaid genres stay visible
+        showlegend (bool): Whether the traces appear in the legend
+    Returns:
+        list: Plotly bar traces
+    """
+    edges = np.asarray(histogram['bin_edges'], dtype=float)
+    centers = (edges[:-1] + edges[1:]) / 2
+    traces = []
+    for genre, stats in histogram['genres'].items():
+        probabilities = np.asarray(stats['counts'], dtype=float) / max(stats['count'], 1)
+        traces.append(go.Bar(x=centers, y=probabilities, width=np.diff(edges), name=genre, legendgroup=genre,
+                             marker_color=(color_map or {}).get(genre), opacity=opacity, showlegend=showlegend,
+                             customdata=np.stack([edges[:-1], edges[1:]], axis=-1),
+                             hovertemplate='%{customdata[0]:.4g} - %{customdata[1]:.4g}<br>'
+                                           'probability: %{y:.4f}<extra>%{fullData.name}</extra>'))
+    return traces
+
+
+def box_traces(histogram, color_map=None):
+    """
+    Builds one horizontal box trace per genre from precomputed quartiles and whiskers, with its outliers as markers.
+    Args:
+        histogram (dict): Histogram of a numeric feature from load_histograms, with per-genre box statistics
+        color_map (dict, optional): Maps genres to colors
+    Returns:
+        list: Plotly box and scatter traces
+    """
+    traces = []
+    for genre, stats in histogram['genres'].items():
+        if not stats['count']:
+            continue
+        color = (color_map or {}).get(genre)
+        traces.append(go.Box(y=[genre], q1=[stats['q1']], median=[stats['median']], q3=[stats['q3']],
+                             lowerfence=[stats['lowerfence']], upperfence=[stats['upperfence']], mean=[stats['mean']],
+                             orientation='h', name=genre, legendgroup=genre, marker_color=color, showlegend=False))
+        outliers = stats['outliers']
+        if outliers:
+            scatter = scatter_trace_type(len(outliers))
+            traces.append(scatter(x=outliers, y=[genre] * len(outliers), mode='markers', name=genre,
+                                  legendgroup=genre, marker_color=color, showlegend=False))
+    return traces
+
+
+@cached_figure
+def histogram_figure(histogram, title, xaxis_title, color_map=None, marginal_box=True, opacity=0.75):
+    """
+    Creates a histogram of a feature per genre from precomputed bins, see plot_histogram.
+    Args:
+        histogram (dict): Histogram of a numeric feature from load_histograms
         title: Title of the histogram
-        xaxis_title (optional): Custom x-axis label. If None, uses x_col name
-        color (optional): Column name for color grouping
-        histnorm (str): Histogram normalization method (default: 'probability')
-        **kwargs: Additional Plotly Express histogram parameters
+        xaxis_title: x-axis label
+        color_map (dict, optional): Maps genres to colors
+        marginal_box (bool): Whether to show box plots above the histogram
+        opacity (float): Bar opacity
+    Returns:
+        Figure: Cached Plotly figure
     """
-    fig = px.histogram(df, x=x_col, title=title, color=color, histnorm=histnorm, **kwargs)
-    if xaxis_title:
-        fig.update_layout(xaxis_title=xaxis_title)
-    st.plotly_chart(fig)
+    if marginal_box:
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.25, 0.75], vertical_spacing=0.02)
+        for trace in box_traces(histogram, color_map):
+            fig.add_trace(trace, row=1, col=1)
+        histogram_row = 2
+    else:
+        fig = make_subplots(rows=1, cols=1)
+        histogram_row = 1
+    for trace in histogram_traces(histogram, color_map, opacity):
+        fig.add_trace(trace, row=histogram_row, col=1)
+    fig.update_layout(title=title, barmode='overlay', bargap=0)
+    fig.update_xaxes(title_text=xaxis_title, row=histogram_row, col=1)
+    fig.update_yaxes(title_text='probability', row=histogram_row, col=1)
+    return fig
+
+
+def plot_histogram(histograms, feature, title, xaxis_title=None, color_map=None, marginal_box=True, opacity=0.75):
+    """
+    Creates an interactive histogram of a feature per genre from precomputed bins and displays it in Streamlit.
+    Bars show probabilities; box plots of the feature are shown above the histogram.
+    Args:
+        histograms (dict): Histograms from load_histograms
+        feature: Name of the numeric feature to plot
+        title: Title of the histogram
+        xaxis_title (optional): Custom x-axis label. If None, uses the feature name
+        color_map (dict, optional): Maps genres to colors
+        marginal_box (bool): Whether to show box plots above the histogram
+        opacity (float): Bar opacity
+    """
+    st.plotly_chart(histogram_figure(histograms[feature], title, xaxis_title or feature, color_map, marginal_box,
+                                     opacity))
+
+
+@cached_figure
+def category_histogram_figure(stats, feature, title, color=None):
+    """
+    Creates a bar chart of precomputed category counts, see plot_category_histogram.
+    Args:
+        stats (dict): 'categories' and their 'counts' of a genre from load_histograms
+        feature: Name of the categorical feature
+        title: Title of the chart
+        color (optional): Bar color
+    Returns:
+        Figure: Cached Plotly figure
+    """
+    counts = np.asarray(stats['counts'], dtype=float)
+    fig = go.Figure(go.Bar(x=stats['categories'], y=counts / max(counts.sum(), 1), marker_color=color,
+                           hovertemplate=f'{feature}: %{{x}}<br>probability: %{{y:.4f}}<extra></extra>'))
+    fig.update_layout(title=title, xaxis_title=feature, yaxis_title='probability', bargap=0.2)
+    fig.update_xaxes(type='category')
+    return fig
+
+
+def plot_category_histogram(histograms, feature, genre, title, color=None):
+    """
+    Creates a bar chart of the precomputed category counts of a genre, as probabilities ordered by frequency.
+    Args:
+        histograms (dict): Histograms from load_histograms
+        feature: Name of the categorical feature to plot, e.g. 'key'
+        genre: Genre to plot
+        title: Title of the chart
+        color (optional): Bar color
+    """
+    st.plotly_chart(category_histogram_figure(histograms[feature]['genres'][genre], feature, title, color))
+
+
+def add_trendlines(fig, trendlines, x_feature, y_feature, color_map=None):
+    """
+    Adds the precomputed per-genre OLS regression lines of a feature pair, with their 95% confidence bands, to a
+    scatter plot.
+    Args:
+        fig: Plotly figure of the scatter plot
+        trendlines (dict): Trendlines of the analysis data, nested as trendlines[x][y][genre]
+        x_feature: Feature on the x-axis
+        y_feature: Feature on the y-axis
+        color_map (dict, optional): Maps genres to colors
+    """
+    for genre, fit in trendlines.get(x_feature, {}).get(y_feature, {}).items():
+        if not fit:
+            continue
+        color = (color_map or {}).get(genre)
+        x = np.asarray(fit['x'])
+        fig.add_trace(go.Scatter(x=np.concatenate([x, x[::-1]]),
+                                 y=np.concatenate([fit['upper'], np.asarray(fit['lower'])[::-1]]),
+                                 fill='toself', fillcolor=color, opacity=0.15, line=dict(width=0), hoverinfo='skip',
+                                 name=genre, legendgroup=genre, showlegend=False))
+        fig.add_trace(go.Scatter(x=x, y=fit['y'], mode='lines', line_color=color, name=genre, legendgroup=genre,
+                                 showlegend=False,
+                                 hovertemplate=f'<b>OLS trendline</b><br>'
+                                               f"{y_feature} = {fit['slope']:.4g} * {x_feature} + "
+                                               f"{fit['intercept']:.4g}<br>"
+                                               f"R<sup>2</sup>={fit['r2']:.6f}, p={fit['slope_pvalue']:.3g}<br>"
+                                               f"n={int(fit['n'])}<extra>{genre}</extra>"))
+
+
+def scatter_trace_type(points):
+    """
+    Chooses the scatter trace type for a number of points: SVG for few points, WebGL above WEBGL_POINT_THRESHOLD.
+    Args:
+        points (int): Number of points of the trace
+    Returns:
+        type: go.Scatter or go.Scattergl
+    """
+    return go.Scattergl if points > WEBGL_POINT_THRESHOLD else go.Scatter
+
+
+def sample_positions(groups, max_points, seed=0):
+    """
+    Draws a random sample of the points, allocated to their groups in proportion to the group sizes, so the sample
+    keeps the relative density of the groups. Every group keeps at least one point, so the sample can exceed
+    max_points by up to the number of groups.
+    Args:
+        groups (ndarray): Integer group of every point
+        max_points (int): Target sample size
+        seed (int): Seed of the random generator, so repeated draws are identical
+    Returns:
+        ndarray: Sorted positions of the sampled points
+    """
+    n = len(groups)
+    if n <= max_points:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    order = np.argsort(groups, kind='stable')
+    _, starts, counts = np.unique(groups[order], return_index=True, return_counts=True)
+    quotas = np.clip(np.rint(counts * max_points / n).astype(int), 1, counts)
+    return np.sort(np.concatenate([
+        rng.choice(order[start:start + count], size=quota, replace=False)
+        for start, count, quota in zip(starts, counts, quotas)
+    ]))
+
+
+def grid_cells(x, y, grid_size):
+    """
+    Assigns points to the cells of a grid_size x grid_size grid spanning their range. Points with a missing
+    coordinate share one extra cell per row or column.
+    Args:
+        x (array-like): x coordinates
+        y (array-like): y coordinates
+        grid_size (int): Number of cells per axis
+    Returns:
+        ndarray: Integer cell of every point
+    """
+    cells = []
+    for values in (x, y):
+        values = np.asarray(values, dtype=float)
+        finite = np.isfinite(values)
+        low, high = (values[finite].min(), values[finite].max()) if finite.any() else (0.0, 0.0)
+        scale = grid_size / (high - low) if high > low else 0.0
+        index = np.clip((values - low) * scale, 0, grid_size - 1)
+        cells.append(np.where(finite, index, grid_size).astype(int))
+    return cells[0] * (grid_size + 1) + cells[1]
+
+
+def downsample(df: pd.DataFrame, max_points=MAX_DISPLAY_POINTS, method='stratified', by='genre', x=None, y=None,
+               grid_size=40):
+    """
+    Reduces a DataFrame to about max_points rows for display, keeping the density of its points:
+    - 'stratified': rows are sampled per `by` group in proportion to the group sizes
+    - 'grid': rows are sampled per `by` group and cell of a grid over the x and y columns, so sparse regions and
+      outliers keep at least one point
+    Samples of the analysis data are cached per data version (the 'version' attribute set by load_data), selected
+    rows and parameters, so reruns and other sessions reuse them.
+    Args:
+        df: DataFrame to sample
+        max_points (int): Target number of rows
+        method (str): 'stratified' or 'grid'
+        by (optional): Column whose groups are sampled proportionally, e.g. 'genre'. None samples all rows together.
+        x (optional): Column of the grid's x-axis, required for 'grid'
+        y (optional): Column of the grid's y-axis, required for 'grid'
+        grid_size (int): Number of grid cells per axis
+    Returns:
+        DataFrame: Sampled rows in their original order, or df itself if it has at most max_points rows
+    Raises:
+        ValueError: If the method is unknown
+    """
+    if method not in ('stratified', 'grid'):
+        raise ValueError(f'Unknown sampling method: {method}')
+    if len(df) <= max_points:
+        return df
+    key, positions = None, None
+    version = df.attrs.get('version')
+    if version is not None:
+        key = (version, hash(df.index.to_numpy().tobytes()), len(df), max_points, method, by, x, y, grid_size)
+        with _sample_cache_lock:
+            positions = _sample_cache.get(key)
+            if positions is not None:
+                _sample_cache.move_to_end(key)
+    if positions is None:
+        groups = pd.factorize(df[by])[0] if by else np.zeros(len(df), dtype=int)
+        if method == 'grid':
+            groups = groups * (grid_size + 1) ** 2 + grid_cells(df[x], df[y], grid_size)
+        positions = sample_positions(groups, max_points)
+        if key is not None:
+            with _sample_cache_lock:
+                _sample_cache[key] = positions
+                while len(_sample_cache) > SAMPLE_CACHE_SIZE:
+                    _sample_cache.popitem(last=False)
+    return df.iloc[positions]
+
+
+def density_traces(df: pd.DataFrame, x, y, color=None, color_map=None, bins=40):
+    """
+    Builds 2-D density contours of the points, one per color group, from histograms binned here, so only the
+    binned densities are sent to the browser instead of every point.
+    Args:
+        df: DataFrame with the points
+        x: Column on the x-axis
+        y: Column on the y-axis
+        color (optional): Column whose groups get their own contours, e.g. 'genre'
+        color_map (dict, optional): Maps groups to colors
+        bins (int): Number of bins per axis, shared by all groups
+    Returns:
+        list: Plotly contour traces
+    """
+    data = df.dropna(subset=[x, y])
+    xs = data[x].to_numpy(dtype=float)
+    ys = data[y].to_numpy(dtype=float)
+    x_edges = np.histogram_bin_edges(xs, bins)
+    y_edges = np.histogram_bin_edges(ys, bins)
+    groups = data.groupby(color, observed=True).indices if color else {None: np.arange(len(data))}
+    traces = []
+    for name, positions in groups.items():
+        counts = np.histogram2d(xs[positions], ys[positions], [x_edges, y_edges])[0]
+        group_color = (color_map or {}).get(name)
+        traces.append(go.Contour(x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+                                 z=(counts / len(positions)).T, name=str(name), legendgroup=str(name),
+                                 showlegend=name is not None, showscale=False, contours_coloring='lines',
+                                 colorscale=[[0, group_color], [1, group_color]] if group_color else None,
+                                 hovertemplate=f'{x}: %{{x:.4g}}<br>{y}: %{{y:.4g}}<br>'
+                                               f'density: %{{z:.4f}}<extra>{name or ""}</extra>'))
+    return traces
+
+
+def scatter_figure(df: pd.DataFrame, x, y, color='genre', density=False, max_points=MAX_DISPLAY_POINTS,
+                   sample_method='stratified', **kwargs):
+    """
+    Creates a scatter plot that stays responsive for large data:
+    - above WEBGL_POINT_THRESHOLD points it is rendered with WebGL instead of SVG
+    - above max_points points a density-preserving sample is drawn, see downsample
+    - with density=True, 2-D density contours of all points are drawn instead of the points, see density_traces
+    Args:
+        df: DataFrame with the points
+        x: Column on the x-axis
+        y: Column on the y-axis
+        color (optional): Column mapped to the point color
+        density (bool): Whether to draw density contours instead of points
+        max_points (int): Maximum number of points drawn
+        sample_method (str): Sampling method of downsample, 'stratified' or 'grid'
+        **kwargs: Passed to px.scatter, e.g. title, labels, opacity, size or color_discrete_map. Density plots use
+            only title, labels and color_discrete_map.
+    Returns:
+        Figure: Plotly figure
+    """
+    if density:
+        labels = kwargs.get('labels') or {}
+        fig = go.Figure(density_traces(df, x, y, color, kwargs.get('color_discrete_map')))
+        fig.update_layout(title=kwargs.get('title'), xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y),
+                          legend_title_text=labels.get(color, color))
+        return fig
+    sample = downsample(df, max_points, sample_method, by=color, x=x, y=y)
+    render_mode = 'webgl' if len(sample) > WEBGL_POINT_THRESHOLD else 'svg'
+    return px.scatter(sample, x=x, y=y, color=color, render_mode=render_mode, **kwargs)
+
+
+def scatter_3d_figure(df: pd.DataFrame, x, y, z, color='genre', max_points=MAX_DISPLAY_POINTS, **kwargs):
+    """
+    Creates a 3-D scatter plot, which Plotly always renders with WebGL, of at most about max_points points sampled
+    per color group, see downsample.
+    Args:
+        df: DataFrame with the points
+        x: Column on the x-axis
+        y: Column on the y-axis
+        z: Column on the z-axis
+        color (optional): Column mapped to the point color
+        max_points (int): Maximum number of points drawn
+        **kwargs: Passed to px.scatter_3d
+    Returns:
+        Figure: Plotly figure
+    """
+    return px.scatter_3d(downsample(df, max_points, by=color), x=x, y=y, z=z, color=color, **kwargs)
+
+
+def violin_figure(df: pd.DataFrame, x, y, color='genre', points='all', **kwargs):
+    """
+    Creates a violin plot. Plotly draws the points of violins as SVG markers, so above WEBGL_POINT_THRESHOLD rows
+    only the outliers are drawn.
+    Args:
+        df: DataFrame with the values
+        x: Column of the categories
+        y: Column of the values
+        color (optional): Column mapped to the violin color
+        points: Points to draw, as for px.violin
+        **kwargs: Passed to px.violin
+    Returns:
+        Figure: Plotly figure
+    """
+    if points == 'all' and len(df) > WEBGL_POINT_THRESHOLD:
+        points = 'outliers'
+    return px.violin(df, x=x, y=y, color=color, points=points, **kwargs)
+
+
+@cached_figure
+def bar_figure(df: pd.DataFrame, x_axis, y_axis, title, color, x_label, sort=True, tick_labels=None, color_map=None):
+    """
+    Creates a bar chart, see plot_bar.
+    Returns:
+        Figure: Cached Plotly figure
+    """
+    labels = {y_axis: 'probability', x_axis: x_label}
+    if sort:
+        fig = px.bar(df, x=x_axis, y=y_axis, color_discrete_sequence=color, title=title,
+                     labels=labels,
+                     category_orders={x_axis: df.sort_values(y_axis, ascending=False)[x_axis]})
+    else:
+        fig = px.bar(df, x=x_axis, y=y_axis, color=color, title=title, barmode='group',
+                     labels=labels,
+                     color_discrete_map=color_map)
+    if tick_labels:
+        fig.update_xaxes(tickvals=list(range(len(tick_labels))), ticktext=list(tick_labels))
+    return fig
 
 
 def plot_bar(df: pd.DataFrame, x_axis, y_axis, title, color, **kwargs):
@@ -123,21 +967,25 @@ def plot_bar(df: pd.DataFrame, x_axis, y_axis, title, color, **kwargs):
             - tick_labels: Custom tick labels for x-axis
             - color_map: Custom color mapping for categories
     """
-    x_label = kwargs.get('x_label', x_axis)
-    sort = kwargs.get('sort', True)
-    tick_labels = kwargs.get('tick_labels', None)
-    labels = {y_axis: 'probability', x_axis: x_label}
-    if sort:
-        fig = px.bar(df, x=x_axis, y=y_axis, color_discrete_sequence=color, title=title,
-                     labels=labels,
-                     category_orders={x_axis: df.sort_values(y_axis, ascending=False)[x_axis]})
-    else:
-        fig = px.bar(df, x=x_axis, y=y_axis, color=color, title=title, barmode='group',
-                     labels=labels,
-                     color_discrete_map=kwargs.get('color_map', None))
+    st.plotly_chart(bar_figure(df, x_axis, y_axis, title, color, x_label=kwargs.get('x_label', x_axis),
+                               sort=kwargs.get('sort', True), tick_labels=kwargs.get('tick_labels'),
+                               color_map=kwargs.get('color_map')))
+
+
+@cached_figure
+def transition_heatmap_figure(df: pd.DataFrame, color_scale, title, tick_labels=None):
+    """
+    Creates a heatmap of a transition matrix, see plot_transition_heatmap.
+    Returns:
+        Figure: Cached Plotly figure
+    """
+    matrix_data = np.array([row for row in df['data']])
+    fig = go.Figure(data=go.Heatmap(z=matrix_data, x=df['columns'], y=df['index'], colorscale=color_scale))
+    fig.update_layout(title=title)
     if tick_labels:
         fig.update_xaxes(tickvals=list(range(len(tick_labels))), ticktext=list(tick_labels))
-    st.plotly_chart(fig)
+        fig.update_yaxes(tickvals=list(range(len(tick_labels))), ticktext=list(tick_labels)[::-1])
+    return fig
 
 
 def plot_transition_heatmap(df: pd.DataFrame, color_scale, title, **kwargs):
@@ -151,14 +999,21 @@ def plot_transition_heatmap(df: pd.DataFrame, color_scale, title, **kwargs):
         **kwargs: Additional parameters:
             - tick_labels: Custom tick labels for both axes
     """
-    tick_labels = kwargs.get('tick_labels', None)
-    matrix_data = np.array([row for row in df['data']])
-    fig = go.Figure(data=go.Heatmap(z=matrix_data, x=df['columns'], y=df['index'], colorscale=color_scale))
-    fig.update_layout(title=title)
-    if tick_labels:
-        fig.update_xaxes(tickvals=list(range(len(tick_labels))), ticktext=list(tick_labels))
-        fig.update_yaxes(tickvals=list(range(len(tick_labels))), ticktext=list(tick_labels)[::-1])
-    st.plotly_chart(fig)
+    st.plotly_chart(transition_heatmap_figure(df, color_scale, title, kwargs.get('tick_labels')))
+
+
+@cached_figure
+def pie_figure(df: pd.DataFrame, label: str, value: str, title=None):
+    """
+    Creates a pie chart, see plot_pie.
+    Returns:
+        Figure: Cached Plotly figure
+    """
+    colors = ['gold', 'lightgreen']
+    return go.Figure(
+        data=[go.Pie(labels=df[label], values=df[value], textfont_size=20, title=title,
+                     marker=dict(colors=colors, pattern=dict(shape=['.', 'x'])),
+                     hovertemplate='%{label}<br>count: %{value}<br>%{percent}<extra></extra>')])
 
 
 def plot_pie(df: pd.DataFrame, label: str, value: str, **kwargs):
@@ -172,12 +1027,7 @@ def plot_pie(df: pd.DataFrame, label: str, value: str, **kwargs):
         **kwargs: Additional parameters:
             - title: Title of the pie chart
     """
-    colors = ['gold', 'lightgreen']
-    fig = go.Figure(
-        data=[go.Pie(labels=df[label], values=df[value], textfont_size=20, title=kwargs.get('title'),
-                     marker=dict(colors=colors, pattern=dict(shape=['.', 'x'])),
-                     hovertemplate='%{label}<br>count: %{value}<br>%{percent}<extra></extra>')])
-    st.plotly_chart(fig)
+    st.plotly_chart(pie_figure(df, label, value, kwargs.get('title')))
 
 
 def classify_key_type(df: pd.DataFrame):
@@ -214,7 +1064,7 @@ def fetch_random_music():
             - error_message: Error description if fetch fails
     """
     try:
-        response = requests.get(f'{API_BASE_URL}music/random/')
+        response = api_get('music/random/')
         if response.status_code == 200:
             return response.json(), None
         error = response.json()
@@ -228,19 +1078,116 @@ def fetch_random_music():
         return None, f'Error fetching track: {str(e)}'
 
 
-def submit_rating(song_id, rating):
+def fetch_random_batch(n=TRACK_BATCH_SIZE):
+    """
+    Fetches several distinct random music tracks from the API.
+    Args:
+        n (int): Number of tracks to fetch
+    Returns:
+        tuple: (tracks, error_message)
+            - tracks: List of track information dictionaries if successful
+            - error_message: Error description if fetch fails
+    """
+    try:
+        response = api_get('music/random_batch/', params={'n': n})
+        if response.status_code == 200:
+            return response.json(), None
+        error = response.json()
+        error_message = error.get('error', 'Unknown error occurred')
+        return None, f'Server returned error {response.status_code}: {error_message}'
+    except requests.ConnectionError:
+        return None, 'Could not connect to the server.'
+    except requests.Timeout:
+        return None, 'Request timed out. Please try again.'
+    except requests.RequestException as e:
+        return None, f'Error fetching tracks: {str(e)}'
+
+
+class TrackQueue:
+    """
+    Queue of upcoming Turing test tracks, kept per session in st.session_state.
+    Tracks are fetched in batches and the queue is refilled in the background once it runs low, so moving to the
+    next track normally needs no backend call.
+    Args:
+        batch_size (int): Number of tracks fetched per request
+        low_watermark (int): Queue length at which a background refill is started
+    """
+
+    def __init__(self, batch_size=TRACK_BATCH_SIZE, low_watermark=2):
+        self.batch_size = batch_size
+        self.low_watermark = low_watermark
+        self.tracks = deque()
+        self._pending = None
+
+    def _add(self, result):
+        tracks, error = result
+        if error:
+            return error
+        queued = {track['id'] for track in self.tracks}
+        self.tracks.extend(track for track in tracks if track['id'] not in queued)
+        return None
+
+    def _collect(self):
+        if self._pending is not None and self._pending.done():
+            pending, self._pending = self._pending, None
+            self._add(pending.result())
+
+    def refill(self):
+        """
+        Starts a background fetch if the queue is running low and no fetch is in flight.
+        """
+        self._collect()
+        if len(self.tracks) <= self.low_watermark and self._pending is None:
+            self._pending = prefetch_executor.submit(fetch_random_batch, self.batch_size)
+
+    def peek(self):
+        """
+        Returns the track pop() returns next without removing it, or None if no track is queued yet.
+        """
+        self._collect()
+        return self.tracks[0] if self.tracks else None
+
+    def pop(self):
+        """
+        Returns the next track, waiting for a fetch only if the queue is empty.
+        Returns:
+            tuple: (track_data, error_message)
+                - track_data: Dictionary of track information if successful
+                - error_message: Error description if fetch fails
+        """
+        self._collect()
+        if not self.tracks:
+            if self._pending is not None:
+                pending, self._pending = self._pending, None
+                error = self._add(pending.result())
+            else:
+                error = self._add(fetch_random_batch(self.batch_size))
+            if error:
+                return None, error
+            if not self.tracks:
+                return None, 'No tracks available'
+        track = self.tracks.popleft()
+        self.refill()
+        return track, None
+
+
+def submit_rating(song_id, rating, buffer=None):
     """
     Submits a rating for a music track to the API.
     Args:
         song_id: ID of the rated song
         rating: Rating value (1-5)
+        buffer (RatingBuffer, optional): If given, the rating is queued in the buffer and only sent once the buffer
+            is full, together with the other buffered ratings
     Returns:
         tuple: (response_data, error_message)
-            - response_data: Response from server if successful
+            - response_data: Response from server if successful, or the queued rating if it was buffered
             - error_message: Error description if submission fails
     """
+    if buffer is not None:
+        return buffer.add(song_id, rating)
     try:
-        response = requests.post(f'{API_BASE_URL}ratings/rate_song/', json={'song': song_id, 'rating': rating})
+        response = api_post('ratings/rate_song/', json={'song': song_id, 'rating': rating})
         if response.status_code == 201:
             return response.json(), None
         error = response.json()
@@ -252,3 +1199,141 @@ def submit_rating(song_id, rating):
         return None, 'Request timed out. Please try again.'
     except requests.RequestException as e:
         return None, f'Error submitting rating: {str(e)}'
+
+
+def post_rating_batch(ratings):
+    """
+    Submits several ratings to the API in a single request, keeping the status code so callers can tell rejected
+    ratings from failures worth retrying.
+    Args:
+        ratings: List of {'song': song_id, 'rating': rating} dictionaries
+    Returns:
+        tuple: (status_code, response_data, error_message)
+            - status_code: HTTP status of the response, or None if the server could not be reached
+            - response_data: List of created ratings if successful, otherwise the error response, if any: a list
+              of errors per rating for invalid ratings
+            - error_message: Error description if submission fails
+    """
+    try:
+        response = api_post('ratings/rate_batch/', json=ratings)
+        if response.status_code == 201:
+            return response.status_code, response.json(), None
+        error = response.json()
+        if isinstance(error, list):
+            # invalid ratings are reported as one list of errors per rating
+            error_message = 'Invalid rating'
+        else:
+            # DRF reports throttled requests in 'detail'
+            error_message = error.get('error', error.get('detail', 'Unknown error occurred'))
+        return response.status_code, error, f'Server returned error {response.status_code}: {error_message}'
+    except requests.ConnectionError:
+        return None, None, 'Could not connect to the server.'
+    except requests.Timeout:
+        return None, None, 'Request timed out. Please try again.'
+    except requests.RequestException as e:
+        return None, None, f'Error submitting ratings: {str(e)}'
+
+
+def submit_rating_batch(ratings):
+    """
+    Submits several ratings to the API in a single request.
+    Args:
+        ratings: List of {'song': song_id, 'rating': rating} dictionaries
+    Returns:
+        tuple: (response_data, error_message)
+            - response_data: List of created ratings if successful
+            - error_message: Error description if submission fails
+    """
+    _, result, error = post_rating_batch(ratings)
+    return (None, error) if error else (result, None)
+
+
+class RatingBuffer:
+    """
+    Per-session buffer of ratings, sent to the API in batches.
+    The buffer is flushed once it holds `size` ratings, and explicitly when the session leaves the Turing Test page,
+    see flush_session_ratings. Ratings stay buffered if a flush fails with a connection error, a timeout, a server
+    error or a throttled request (429), so they are retried with the next flush; ratings the server rejects are
+    dropped, since sending them again would fail the same way. At most max_size ratings, the batch limit of the
+    API, are kept: once the buffer is full, new ratings are refused until a flush succeeds.
+    Args:
+        size (int): Number of ratings that triggers a flush
+        max_size (int): Number of ratings kept at most
+    """
+
+    def __init__(self, size=RATING_BUFFER_SIZE, max_size=RATING_BATCH_MAX_SIZE):
+        self.size = size
+        self.max_size = max_size
+        self.pending = []
+
+    def add(self, song_id, rating):
+        """
+        Queues a rating and flushes the buffer if it is full. A rating that stays buffered because the flush failed
+        counts as submitted, as it is sent with a later flush.
+        Returns:
+            tuple: (rating_data, error_message), as for submit_rating. The error is set if the server rejected the
+                rating, or if the buffer is full and could not be flushed, in which case the rating is not queued.
+        """
+        if len(self.pending) >= self.max_size:
+            _, error, _ = self._send()
+            if len(self.pending) >= self.max_size:
+                return None, f'{error} Your rating could not be saved, please try again later.'
+        item = {'song': song_id, 'rating': rating}
+        self.pending.append(item)
+        if len(self.pending) >= self.size:
+            _, error, rejected = self._send()
+            if any(entry is item for entry in rejected):
+                return None, error
+        return item, None
+
+    def _send(self):
+        """
+        Sends the buffered ratings. If the server only rejects some of the ratings, i.e. reports their songs as not
+        found or their values as invalid, the other ratings are sent again without them.
+        Returns:
+            tuple: (response_data, error_message, rejected ratings)
+        """
+        rejected, rejection = [], None
+        while self.pending:
+            batch = list(self.pending)
+            status, result, error = post_rating_batch(batch)
+            if not error:
+                del self.pending[:len(batch)]
+                return result, rejection, rejected
+            if status is None or status >= 500 or status in (408, 429):
+                return None, error, rejected
+            if status == 404 and isinstance(result, dict):
+                missing = set(result.get('songs', []))
+                dropped = [item for item in batch if item['song'] in missing]
+            elif status == 400 and isinstance(result, list) and len(result) == len(batch):
+                # the errors of a list serializer, one per rating, empty for valid ratings
+                dropped = [item for item, errors in zip(batch, result) if errors]
+            else:
+                dropped = []
+            # a rejection that names no rating is attributed to the whole batch
+            dropped = dropped or batch
+            rejected += dropped
+            rejection = error
+            self.pending[:] = [item for item in self.pending if not any(item is entry for entry in dropped)]
+        return None, rejection, rejected
+
+    def flush(self):
+        """
+        Sends all buffered ratings in one request, dropping the ratings the server rejects.
+        Returns:
+            tuple: (response_data, error_message), as for submit_rating_batch
+        """
+        if not self.pending:
+            return [], None
+        result, error, _ = self._send()
+        return result, error
+
+
+def flush_session_ratings():
+    """
+    Sends the ratings buffered by the session on the Turing Test page. Called by the other pages, so the ratings of
+    a session leaving the Turing test are not left waiting for a full buffer.
+    """
+    buffer = st.session_state.get('rating_buffer')
+    if buffer is not None and buffer.pending:
+        buffer.flush()